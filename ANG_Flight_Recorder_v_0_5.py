@@ -7,32 +7,95 @@ Created on Thu Apr 18 11:52:44 2024
 # IMPORTS
 import math 
 import os 
-import glob
 import pickle 
-import pytz
+import sqlite3 
 import timezonefinder 
 import shutil 
-from datetime import datetime
 from SimConnect import SimConnect, AircraftEvents, AircraftRequests
+import ang_flight_log as angfl
+import ang_flight_buffer as angfb
+import ang_simconnect_batch as angbatch
+import ang_timezone_cache as angtz
+import ang_channel_groups as anggroups
+import ang_request_plan as angplan
+import ang_burst_capture as angburst
+import ang_sampling_engine as angengine
+import ang_telemetry_bus as angbus
+import ang_flight_phase as angphase
+import ang_flight_columns as angcols
+import ang_flight_catalog as angcat
 
 def connect_sm():
     # Create SimConnect link
     _SM = SimConnect()
     return _SM
 
-def connect_aq(_SM):
-    # Note the default _time is 2000 to be refreshed every 2 seconds
-    _AQ = AircraftRequests(_SM, _time=2000)
+def connect_aq(_SM, sample_rate_hz=None):
+    # Note the default _time is 2000 to be refreshed every 2 seconds. With a 
+    # sample rate values are refreshed once per sample period instead.
+    _AQ = AircraftRequests(_SM, _time=get_refresh_ms(sample_rate_hz))
     return _AQ
 
+def get_refresh_ms(sample_rate_hz=None): 
+    '''
+    Function returns the AircraftRequests refresh time (_time) matching a 
+    sample rate. 
+
+    Parameters
+    ----------
+    sample_rate_hz : Float, optional
+        Samples per second. None keeps the default 2000 ms.
+
+    Returns
+    -------
+    refresh_ms : Integer
+        Milliseconds a requested value is reused before SimConnect is asked 
+        again.
+
+    '''
+    if sample_rate_hz is None: 
+        refresh_ms = 2000
+    else: 
+        refresh_ms = int(1000 / sample_rate_hz)
+    return refresh_ms
+
+def set_aq_sample_rate(_AQ, sample_rate_hz): 
+    '''
+    Function sets the refresh time of every request of an AircraftRequests 
+    object to match a sample rate. 
+
+    Returns
+    -------
+    None.
+
+    '''
+    refresh_ms = get_refresh_ms(sample_rate_hz)
+    _AQ.time = refresh_ms
+    for request_list in _AQ.list: 
+        for request in request_list.list.values(): 
+            request.time = refresh_ms
+    return 
+
 def connect_ae(_SM): 
     _AE = AircraftEvents(_SM)
     return _AE
 
 def connect_tf(): 
-    _TF = timezonefinder.TimezoneFinder()
+    # Timezone lookups are cached per grid cell; see ang_timezone_cache
+    _TF = angtz.TimezoneResolver(timezonefinder.TimezoneFinder())
     return _TF
 
+def connect_bq(_SM, _AQ, simvars): 
+    # One SimConnect data definition for all given SimVars
+    _BQ = angbatch.SimVarBatch(_SM, _AQ, simvars)
+    return _BQ
+
+def connect_engine(_SM, _AQ, _AE=None): 
+    # asyncio engine scheduling all SimConnect reads, writes and events
+    engine = angengine.SamplingEngine(_SM, _AQ, _AE)
+    engine.start()
+    return engine
+
 '''
 _SM = connect_sm()
 _AQ = connect_aq(_SM)
@@ -70,9 +133,96 @@ def radians_to_degrees(rads):
     degrees = rads * 180/math.pi
     return degrees
 
+class FlightNumberAllocator(object): 
+    '''
+    Class hands out flight numbers (f1, f2, f3, ...) for the ./data directory. 
+    The directory is scanned once, after that the last flight number is kept 
+    in memory so the recorder loop does no file system calls to find it. 
+
+    Parameters
+    ----------
+    data_dir : String
+        Flight data directory.
+    '''
+    def __init__(self, data_dir='./data'): 
+        self.data_dir = data_dir
+        self.flight_nums = set()
+        self.scan()
+        
+    def scan(self): 
+        '''
+        Function scans the data directory for flight number directories. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.flight_nums = set()
+        if os.path.isdir(self.data_dir): 
+            with os.scandir(self.data_dir) as entries: 
+                for entry in entries: 
+                    name = entry.name
+                    if entry.is_dir() and name[:1] == 'f' and name[1:].isdigit(): 
+                        self.flight_nums.add(int(name[1:]))
+        return 
+    
+    @property
+    def last_flight_num(self): 
+        '''
+        Last flight number string i.e. 'f3', 'f0' if there are no flights.
+        '''
+        return f'f{max(self.flight_nums, default=0)}'
+    
+    def new_flight_num(self): 
+        '''
+        Function creates the directory for the next flight number. 
+
+        Returns
+        -------
+        flight_num : String
+            New flight number string.
+
+        '''
+        number = max(self.flight_nums, default=0) + 1
+        flight_num = f'f{number}'
+        os.mkdir(os.path.join(self.data_dir, flight_num))
+        self.flight_nums.add(number)
+        return flight_num
+    
+    def remove_flight_num(self, flight_num): 
+        '''
+        Function removes a flight number directory and its number. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        shutil.rmtree(os.path.join(self.data_dir, flight_num), ignore_errors=True)
+        self.flight_nums.discard(int(flight_num[1:]))
+        return 
+
+_flight_number_allocator = None
+
+def get_flight_number_allocator(): 
+    '''
+    Function returns the flight number allocator for ./data. It is created, 
+    and the directory scanned, on first use. 
+
+    Returns
+    -------
+    allocator : FlightNumberAllocator
+
+    '''
+    global _flight_number_allocator
+    if _flight_number_allocator is None: 
+        _flight_number_allocator = FlightNumberAllocator('./data')
+    return _flight_number_allocator
+
 def get_last_flight_num(): 
     '''
-    Function gets next flight num for the ./data/ directory. 
+    Function gets last flight num for the ./data/ directory. 
 
     Returns
     -------
@@ -80,251 +230,503 @@ def get_last_flight_num():
         Gets last flight number from ./data/.
 
     '''
-    list_of_files = glob.glob('./data/*') # * means all if need specific format then *.csv
-    latest_file = None
-    if len(list_of_files) == 0:
-        # latest_file = '000000'
-        latest_file = 'f0'
-    else: 
-        latest_file = max(list_of_files, key=os.path.getctime).split('\\')[-1]
+    latest_file = get_flight_number_allocator().last_flight_num
     return latest_file
 
 def check_flight_number(str_flight_num):
-    list_of_files = glob.glob('./data/*') # * means all if need specific format then *.csv
-    curr_flight_nums_in_dir = []
-    for i in list_of_files: 
-        curr_flight_nums_in_dir.append(i.split('\\')[-1])
-    if str_flight_num in curr_flight_nums_in_dir: 
-        is_in_dir = True
-    else: 
-        is_in_dir = False 
+    is_in_dir = (str_flight_num[1:].isdigit() and 
+                 int(str_flight_num[1:]) in get_flight_number_allocator().flight_nums)
     return is_in_dir
 
-def get_local_time_stamp(_AQ, _TF): 
+# Sample time stamps: UTC nanoseconds since the epoch
+EPOCH_CLOCK = angtz.EpochClock()
+
+# Latest telemetry; every sample the recorder reads is published here so 
+# the dashboard does not read it again
+TELEMETRY_BUS = angbus.TelemetryBus()
+
+# One row per flight in ./data/catalog.sqlite
+FLIGHT_CATALOG = angcat.FlightCatalog()
+
+def get_position(_AQ, lat=None, lon=None, retries=3, engine=None): 
+    '''
+    Function returns the aircraft position for a time stamp, re-reading a 
+    missing lat/lon from _AQ. 
+
+    Parameters
+    ----------
+    lat : Float, optional
+        Latitude already read for this sample. Read from _AQ if None.
+    lon : Float, optional
+        Longitude already read for this sample. Read from _AQ if None.
+    retries : Integer
+        Number of times to re-read a missing lat/lon.
+    engine : SamplingEngine, optional
+        Engine the lat/lon are re-read through instead of _AQ.
+
+    Returns
+    -------
+    lat : Float or None
+    lon : Float or None
+        None when the position could not be read.
+
+    '''
+    for i in range(retries): 
+        if type(lat) == float and type(lon) == float: 
+            break
+        print("Retry time stamp position.")
+        keys = [key for key, value in (("PLANE_LATITUDE", lat), ("PLANE_LONGITUDE", lon)) 
+                if type(value) != float]
+        if engine is None: 
+            values = {key:_AQ.get(key) for key in keys}
+        else: 
+            values = engine.call(engine.get_many(keys))
+        lat = values.get("PLANE_LATITUDE", lat)
+        lon = values.get("PLANE_LONGITUDE", lon)
+    if type(lat) != float or type(lon) != float: 
+        lat, lon = None, None
+    return lat, lon
+
+def get_local_time_stamp(_AQ, _TF, lat=None, lon=None, retries=3, engine=None): 
     '''
     Function gets local time stamp depending where the current flights lat and 
-    lon. 
+    lon. The timezone comes from the _TF TimezoneResolver, which only does a 
+    full lookup when the aircraft enters a new grid cell. Used for the flight 
+    header; samples are stamped in UTC by get_flight_data. 
+
+    Parameters
+    ----------
+    lat : Float, optional
+        Latitude already read for this sample. Read from _AQ if None.
+    lon : Float, optional
+        Longitude already read for this sample. Read from _AQ if None.
+    retries : Integer
+        Number of times to re-read a missing lat/lon before falling back to 
+        the last known timezone.
+    engine : SamplingEngine, optional
+        Engine the lat/lon are re-read through; see get_position.
 
     Returns
     -------
-    timestamp: String
-        String timestamp.
+    timestamp: datetime
+        Local time stamp.
 
     '''
-    long = _AQ.get("PLANE_LONGITUDE")
-    lat = _AQ.get("PLANE_LATITUDE")
-    try: 
-        if type(lat) != float: 
-            lat = _AQ.get("PLANE_LONGITUDE")
-            
-        if type(long) != float: 
-            long = _AQ.get("PLANE_LATITUDE")
-            
-        timezone_str = _TF.certain_timezone_at(lat=round(lat,10), 
-                                               lng=round(long,10)) 
-        timezone = pytz.timezone(timezone_str)
-        dt = datetime.utcnow()
-        timestamp = dt + timezone.utcoffset(dt)
-    except:
-        print("Retry time stamp time stamp.")
-        timestamp = get_local_time_stamp(_AQ,_TF)
-        
+    lat, lon = get_position(_AQ, lat, lon, retries, engine)
+    timestamp = _TF.local_time(lat, lon)
     return timestamp
 
-def get_start_flight_data(_AQ, _TF, fnum): 
+def update_timezone(flight_dict, _AQ, _TF, time_ns, lat=None, lon=None, engine=None): 
     '''
-    Data here is used to build a header data for the flight. 
+    Function starts a new timezone segment in flight_dict.timezones when the 
+    UTC offset at the aircraft position differs from the current segment. 
+
+    Parameters
+    ----------
+    time_ns : Integer
+        UTC time of the sample in nanoseconds since the epoch.
+    engine : SamplingEngine, optional
+        Engine a missing lat/lon is re-read through; see get_position.
+
+    Returns
+    -------
+    changed : Bool
+        True if a segment was started.
+
+    '''
+    offset, zone = _TF.utc_offset(*get_position(_AQ, lat, lon, engine=engine), time_ns)
+    timezones = flight_dict.timezones
+    if timezones and timezones[-1][1:] == (offset, zone): 
+        return False
+    timezones.append((time_ns, offset, zone))
+    return True
+
+# Recorded channels and their dtypes. Numeric channels are float64, the 
+# TIME_NS time stamp is int64; local time is rendered on export from the 
+# timezone segments of the flight.
+FLIGHT_DATA_SCHEMA = angfb.FlightSchema([
+                                         ("TIME_NS", 'q'), # UTC nanoseconds since the epoch
+                                         ("PLANE_LATITUDE", 'd'), # In Degrees; North is positive, South negative
+                                         ("PLANE_LONGITUDE", 'd'), # In Degrees;  East is positive, West negative
+                                         ("PLANE_ALTITUDE", 'd'), # Feet from sea level
+                                         ("PLANE_ALT_ABOVE_GROUND", 'd'), # Feet from ground
+                                         ("AMBIENT_WIND_VELOCITY", 'd'), # In knots
+                                         ("AMBIENT_WIND_DIRECTION", 'd'), # In degrees
+                                         ("AMBIENT_WIND_X", 'd'), # Wind component in East/West direction. Meters per sec.
+                                         ("AMBIENT_WIND_Y", 'd'), # Wind component in vertical direction. Meters per sec.
+                                         ("AMBIENT_WIND_Z", 'd'), # Wind component in North/South direction. Meters per sec.
+                                         ("AIRCRAFT_WIND_X", 'd'), # Wind component in aircraft lateral axis
+                                         ("AIRCRAFT_WIND_Y", 'd'), # Wind component in aircraft vertical axis
+                                         ("AIRCRAFT_WIND_Z", 'd'), # Wind component in aircraft longitudinal axis
+                                         ("AMBIENT_VISIBILITY", 'd'), # In Meters
+                                         ("AMBIENT_TEMPERATURE", 'd'), # Celsius
+                                         ("BAROMETER_PRESSURE", 'd'), # Determines air density, which impacts lift and engine performance
+                                         ("AILERON_LEFT_DEFLECTION", 'd'), # In Radians
+                                         ("AILERON_RIGHT_DEFLECTION", 'd'), # In Radians
+                                         ("ANGLE_OF_ATTACK_INDICATOR", 'd'), # In Radians
+                                         ("AIRSPEED_TRUE", 'd'), # In Knots
+                                         ("GROUND_VELOCITY", 'd'), # In Knots
+                                         ("GPS_WP_TRUE_BEARING", 'd'), # In Radians
+                                         ("GPS_WP_DISTANCE", 'd'), # In Meters
+                                         ("ELEVATOR_TRIM_POSITION", 'd'), # In Radians
+                                         ("FLAPS_HANDLE_PERCENT", 'd'), # Percent Over 100
+                                         ("HEADING_INDICATOR", 'd'), # In Radians
+                                         ("PLANE_PITCH_DEGREES", 'd'), # In Radians; mentions degrees in err
+                                         ("PLANE_BANK_DEGREES", 'd'), # In Radians; mentions degrees in err
+                                         ("RUDDER_POSITION", 'd'), # Percent rudder input deflection
+                                         ("VERTICAL_SPEED", 'd'), # In feet/minute
+                                         ("G_FORCE", 'd'),
+                                         ("FUEL_TOTAL_QUANTITY", 'd'), # In Gallons
+                                         ("GENERAL_ENG_THROTTLE_LEVER_POSITION:1", 'd'), # Percent of max throttle position
+                                         ("GENERAL_ENG_THROTTLE_LEVER_POSITION:2", 'd'),
+                                         ("GENERAL_ENG_THROTTLE_LEVER_POSITION:3", 'd'),
+                                         ("GENERAL_ENG_THROTTLE_LEVER_POSITION:4", 'd'),
+                                         ("PROP_THRUST:1", 'd'), # In Pounds
+                                         ("PROP_THRUST:2", 'd'),
+                                         ("PROP_THRUST:3", 'd'),
+                                         ("PROP_THRUST:4", 'd'),
+                                         ("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:1", 'd'), # In Rankine
+                                         ("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:2", 'd'),
+                                         ("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:3", 'd'),
+                                         ("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:4", 'd'),
+                                         ("GENERAL_ENG_FUEL_PRESSURE:1", 'd'), # In Psi
+                                         ("GENERAL_ENG_FUEL_PRESSURE:2", 'd'),
+                                         ("GENERAL_ENG_FUEL_PRESSURE:3", 'd'),
+                                         ("GENERAL_ENG_FUEL_PRESSURE:4", 'd'),
+                                         ("ENG_FUEL_FLOW_GPH:1", 'd'), # In Gallons Per Hour
+                                         ("ENG_FUEL_FLOW_GPH:2", 'd'),
+                                         ("ENG_FUEL_FLOW_GPH:3", 'd'),
+                                         ("ENG_FUEL_FLOW_GPH:4", 'd'),
+                                         ("TURB_ENG_VIBRATION:1", 'd'), # Number/Float
+                                         ("TURB_ENG_VIBRATION:2", 'd'),
+                                         ("TURB_ENG_VIBRATION:3", 'd'),
+                                         ("TURB_ENG_VIBRATION:4", 'd'),
+                                         ("GENERAL_ENG_OIL_PRESSURE:1", 'd'), # In Psf
+                                         ("GENERAL_ENG_OIL_PRESSURE:2", 'd'),
+                                         ("GENERAL_ENG_OIL_PRESSURE:3", 'd'),
+                                         ("GENERAL_ENG_OIL_PRESSURE:4", 'd'),
+                                         ("GENERAL_ENG_RPM:1", 'd'),
+                                         ("GENERAL_ENG_RPM:2", 'd'),
+                                         ("GENERAL_ENG_RPM:3", 'd'),
+                                         ("GENERAL_ENG_RPM:4", 'd'),
+                                         ("FUEL_TANK_RIGHT_MAIN_QUANTITY", 'd'), # In Gallons
+                                         ("FUEL_TANK_LEFT_MAIN_QUANTITY", 'd'), # In Gallons
+                                         ("FUEL_TOTAL_QUANTITY_WEIGHT", 'd'), # In Pounds
+                                         ("STALL_WARNING", 'd'),
+                                         ("OVERSPEED_WARNING", 'd'),
+                                         ("SIMULATION_RATE", 'd'), # Sim time multiplier
+                                         ])
+
+# SimVars read for each sample; TIME_NS is stamped by the recorder
+FLIGHT_DATA_SIMVARS = [name for name in FLIGHT_DATA_SCHEMA.names 
+                       if name != anggroups.TIME_CHANNEL]
+
+# Deadband tolerance per channel; a value is stored only when it moves more 
+# than this from the last stored value. Engine channels apply to every engine. 
+# Channels not listed are stored on any change. 
+FLIGHT_DATA_DEADBAND = {"PLANE_LATITUDE":1e-6, # About 0.1 m
+                        "PLANE_LONGITUDE":1e-6,
+                        "PLANE_ALTITUDE":1.0,
+                        "PLANE_ALT_ABOVE_GROUND":1.0,
+                        "AMBIENT_WIND_VELOCITY":0.1,
+                        "AMBIENT_WIND_DIRECTION":1.0,
+                        "AMBIENT_WIND_X":0.05,
+                        "AMBIENT_WIND_Y":0.05,
+                        "AMBIENT_WIND_Z":0.05,
+                        "AIRCRAFT_WIND_X":0.05,
+                        "AIRCRAFT_WIND_Y":0.05,
+                        "AIRCRAFT_WIND_Z":0.05,
+                        "AMBIENT_VISIBILITY":10.0,
+                        "AMBIENT_TEMPERATURE":0.1,
+                        "BAROMETER_PRESSURE":0.01,
+                        "AILERON_LEFT_DEFLECTION":0.001,
+                        "AILERON_RIGHT_DEFLECTION":0.001,
+                        "ANGLE_OF_ATTACK_INDICATOR":0.001,
+                        "AIRSPEED_TRUE":0.1,
+                        "GROUND_VELOCITY":0.1,
+                        "GPS_WP_TRUE_BEARING":0.001,
+                        "GPS_WP_DISTANCE":1.0,
+                        "ELEVATOR_TRIM_POSITION":0.001,
+                        "FLAPS_HANDLE_PERCENT":0.001,
+                        "HEADING_INDICATOR":0.001,
+                        "PLANE_PITCH_DEGREES":0.001,
+                        "PLANE_BANK_DEGREES":0.001,
+                        "RUDDER_POSITION":0.1,
+                        "VERTICAL_SPEED":10.0,
+                        "G_FORCE":0.01,
+                        "FUEL_TOTAL_QUANTITY":0.01,
+                        "GENERAL_ENG_THROTTLE_LEVER_POSITION":0.1,
+                        "PROP_THRUST":1.0,
+                        "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE":1.0,
+                        "GENERAL_ENG_FUEL_PRESSURE":0.1,
+                        "ENG_FUEL_FLOW_GPH":0.01,
+                        "TURB_ENG_VIBRATION":0.01,
+                        "GENERAL_ENG_OIL_PRESSURE":1.0,
+                        "GENERAL_ENG_RPM":1.0,
+                        "FUEL_TANK_RIGHT_MAIN_QUANTITY":0.01,
+                        "FUEL_TANK_LEFT_MAIN_QUANTITY":0.01,
+                        "FUEL_TOTAL_QUANTITY_WEIGHT":0.1,
+                        }
+
+# Channel groups sampled at their own rate: group name -> (Hz, channels). 
+# Every other channel is in the main group, sampled at the recorder sample 
+# rate. Each group is one SimConnect request and one ./data/f#/f#.<group>.log. 
+CHANNEL_GROUPS = {"attitude":(10.0, ["PLANE_PITCH_DEGREES", 
+                                     "PLANE_BANK_DEGREES", 
+                                     "AILERON_LEFT_DEFLECTION", 
+                                     "AILERON_RIGHT_DEFLECTION", 
+                                     "RUDDER_POSITION", 
+                                     "G_FORCE", 
+                                     ]),
+                  "slow":(0.1, ["AMBIENT_TEMPERATURE", 
+                                "BAROMETER_PRESSURE", 
+                                "AMBIENT_VISIBILITY", 
+                                "FUEL_TOTAL_QUANTITY", 
+                                "FUEL_TANK_RIGHT_MAIN_QUANTITY", 
+                                "FUEL_TANK_LEFT_MAIN_QUANTITY", 
+                                "FUEL_TOTAL_QUANTITY_WEIGHT", 
+                                ]),
+                  }
+
+# Burst capture: BURST_CHANNELS are sampled at BURST_RATE_HZ into a ring 
+# buffer; when a trigger channel leaves its (low, high) range the seconds 
+# around the event are saved to ./data/f#/bursts/. None leaves a side open. 
+BURST_CHANNELS = ["PLANE_ALT_ABOVE_GROUND", 
+                  "AIRSPEED_TRUE", 
+                  "VERTICAL_SPEED", 
+                  "G_FORCE", 
+                  "ANGLE_OF_ATTACK_INDICATOR", 
+                  "PLANE_PITCH_DEGREES", 
+                  "PLANE_BANK_DEGREES", 
+                  "AILERON_LEFT_DEFLECTION", 
+                  "AILERON_RIGHT_DEFLECTION", 
+                  "RUDDER_POSITION", 
+                  "STALL_WARNING", 
+                  "OVERSPEED_WARNING", 
+                  ]
+# Ranges are exceedances, not normal flight: jets climb and descend at up to 
+# about 4000 feet/minute, so a normal climb or descent never trips a burst. 
+BURST_TRIGGERS = {"STALL_WARNING":(None, 0.5), 
+                  "OVERSPEED_WARNING":(None, 0.5), 
+                  "G_FORCE":(-0.5, 2.5), 
+                  "VERTICAL_SPEED":(-6000.0, 6000.0), # In feet/minute
+                  }
+BURST_RATE_HZ = 20.0
+BURST_PRE_SECONDS = 10.0
+BURST_POST_SECONDS = 10.0
+
+# Sample rate of every channel group per flight phase, as a factor of its 
+# configured rate: fast near the ground, slow in stable cruise. Rates are 
+# capped at MAX_PHASE_RATE_HZ. 
+PHASE_RATE_FACTORS = {angphase.PARKED:0.25, 
+                      angphase.TAXI:1.0, 
+                      angphase.TAKEOFF:4.0, 
+                      angphase.CLIMB:1.0, 
+                      angphase.CRUISE:0.25, 
+                      angphase.DESCENT:1.0, 
+                      angphase.APPROACH:4.0, 
+                      angphase.LANDING:4.0, 
+                      }
+MAX_PHASE_RATE_HZ = 50.0
+
+# Flight header fields and the SimVar each one is read from
+FLIGHT_HEADER_SIMVARS = {"ATC_FLIGHT_NUMBER":"ATC_FLIGHT_NUMBER",
+                         "ATC_TYPE":"ATC_TYPE",
+                         "ATC_MODEL":"ATC_MODEL",
+                         "TOTAL_WEIGHT":"TOTAL_WEIGHT", # In Pounds 
+                         "ENGINE_TYPE":"ENGINE_TYPE",
+                         "NUMBER_OF_ENGINES":"NUMBER_OF_ENGINES",
+                         "PLANE_LATITUDE":"PLANE_LATITUDE",
+                         "PLANE_LONGITUDE":"PLANE_LONGITUDE",
+                         "PLANE_ALTITUDE":"PLANE_ALTITUDE",
+                         "PLANE_ALT_ABOVE_GROUND":"PLANE_ALT_ABOVE_GROUND", # Feet from ground
+                         "DESTINATION_LAT":"GPS_WP_NEXT_LAT",
+                         "DESTINATION_LON":"GPS_WP_NEXT_LON",
+                         "DESTINATION_ALT":"GPS_WP_NEXT_ALT", 
+                         "FUEL_TOTAL_QUANTITY":"FUEL_TOTAL_QUANTITY" # In Gallons
+                         } 
+
+def get_channel_groups(sample_rate_hz=1.0, channel_groups=None, clock=None): 
+    '''
+    Function splits FLIGHT_DATA_SCHEMA into channel groups. 
+
+    Parameters
+    ----------
+    sample_rate_hz : Float
+        Rate of the main group.
+    channel_groups : Dictionary, optional
+        Group name -> (rate_hz, channel names); defaults to CHANNEL_GROUPS. 
+        An empty dictionary records every channel in the main group.
+    clock : Callable, optional
+        Monotonic clock deciding when groups are due.
+
+    Returns
+    -------
+    groups : List
+        ChannelGroup list; the main group first.
+
+    '''
+    if channel_groups is None: 
+        channel_groups = CHANNEL_GROUPS
+    kwargs = {} if clock is None else {"clock":clock}
+    groups = anggroups.split_schema(FLIGHT_DATA_SCHEMA, channel_groups, 
+                                    sample_rate_hz, **kwargs)
+    return groups
+
+def connect_groups(_SM, _AQ, groups): 
+    '''
+    Function registers one SimConnect batch request per channel group.
 
     Returns
     -------
     None.
 
     '''
-    header_dict = {"LOCAL_TIME":get_local_time_stamp(_AQ, _TF),
+    for group in groups: 
+        group.batch = connect_bq(_SM, _AQ, group.simvars)
+    return 
+
+def plan_flight_schema(header_dict, schema=FLIGHT_DATA_SCHEMA): 
+    '''
+    Function returns the channels to record for the aircraft in the flight 
+    header: engine slots the aircraft does not have and channels that do not 
+    apply to its ENGINE_TYPE are left out and listed in schema.omitted. 
+
+    Parameters
+    ----------
+    header_dict : Dictionary
+        Flight header from make_flight_header.
+    schema : FlightSchema
+        Full schema to plan from.
+
+    Returns
+    -------
+    planned : FlightSchema
+
+    '''
+    planned = angplan.plan_schema(schema, header_dict)
+    return planned
+
+def plan_channel_groups(_SM, _AQ, groups, header_dict): 
+    '''
+    Function applies the request plan of the flight header to every channel 
+    group and reconnects the SimConnect batch of the groups that changed.
+
+    Returns
+    -------
+    None.
+
+    '''
+    for group in groups: 
+        planned = plan_flight_schema(header_dict, group.base_schema)
+        changed = planned.names != group.schema.names
+        group.set_schema(planned)
+        if changed or group.batch is None: 
+            group.batch = connect_bq(_SM, _AQ, group.simvars)
+    return 
+
+def get_start_flight_data(_AQ, _TF, fnum, _HQ=None, engine=None): 
+    '''
+    Data here is used to build a header data for the flight. 
+
+    Parameters
+    ----------
+    _HQ : SimVarBatch, optional
+        Batch for the FLIGHT_HEADER_SIMVARS SimVars. Without it every SimVar 
+        is a separate _AQ.get round-trip.
+    engine : SamplingEngine, optional
+        Engine the header is read through; see connect_engine.
+
+    Returns
+    -------
+    header_dict : Dictionary
+        Flight header.
+
+    '''
+    if engine is not None: 
+        sample = engine.call(engine.read(_HQ, FLIGHT_HEADER_SIMVARS.values()))
+    elif _HQ is None: 
+        sample = angbatch.get_sequential_sample(_AQ, FLIGHT_HEADER_SIMVARS.values())
+    else: 
+        sample = _HQ.get_sample()
+    header_dict = {"LOCAL_TIME":get_local_time_stamp(_AQ, _TF, 
+                                                     sample["PLANE_LATITUDE"], 
+                                                     sample["PLANE_LONGITUDE"], 
+                                                     engine=engine),
                    "ANG_FLIGHT_NUMBER":fnum,
-                   "ATC_FLIGHT_NUMBER":_AQ.get("ATC_FLIGHT_NUMBER"),
-                   "ATC_TYPE":_AQ.get("ATC_TYPE"),
-                   "ATC_MODEL":_AQ.get("ATC_MODEL"),
-                   "TOTAL_WEIGHT":_AQ.get("TOTAL_WEIGHT"), # In Pounds 
-                   "ENGINE_TYPE":_AQ.get("ENGINE_TYPE"),
-                   "NUMBER_OF_ENGINES":_AQ.get("NUMBER_OF_ENGINES"),
-                   "PLANE_LATITUDE":_AQ.get("PLANE_LATITUDE"),
-                   "PLANE_LONGITUDE":_AQ.get("PLANE_LONGITUDE"),
-                   "PLANE_ALTITUDE":_AQ.get("PLANE_ALTITUDE"),
-                   "PLANE_ALT_ABOVE_GROUND":_AQ.get("PLANE_ALT_ABOVE_GROUND"), # Feet from ground
-                   "DESTINATION_LAT":_AQ.get("GPS_WP_NEXT_LAT"),
-                   "DESTINATION_LON":_AQ.get("GPS_WP_NEXT_LON"),
-                   "DESTINATION_ALT":_AQ.get("GPS_WP_NEXT_ALT"), 
-                   "FUEL_TOTAL_QUANTITY":_AQ.get("FUEL_TOTAL_QUANTITY") # In Gallons
-                   } 
+                   }
+    for k, simvar in FLIGHT_HEADER_SIMVARS.items(): 
+        header_dict[k] = sample[simvar]
     return header_dict
 
-def get_flight_data(flight_dict, _AQ, _TF):
+def get_flight_data(flight_dict, _AQ, _TF, _BQ=None, sample=None, period=None, 
+                    engine=None):
     '''
     Data here is monitored throughout the flight and stored 
-    in a dictionary. 
+    in a dictionary. One sample of every channel in FLIGHT_DATA_SCHEMA is 
+    appended per call, stamped with EPOCH_CLOCK, and published on 
+    TELEMETRY_BUS. A timezone segment is added to flight_dict.timezones when 
+    the UTC offset changes. 
+
+    Parameters
+    ----------
+    flight_dict : FlightBuffer
+        Flight data dictionary.
+    _BQ : SimVarBatch, optional
+        Batch for FLIGHT_DATA_SIMVARS; reads the whole sample in one SimConnect 
+        request. Without it every SimVar is a separate _AQ.get round-trip.
+    sample : Dictionary, optional
+        SimVar values already read for this sample, i.e. by the sampling 
+        engine; nothing is read from SimConnect then.
+    period : Float, optional
+        Seconds until the next main sample, published with the sample.
+    engine : SamplingEngine, optional
+        Engine a missing lat/lon is re-read through; see update_timezone.
     
     Returns
     -------
-    None.
+    flight_dict : FlightBuffer
+        Flight data dictionary with the sample appended.
 
     '''
-    flight_dict["LOCAL_TIME"].append(get_local_time_stamp(_AQ, _TF))
-    flight_dict["AIRSPEED_TRUE"].append(_AQ.get("AIRSPEED_TRUE")) # In Knots
-    flight_dict["GROUND_VELOCITY"].append(_AQ.get("GROUND_VELOCITY")) # In Knots
-    flight_dict["PLANE_LATITUDE"].append(_AQ.get("PLANE_LATITUDE")) # In Degrees; North is positive, South negative
-    flight_dict["PLANE_LONGITUDE"].append(_AQ.get("PLANE_LONGITUDE")) # In Degrees;  East is positive, West negative
-    flight_dict["PLANE_ALTITUDE"].append(_AQ.get("PLANE_ALTITUDE")) # Feet from sea level 
-    flight_dict["PLANE_ALT_ABOVE_GROUND"].append(_AQ.get("PLANE_ALT_ABOVE_GROUND")) # Feet from ground
-    flight_dict["AMBIENT_WIND_VELOCITY"].append(_AQ.get("AMBIENT_WIND_VELOCITY")) # In knots
-    flight_dict["AMBIENT_WIND_DIRECTION"].append(_AQ.get("AMBIENT_WIND_DIRECTION")) # In degrees
-    flight_dict["AMBIENT_WIND_X"].append(_AQ.get("AMBIENT_WIND_X")) # Wind component in East/West direction. Meters per sec.
-    flight_dict["AMBIENT_WIND_Y"].append(_AQ.get("AMBIENT_WIND_Y")) # Wind component in vertical direction. Meters per sec.
-    flight_dict["AMBIENT_WIND_Z"].append(_AQ.get("AMBIENT_WIND_Z")) # Wind component in North/South direction. Meters per sec. 
-    flight_dict["AIRCRAFT_WIND_X"].append(_AQ.get("AIRCRAFT_WIND_X")) # Wind component in aircraft lateral axis
-    flight_dict["AIRCRAFT_WIND_Y"].append(_AQ.get("AIRCRAFT_WIND_Y")) # Wind component in aircraft vertical axis
-    flight_dict["AIRCRAFT_WIND_Z"].append(_AQ.get("AIRCRAFT_WIND_Z")) # Wind component in aircraft longitudinal axis
-    flight_dict["AMBIENT_VISIBILITY"].append(_AQ.get("AMBIENT_VISIBILITY")) # In Meters 
-    flight_dict["AMBIENT_TEMPERATURE"].append(_AQ.get("AMBIENT_TEMPERATURE")) # Celsius
-    flight_dict["BAROMETER_PRESSURE"].append(_AQ.get("BAROMETER_PRESSURE")) # Determines air density, which impacts lift and engine performance
-    flight_dict["AILERON_LEFT_DEFLECTION"].append(_AQ.get("AILERON_LEFT_DEFLECTION")) # In Radians 
-    flight_dict["AILERON_RIGHT_DEFLECTION"].append(_AQ.get("AILERON_RIGHT_DEFLECTION")) # In Radians 
-    flight_dict["ANGLE_OF_ATTACK_INDICATOR"].append(_AQ.get("ANGLE_OF_ATTACK_INDICATOR")) # In Radians 
-    flight_dict["GPS_WP_TRUE_BEARING"].append(_AQ.get("GPS_WP_TRUE_BEARING")) # In Radians 
-    flight_dict["GPS_WP_DISTANCE"].append(_AQ.get("GPS_WP_DISTANCE")) # In Meters
-    flight_dict["ELEVATOR_TRIM_POSITION"].append(_AQ.get("ELEVATOR_TRIM_POSITION")) # In Radians
-    flight_dict["FLAPS_HANDLE_PERCENT"].append(_AQ.get("FLAPS_HANDLE_PERCENT")) # Percent Over 100
-    flight_dict["HEADING_INDICATOR"].append(_AQ.get("HEADING_INDICATOR")) # In Radians
-    flight_dict["PLANE_PITCH_DEGREES"].append(_AQ.get("PLANE_PITCH_DEGREES")) # In Radians; mentions degrees in err
-    flight_dict["PLANE_BANK_DEGREES"].append(_AQ.get("PLANE_BANK_DEGREES")) # In Radians; mentions degrees in err
-    flight_dict["RUDDER_POSITION"].append(_AQ.get("RUDDER_POSITION")) # Percent rudder input deflection
-    flight_dict["VERTICAL_SPEED"].append(_AQ.get("VERTICAL_SPEED")) # In feet/minute
-    flight_dict["G_FORCE"].append(_AQ.get("G_FORCE")) 
-    flight_dict["FUEL_TOTAL_QUANTITY"].append(_AQ.get("FUEL_TOTAL_QUANTITY")) # In Gallons 
-    flight_dict["GENERAL_ENG_THROTTLE_LEVER_POSITION:1"].append(_AQ.get("GENERAL_ENG_THROTTLE_LEVER_POSITION:1")) # Percent of max throttle position
-    flight_dict["GENERAL_ENG_THROTTLE_LEVER_POSITION:2"].append(_AQ.get("GENERAL_ENG_THROTTLE_LEVER_POSITION:2")) 
-    flight_dict["GENERAL_ENG_THROTTLE_LEVER_POSITION:3"].append(_AQ.get("GENERAL_ENG_THROTTLE_LEVER_POSITION:3")) 
-    flight_dict["GENERAL_ENG_THROTTLE_LEVER_POSITION:4"].append(_AQ.get("GENERAL_ENG_THROTTLE_LEVER_POSITION:4")) 
-    flight_dict["PROP_THRUST:1"].append(_AQ.get("PROP_THRUST:1")) # In Pounds 
-    flight_dict["PROP_THRUST:2"].append(_AQ.get("PROP_THRUST:2"))
-    flight_dict["PROP_THRUST:3"].append(_AQ.get("PROP_THRUST:3"))
-    flight_dict["PROP_THRUST:4"].append(_AQ.get("PROP_THRUST:4"))
-    flight_dict["GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:1"].append(_AQ.get("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:1")) # In Rankine
-    flight_dict["GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:2"].append(_AQ.get("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:2"))
-    flight_dict["GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:3"].append(_AQ.get("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:3"))
-    flight_dict["GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:4"].append(_AQ.get("GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:4"))
-    flight_dict["GENERAL_ENG_FUEL_PRESSURE:1"].append(_AQ.get("GENERAL_ENG_FUEL_PRESSURE:1")) # In Psi
-    flight_dict["GENERAL_ENG_FUEL_PRESSURE:2"].append(_AQ.get("GENERAL_ENG_FUEL_PRESSURE:2"))
-    flight_dict["GENERAL_ENG_FUEL_PRESSURE:3"].append(_AQ.get("GENERAL_ENG_FUEL_PRESSURE:3"))
-    flight_dict["GENERAL_ENG_FUEL_PRESSURE:4"].append(_AQ.get("GENERAL_ENG_FUEL_PRESSURE:4"))
-    flight_dict["ENG_FUEL_FLOW_GPH:1"].append(_AQ.get("ENG_FUEL_FLOW_GPH:1")) # In Gallons Per Hour 
-    flight_dict["ENG_FUEL_FLOW_GPH:2"].append(_AQ.get("ENG_FUEL_FLOW_GPH:2"))
-    flight_dict["ENG_FUEL_FLOW_GPH:3"].append(_AQ.get("ENG_FUEL_FLOW_GPH:3"))
-    flight_dict["ENG_FUEL_FLOW_GPH:4"].append(_AQ.get("ENG_FUEL_FLOW_GPH:4"))
-    flight_dict["TURB_ENG_VIBRATION:1"].append(_AQ.get("TURB_ENG_VIBRATION:1")) # Number/Float
-    flight_dict["TURB_ENG_VIBRATION:2"].append(_AQ.get("TURB_ENG_VIBRATION:2"))
-    flight_dict["TURB_ENG_VIBRATION:3"].append(_AQ.get("TURB_ENG_VIBRATION:3"))
-    flight_dict["TURB_ENG_VIBRATION:4"].append(_AQ.get("TURB_ENG_VIBRATION:4"))
-    flight_dict["GENERAL_ENG_OIL_PRESSURE:1"].append(_AQ.get("GENERAL_ENG_OIL_PRESSURE:1")) # In Psf 
-    flight_dict["GENERAL_ENG_OIL_PRESSURE:2"].append(_AQ.get("GENERAL_ENG_OIL_PRESSURE:2"))
-    flight_dict["GENERAL_ENG_OIL_PRESSURE:3"].append(_AQ.get("GENERAL_ENG_OIL_PRESSURE:3"))
-    flight_dict["GENERAL_ENG_OIL_PRESSURE:4"].append(_AQ.get("GENERAL_ENG_OIL_PRESSURE:4"))
-    flight_dict["GENERAL_ENG_RPM:1"].append(_AQ.get("GENERAL_ENG_RPM:1")) 
-    flight_dict["GENERAL_ENG_RPM:2"].append(_AQ.get("GENERAL_ENG_RPM:2"))
-    flight_dict["GENERAL_ENG_RPM:3"].append(_AQ.get("GENERAL_ENG_RPM:3"))
-    flight_dict["GENERAL_ENG_RPM:4"].append(_AQ.get("GENERAL_ENG_RPM:4"))
-    flight_dict["FUEL_TANK_RIGHT_MAIN_QUANTITY"].append(_AQ.get("FUEL_TANK_RIGHT_MAIN_QUANTITY")) # In Gallons
-    flight_dict["FUEL_TANK_LEFT_MAIN_QUANTITY"].append(_AQ.get("FUEL_TANK_LEFT_MAIN_QUANTITY")) # In Gallons
-    flight_dict["FUEL_TOTAL_QUANTITY_WEIGHT"].append(_AQ.get("FUEL_TOTAL_QUANTITY_WEIGHT")) # In Pounds 
-    flight_dict["STALL_WARNING"].append(_AQ.get("STALL_WARNING"))
-    flight_dict["OVERSPEED_WARNING"].append(_AQ.get("OVERSPEED_WARNING"))
-    # flight_dict[""].append(_AQ.get(""))
+    if sample is not None: 
+        sample = dict(sample)
+    elif _BQ is None: 
+        simvars = [name for name in flight_dict.schema.names 
+                   if name != anggroups.TIME_CHANNEL]
+        sample = angbatch.get_sequential_sample(_AQ, simvars)
+    else: 
+        sample = _BQ.get_sample()
+    time_ns = EPOCH_CLOCK()
+    sample[anggroups.TIME_CHANNEL] = time_ns
+    update_timezone(flight_dict, _AQ, _TF, time_ns, 
+                    sample.get("PLANE_LATITUDE"), sample.get("PLANE_LONGITUDE"), 
+                    engine)
+    flight_dict.append_sample(sample)
+    TELEMETRY_BUS.publish(sample, period)
     return flight_dict
 
-def get_flight_dictionary(): 
+def get_flight_dictionary(schema=FLIGHT_DATA_SCHEMA): 
     '''
     Function creates a flight data dictionary. 
 
+    Parameters
+    ----------
+    schema : FlightSchema
+        Recorded channels; FLIGHT_DATA_SCHEMA or the main channel group schema.
+
     Returns
     -------
-    flight_dict : Dictionary
-        A flight dictionary containing all key fields of recorded flight data.
-
-    '''
-    flight_dict = {"LOCAL_TIME":[],
-                   "PLANE_LATITUDE":[],
-                   "PLANE_LONGITUDE":[],
-                   "PLANE_ALTITUDE":[],
-                   "PLANE_ALT_ABOVE_GROUND":[],
-                   "AMBIENT_WIND_VELOCITY":[],
-                   "AMBIENT_WIND_DIRECTION":[],
-                   "AMBIENT_WIND_X":[],
-                   "AMBIENT_WIND_Y":[],
-                   "AMBIENT_WIND_Z":[],
-                   "AIRCRAFT_WIND_X":[],
-                   "AIRCRAFT_WIND_Y":[],
-                   "AIRCRAFT_WIND_Z":[],
-                   "AMBIENT_VISIBILITY":[],
-                   "AMBIENT_TEMPERATURE":[],
-                   "BAROMETER_PRESSURE":[],
-                   "AILERON_LEFT_DEFLECTION":[],
-                   "AILERON_RIGHT_DEFLECTION":[],
-                   "ANGLE_OF_ATTACK_INDICATOR":[],
-                   "AIRSPEED_TRUE":[],
-                   "GROUND_VELOCITY":[],
-                   "GPS_WP_TRUE_BEARING":[],
-                   "GPS_WP_DISTANCE":[],
-                   "ELEVATOR_TRIM_POSITION":[],
-                   "FLAPS_HANDLE_PERCENT":[],
-                   "HEADING_INDICATOR":[],
-                   "PLANE_PITCH_DEGREES":[],
-                   "PLANE_BANK_DEGREES":[],
-                   "RUDDER_POSITION":[],
-                   "VERTICAL_SPEED":[],
-                   "G_FORCE":[],
-                   "FUEL_TOTAL_QUANTITY":[],
-                   "GENERAL_ENG_THROTTLE_LEVER_POSITION:1":[],
-                   "GENERAL_ENG_THROTTLE_LEVER_POSITION:2":[],
-                   "GENERAL_ENG_THROTTLE_LEVER_POSITION:3":[],
-                   "GENERAL_ENG_THROTTLE_LEVER_POSITION:4":[],
-                   "PROP_THRUST:1":[], 
-                   "PROP_THRUST:2":[], 
-                   "PROP_THRUST:3":[], 
-                   "PROP_THRUST:4":[], 
-                   "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:1":[],
-                   "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:2":[],
-                   "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:3":[],
-                   "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE:4":[],
-                   "GENERAL_ENG_FUEL_PRESSURE:1":[],
-                   "GENERAL_ENG_FUEL_PRESSURE:2":[],
-                   "GENERAL_ENG_FUEL_PRESSURE:3":[],
-                   "GENERAL_ENG_FUEL_PRESSURE:4":[],
-                   "ENG_FUEL_FLOW_GPH:1":[],
-                   "ENG_FUEL_FLOW_GPH:2":[],
-                   "ENG_FUEL_FLOW_GPH:3":[],
-                   "ENG_FUEL_FLOW_GPH:4":[],
-                   "TURB_ENG_VIBRATION:1":[],
-                   "TURB_ENG_VIBRATION:2":[],
-                   "TURB_ENG_VIBRATION:3":[],
-                   "TURB_ENG_VIBRATION:4":[],
-                   "GENERAL_ENG_OIL_PRESSURE:1":[],
-                   "GENERAL_ENG_OIL_PRESSURE:2":[],
-                   "GENERAL_ENG_OIL_PRESSURE:3":[],
-                   "GENERAL_ENG_OIL_PRESSURE:4":[],
-                   "GENERAL_ENG_RPM:1":[],
-                   "GENERAL_ENG_RPM:2":[],
-                   "GENERAL_ENG_RPM:3":[],
-                   "GENERAL_ENG_RPM:4":[],
-                   "FUEL_TANK_RIGHT_MAIN_QUANTITY":[],
-                   "FUEL_TANK_LEFT_MAIN_QUANTITY":[],
-                   "FUEL_TOTAL_QUANTITY_WEIGHT":[],
-                   "STALL_WARNING":[],
-                   "OVERSPEED_WARNING":[],
-                   # "":[],
-                   }
+    flight_dict : FlightBuffer
+        A columnar flight dictionary containing all key fields of recorded 
+        flight data; see FLIGHT_DATA_SCHEMA.
+
+    '''
+    flight_dict = angfb.FlightBuffer(schema)
     return flight_dict
 
-def update_flight_dict(flight_dict, _AQ, _TF): 
+def update_flight_dict(flight_dict, _AQ, _TF, _BQ=None, sample=None, period=None, 
+                       engine=None): 
     '''
     Function updates the flight data dict. 
 
@@ -332,6 +734,14 @@ def update_flight_dict(flight_dict, _AQ, _TF):
     ----------
     flight_dict : Dictionary.
         Flight data dictionary.
+    _BQ : SimVarBatch, optional
+        Batch used to read the sample; see get_flight_data.
+    sample : Dictionary, optional
+        SimVar values already read for this sample.
+    period : Float, optional
+        Seconds until the next main sample; see get_flight_data.
+    engine : SamplingEngine, optional
+        Engine reading from SimConnect; see get_flight_data.
 
     Returns
     -------
@@ -339,12 +749,14 @@ def update_flight_dict(flight_dict, _AQ, _TF):
         Updated Flight data dictionary.
 
     '''
-    updated_dict = get_flight_data(flight_dict, _AQ, _TF) 
+    updated_dict = get_flight_data(flight_dict, _AQ, _TF, _BQ, sample, period, 
+                                   engine) 
     return updated_dict
 
 def save_data(SomeData, str_dir, str_file_name):
     '''
-    Function saves given data to given directory and filename. 
+    Function saves given data to given directory and filename. The file is 
+    replaced atomically so a crash never leaves a half written pickle. 
 
     Parameters
     ----------
@@ -360,10 +772,236 @@ def save_data(SomeData, str_dir, str_file_name):
     None.
 
     '''
-    with open(f'./data/{str_dir}/{str_file_name}.pkl', 'wb') as fp:
-        pickle.dump(SomeData, fp)
+    angfl.write_file_atomic(f'./data/{str_dir}/{str_file_name}.pkl', 
+                            pickle.dumps(SomeData))
     return 
 
+def save_flight_sample(flight_dictionary, str_dir, writer=None):
+    '''
+    Function appends the latest sample of the flight data dictionary to the 
+    flight log in the given directory. Only the new sample is written, so the 
+    cost per call stays the same for the whole flight. Timezone segments and 
+    flight phase transitions not yet saved are written ahead of it. 
+
+    Parameters
+    ----------
+    flight_dictionary : FlightBuffer
+        Flight data dictionary.
+    str_dir : String
+        String directory i.e. the flight number.
+    writer : FlightLogWriter, optional
+        Background writer. If given the sample is queued and written by the 
+        writer thread instead of being written here.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written (0 when queued to a writer).
+
+    '''
+    log_path = angfl.flight_log_path(str_dir)
+    frames = [('timezone', s) for s in 
+              flight_dictionary.timezones[flight_dictionary.timezones_saved:]]
+    frames += [('phase', p) for p in 
+               flight_dictionary.phases[flight_dictionary.phases_saved:]]
+    flight_dictionary.timezones_saved = len(flight_dictionary.timezones)
+    flight_dictionary.phases_saved = len(flight_dictionary.phases)
+    if writer is not None: 
+        for kind, payload in frames: 
+            writer.submit_frame(log_path, flight_dictionary.schema, kind, payload)
+        writer.submit(log_path, flight_dictionary.schema, 
+                      flight_dictionary.row(-1))
+        return 0
+    nbytes = angfl.append_rows(log_path, flight_dictionary.schema, 
+                               [flight_dictionary.row(-1)], frames=frames)
+    return nbytes
+
+def apply_phase_rates(groups, phase, factors=None): 
+    '''
+    Function sets the sample rate of every channel group for a flight phase. 
+
+    Parameters
+    ----------
+    groups : List
+        ChannelGroup list.
+    phase : String or None
+        Flight phase; None restores the configured rates.
+    factors : Dictionary, optional
+        Phase -> rate factor; defaults to PHASE_RATE_FACTORS.
+
+    Returns
+    -------
+    None.
+
+    '''
+    factors = PHASE_RATE_FACTORS if factors is None else factors
+    factor = factors.get(phase, 1.0)
+    for group in groups: 
+        group.set_rate(min(group.base_rate_hz * factor, MAX_PHASE_RATE_HZ))
+    return 
+
+def detect_flight_phase(phases, flight_dictionary, groups=None): 
+    '''
+    Function feeds the latest main sample to the flight phase detector. On a 
+    transition it is added to flight_dictionary.phases and the channel group 
+    rates are set for the new phase. 
+
+    Parameters
+    ----------
+    phases : FlightPhaseDetector
+    flight_dictionary : FlightBuffer
+        Flight data dictionary; the latest sample is read.
+    groups : List, optional
+        ChannelGroup list whose rates follow the phase.
+
+    Returns
+    -------
+    changed : Bool
+
+    '''
+    sample = {name:flight_dictionary[name][-1] for name in angphase.PHASE_CHANNELS 
+              if name in flight_dictionary}
+    index = flight_dictionary.num_samples - 1
+    time_ns = flight_dictionary[anggroups.TIME_CHANNEL][-1]
+    if not phases.update(sample, time_ns, index): 
+        return False
+    flight_dictionary.phases.append(phases.transition)
+    if groups is not None: 
+        apply_phase_rates(groups, phases.phase)
+    return True
+
+def get_group_row(group, _AQ, sample=None): 
+    '''
+    Function reads one sample of a channel group, stamps it with TIME_NS, 
+    the UTC time in int64 nanoseconds from EPOCH_CLOCK, and publishes it on 
+    TELEMETRY_BUS with the group period. Group logs have no timezone 
+    segments; their LOCAL_TIME is rendered on export from the segments of 
+    the main flight log. A sample already read by the sampling engine is 
+    used as is. 
+
+    Returns
+    -------
+    row : List
+        Sample values in group schema order.
+
+    '''
+    if sample is not None: 
+        sample = dict(sample)
+    elif group.batch is None: 
+        sample = angbatch.get_sequential_sample(_AQ, group.simvars)
+    else: 
+        sample = group.batch.get_sample()
+    sample[anggroups.TIME_CHANNEL] = EPOCH_CLOCK()
+    TELEMETRY_BUS.publish(sample, group.period)
+    row = [sample.get(name) for name in group.schema.names]
+    return row
+
+def record_group_sample(group, _AQ, flight_num, writer=None, sample=None): 
+    '''
+    Function samples a channel group and appends the sample to the group 
+    flight log. 
+
+    Parameters
+    ----------
+    group : ChannelGroup
+        Channel group to sample.
+    writer : FlightLogWriter, optional
+        Background writer the sample is queued to.
+    sample : Dictionary, optional
+        SimVar values already read by the sampling engine.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written (0 when queued to a writer).
+
+    '''
+    row = get_group_row(group, _AQ, sample)
+    log_path = group.log_path(flight_num)
+    if writer is not None: 
+        writer.submit(log_path, group.schema, row)
+        return 0
+    nbytes = angfl.append_rows(log_path, group.schema, [row])
+    return nbytes
+
+def get_burst_capture(rate_hz=BURST_RATE_HZ, pre_seconds=BURST_PRE_SECONDS, 
+                      post_seconds=BURST_POST_SECONDS, triggers=None, clock=None): 
+    '''
+    Function creates the burst capture for BURST_CHANNELS. 
+
+    Parameters
+    ----------
+    rate_hz : Float
+        Burst sample rate.
+    pre_seconds : Float
+        Seconds saved before a trigger.
+    post_seconds : Float
+        Seconds saved after the last triggered sample.
+    triggers : Dictionary, optional
+        Channel -> (low, high); defaults to BURST_TRIGGERS.
+    clock : Callable, optional
+        Monotonic clock deciding when a burst sample is due.
+
+    Returns
+    -------
+    burst : BurstCapture
+
+    '''
+    kwargs = {} if clock is None else {"clock":clock}
+    burst = angburst.BurstCapture(angburst.burst_schema(FLIGHT_DATA_SCHEMA, BURST_CHANNELS), 
+                                  BURST_TRIGGERS if triggers is None else triggers, 
+                                  rate_hz, pre_seconds, post_seconds, **kwargs)
+    return burst
+
+def save_burst_segment(flight_num, burst, segment, writer=None): 
+    '''
+    Function saves a completed burst segment to ./data/f#/bursts/f#.burst#.log.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written (0 when queued to a writer).
+
+    '''
+    info, rows = segment
+    print(f'Burst {info["index"]}: {info["trigger"]} = {info["value"]}, {len(rows)} samples.')
+    log_path = angfl.burst_log_path(flight_num, info["index"])
+    if writer is not None: 
+        writer.submit_segment(log_path, burst.schema, rows, info)
+        return 0
+    nbytes = angfl.write_segment(log_path, burst.schema, rows, info)
+    return nbytes
+
+def record_burst_sample(burst, _AQ, flight_num, writer=None, sample=None): 
+    '''
+    Function reads one burst sample into the pre-trigger ring buffer and saves 
+    the burst segment it completes, if any. 
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written (0 when queued to a writer).
+
+    '''
+    segment = burst.add(get_group_row(burst.group, _AQ, sample))
+    if segment is None: 
+        return 0
+    return save_burst_segment(flight_num, burst, segment, writer)
+
+def finish_burst(burst, flight_num, writer=None): 
+    '''
+    Function saves the burst segment still being captured when a flight ends.
+
+    Returns
+    -------
+    nbytes : Integer
+
+    '''
+    segment = burst.finish()
+    if segment is None: 
+        return 0
+    return save_burst_segment(flight_num, burst, segment, writer)
+
 def load_data(some_pickle_file_path_str):
     '''
     Function loads pickled data given a string filepath. 
@@ -443,15 +1081,14 @@ def make_flight_data_dir(_AQ):
     None.
 
     '''
-    flight_number = int(get_last_flight_num()[1:])+1
-    flight_number_f = f'f{flight_number}'
-    os.mkdir(f'./data/{flight_number_f}')
+    get_flight_number_allocator().new_flight_num()
     return 
 
-def make_flight_header(_AQ, _TF): 
+def make_flight_header(_AQ, _TF, _HQ=None, engine=None): 
     '''
     Function sets the flight number, creates directory for the flight, and saves 
-    the flight header.  
+    the flight header, as a pickle and as typed JSON (see ang_flight_columns), 
+    and adds the flight to FLIGHT_CATALOG. 
 
     Parameters
     ----------
@@ -459,6 +1096,10 @@ def make_flight_header(_AQ, _TF):
         
     _TF : Timezone Finder Object.
         
+    _HQ : SimVarBatch, optional
+        Batch for the header SimVars.
+    engine : SamplingEngine, optional
+        Engine the header is read through.
 
     Returns
     -------
@@ -471,26 +1112,122 @@ def make_flight_header(_AQ, _TF):
     make_flight_data_dir(_AQ)
     print("Setting flight number...")
     flight_num = get_last_flight_num() # GETS LAST FLIGHT NUMBER IN DATA DIRECTORY IN ABOVE LINE
-    start_flight_data = get_start_flight_data(_AQ, _TF, flight_num)
+    start_flight_data = get_start_flight_data(_AQ, _TF, flight_num, _HQ, engine)
     save_data(start_flight_data, flight_num, f'{flight_num}_Flight_Header') # SAVES THE HEADER .pkl
+    angcols.save_header(start_flight_data, flight_num)
+    catalog_flight(flight_num, start_flight_data)
     return  start_flight_data
 
+def save_flight_columns(flight_num): 
+    '''
+    Function writes the column stores of a finished flight from its flight 
+    logs (see ang_flight_columns). The logs stay the record of the flight, 
+    so a failure is reported and recording goes on. 
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+
+    Returns
+    -------
+    nbytes : Integer
+        Size of the column stores in bytes; 0 on failure.
+
+    '''
+    try: 
+        nbytes = angcols.write_flight_columns(flight_num)
+    except (OSError, ValueError) as e: 
+        print(f'Column store of flight {flight_num} not written: {e}')
+        return 0
+    print(f'Column store of flight {flight_num} written, {nbytes} bytes.')
+    return nbytes
+
+def catalog_flight(flight_num, header=None, removed=False): 
+    '''
+    Function updates the flight in FLIGHT_CATALOG: adds it with its header, 
+    records it as finished without one, or removes it. The catalog can be 
+    rebuilt from ./data, so a failure is reported and recording goes on. 
+
+    Returns
+    -------
+    None.
+
+    '''
+    try: 
+        if removed: 
+            FLIGHT_CATALOG.remove_flight(flight_num)
+        elif header is None: 
+            FLIGHT_CATALOG.finish_flight(flight_num)
+        else: 
+            FLIGHT_CATALOG.add_flight(flight_num, header)
+    except (sqlite3.Error, OSError, ValueError) as e: 
+        print(f'Flight catalog not updated for flight {flight_num}: {e}')
+    return 
+
+def finish_flight(flight_num): 
+    '''
+    Function finishes a flight whose samples are all on disk: writes its 
+    column stores and records it in FLIGHT_CATALOG. 
+
+    Returns
+    -------
+    None.
+
+    '''
+    save_flight_columns(flight_num)
+    catalog_flight(flight_num)
+    return 
+
 def check_set_last_dir(): 
+    '''
+    Function checks the last flight directory on start up. A flight log left 
+    by a crash is repaired from its last checkpoint and the flight is 
+    finished; a directory without any flight data is removed.
+
+    Returns
+    -------
+    None.
+
+    '''
     last_flight_dir = get_last_flight_num()
     file_path = f"./data/{last_flight_dir}/{last_flight_dir}.pkl"
 
-    if os.path.exists(file_path):
+    for group in [None] + angfl.flight_log_groups(last_flight_dir): 
+        log_path = angfl.flight_log_path(last_flight_dir, group)
+        if os.path.exists(log_path): 
+            good_end, dropped = angfl.recover_flight_log(log_path)
+            if dropped:
+                print(f'Flight log {log_path} recovered, {dropped} damaged bytes removed.')
+
+    if os.path.exists(file_path) or angfl.flight_log_exists(last_flight_dir):
         print("File exists")
+        try: 
+            entry = FLIGHT_CATALOG.get(last_flight_dir)
+        except sqlite3.Error: 
+            entry = None
+        if entry is not None and entry["status"] == angcat.RECORDING: 
+            # The recorder stopped before the flight ended
+            finish_flight(last_flight_dir)
     else:
         print(f'Flight data {file_path} does not exist. Removing...')
-        shutil.rmtree(f"./data/{last_flight_dir}", ignore_errors=True)
+        get_flight_number_allocator().remove_flight_num(last_flight_dir)
+        catalog_flight(last_flight_dir, removed=True)
     return 
 
-def active_record(flight_dictionary, _AQ, _TF, flight_num): 
+def active_record(flight_dictionary, _AQ, _TF, flight_num, _BQ=None, writer=None, 
+                  groups=None, burst=None, engine=None, phases=None): 
     '''
     Function gets an active flight number, if there is an active flight, iterates 
     checking flight number is still active, updates the flight data in 
-    flight_dictionary, saves data to directory flight number.
+    flight_dictionary, appends the new sample to the flight log in directory 
+    flight number. With channel groups only the groups that are due are 
+    sampled; the main group goes to flight_dictionary. With a burst capture 
+    the burst channels are sampled when due and event segments are saved. 
+    With a sampling engine the samples due on this call are read 
+    concurrently, so the groups do not wait for each other's round-trips. 
+    With a flight phase detector every main sample updates the phase, and 
+    the channel group rates follow it (see PHASE_RATE_FACTORS). 
 
     Parameters
     ----------
@@ -498,14 +1235,60 @@ def active_record(flight_dictionary, _AQ, _TF, flight_num):
         Flight data dictionary appends every iteration.
     flight_num : String
         Flight number string.
+    _BQ : SimVarBatch, optional
+        Batch used to read the sample in one SimConnect request.
+    writer : FlightLogWriter, optional
+        Background writer the sample is queued to.
+    groups : List, optional
+        ChannelGroup list from get_channel_groups; flight_dictionary must use 
+        the main group schema.
+    burst : BurstCapture, optional
+        Burst capture from get_burst_capture.
+    engine : SamplingEngine, optional
+        Engine reading the samples; see connect_engine.
+    phases : FlightPhaseDetector, optional
+        Detector of the flight phase; see ang_flight_phase.
 
     Returns
     -------
     updated_dict : Dictionary
         Flight data dictionary with appended data per iteration.
+    nbytes : Integer
+        Number of bytes written to the flight log (0 when queued to writer).
 
     '''
     flight_num = get_last_flight_num()
-    flight_dictionary = update_flight_dict(flight_dictionary, _AQ, _TF) 
-    save_data(flight_dictionary, flight_num, flight_num)
-    return flight_dictionary
+    if _BQ is None and groups is not None: 
+        _BQ = groups[0].batch
+    main_due = groups is None or groups[0].due()
+    due = [group for group in (groups or [])[1:] if group.simvars and group.due()]
+    burst_due = burst is not None and burst.group.due()
+    samples = {}
+    if engine is not None: 
+        # (batch, keys) of every sample due, read in one go
+        sources = {}
+        if main_due: 
+            simvars = [name for name in flight_dictionary.schema.names 
+                       if name != anggroups.TIME_CHANNEL]
+            sources[anggroups.MAIN_GROUP] = (_BQ, simvars)
+        for group in due: 
+            sources[group.name] = (group.batch, group.simvars)
+        if burst_due: 
+            sources[angburst.BURST_GROUP] = (burst.group.batch, burst.group.simvars)
+        samples = dict(zip(sources, engine.call(engine.read_all(sources.values()))))
+    nbytes = 0
+    if main_due: 
+        flight_dictionary = update_flight_dict(flight_dictionary, _AQ, _TF, _BQ, 
+                                               samples.get(anggroups.MAIN_GROUP), 
+                                               groups[0].period if groups is not None else None, 
+                                               engine) 
+        if phases is not None: 
+            detect_flight_phase(phases, flight_dictionary, groups)
+        nbytes += save_flight_sample(flight_dictionary, flight_num, writer)
+    for group in due: 
+        nbytes += record_group_sample(group, _AQ, flight_num, writer, 
+                                      samples.get(group.name))
+    if burst_due: 
+        nbytes += record_burst_sample(burst, _AQ, flight_num, writer, 
+                                      samples.get(angburst.BURST_GROUP))
+    return flight_dictionary, nbytes
@@ -9,14 +9,29 @@ import time
 import sys
 import math
 import ANG_Flight_Recorder_v_0_5 as angflightrec
+import ang_sample_scheduler as angsched
+import ang_flight_writer as angwriter
+import ang_channel_groups as anggroups
+import ang_flight_phase as angphase
+import ang_sim_readiness as angready
 from PyQt5.QtWidgets import (
     QApplication, QPushButton, QVBoxLayout, QWidget, QLabel,
-    QListWidget, QStackedWidget, QHBoxLayout, QMessageBox, QLineEdit, QTextEdit
+    QListWidget, QStackedWidget, QHBoxLayout, QMessageBox, QLineEdit, QTextEdit,
+    QSpinBox
 )
 from PyQt5.QtGui import QFont, QColor
-from PyQt5.QtCore import (QObject, pyqtSignal, QTimer, Qt, QRunnable, 
+from PyQt5.QtCore import (QObject, pyqtSignal, Qt, QRunnable, 
                           QThreadPool, pyqtSlot)
 
+# SimVars shown by the ANG Sim Dashboard
+DASHBOARD_SIMVARS = ["SIMULATION_RATE", "PLANE_LATITUDE", "PLANE_LONGITUDE", 
+                     "PLANE_ALT_ABOVE_GROUND", "GPS_WP_DISTANCE"]
+# Dashboard refresh rate in Hz (was a 2.5 s timer)
+DASHBOARD_REFRESH_HZ = 4
+DASHBOARD_MAX_REFRESH_HZ = 20
+# Seconds between flight presence checks and status updates while recording
+STATUS_INTERVAL = 1.0
+
 class WorkerSignals(QObject):
     '''
     Class defines signals available from a running worker thread. Without this 
@@ -32,8 +47,30 @@ class WorkerThread(QRunnable):
     Worker thread class. Inherits from QRunnable to handler worker thread setup, 
     signals and wrap-up. 
     
+    Flight data is sampled at sample_rate_hz (1-50 Hz) on a deadline based 
+    scheduler; while waiting for a flight or paused the loop runs at 1 Hz. 
+    Channel groups (see CHANNEL_GROUPS) are sampled at their own rate, so 
+    while recording the loop runs at the fastest group rate. The flight 
+    presence check, flight number and status text are only updated every 
+    STATUS_INTERVAL seconds, whatever the loop rate. With 
+    burst_capture the burst channels are sampled at BURST_RATE_HZ and saved 
+    around stall, overspeed, G and vertical speed events. 
+    Samples are queued to a FlightLogWriter thread which writes them to disk 
+    every flush_interval seconds, deadband encoded with the given channel 
+    tolerances (None stores every sample in full). 
+    With a SamplingEngine (see ang_sampling_engine) every SimConnect read of 
+    the worker goes through the engine, and the samples due on a tick are 
+    read concurrently. With adaptive_rates the flight phase is tracked and 
+    the group rates follow PHASE_RATE_FACTORS: fast near the ground, slow in 
+    cruise. A new flight is recorded as soon as the sim is ready (see 
+    ang_sim_readiness), or after load_timeout seconds. 
+    
     '''
-    def __init__(self, _SM, _AQ, _AE, _TF, *args, **kwargs):
+    def __init__(self, _SM, _AQ, _AE, _TF, *args, sample_rate_hz=1.0, 
+                 flush_interval=1.0, 
+                 tolerances=angflightrec.FLIGHT_DATA_DEADBAND, 
+                 channel_groups=None, burst_capture=True, engine=None, 
+                 adaptive_rates=True, load_timeout=30.0, **kwargs):
         super(WorkerThread, self).__init__()
         # Store constructor arguments (re-used for processing)
         self.running = True
@@ -41,55 +78,168 @@ class WorkerThread(QRunnable):
         self._AQ = _AQ
         self._AE = _AE 
         self._TF = _TF
+        self.engine = engine
+        # Sampling rate and drift-free scheduler
+        self.sample_rate_hz = min(max(sample_rate_hz, angsched.MIN_RATE_HZ), 
+                                  angsched.MAX_RATE_HZ)
+        # One SimConnect request per channel group and one for the flight header
+        self.groups = angflightrec.get_channel_groups(self.sample_rate_hz, 
+                                                      channel_groups)
+        angflightrec.connect_groups(_SM, _AQ, self.groups)
+        self._BQ = self.groups[0].batch
+        self.burst = None
+        if burst_capture: 
+            self.burst = angflightrec.get_burst_capture()
+            self.burst.group.batch = angflightrec.connect_bq(_SM, _AQ, self.burst.group.simvars)
+        self._HQ = angflightrec.connect_bq(_SM, _AQ, angflightrec.FLIGHT_HEADER_SIMVARS.values())
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
         self.is_paused = False
         self.flight_dictionary = None
         self.ang_fnum = None
+        self.header_data = None
+        self.header_str = None
+        self.flight_start_time = None
+        self.bytes_written = 0
+        self.bytes_written_at_start = 0
+        self.phases = angphase.FlightPhaseDetector() if adaptive_rates else None
+        self.update_loop_rate()
+        self.readiness = angready.ReadinessProbe(timeout=load_timeout)
+        self.idle_rate_hz = angsched.MIN_RATE_HZ
+        self.scheduler = angsched.DeadlineScheduler(self.idle_rate_hz)
+        self.missed_deadlines = 0
+        self.in_flight = False
+        self.next_status = None
+        angflightrec.set_aq_sample_rate(_AQ, self.sample_rate_hz)
+        # Disk writes happen on the writer thread
+        self.writer = angwriter.FlightLogWriter(flush_interval=flush_interval, 
+                                                tolerances=tolerances)
+        # Scan ./data once; flight numbers are tracked in memory afterwards
+        self.flight_numbers = angflightrec.get_flight_number_allocator()
         
     @pyqtSlot()
     def run(self):
         '''
-        Initialise the run function with passed args, kwargs. Iterates about 
-        every 1 seconds. 
+        Initialise the run function with passed args, kwargs. Iterates at 
+        sample_rate_hz while recording and every 1 seconds otherwise; the 
+        flight is checked every STATUS_INTERVAL seconds. 
         ''' 
         # DO HEAVY LIFTING HERE 
+        self.writer.start()
         while self.running:
-            time.sleep(1.0) 
-            # Check if we are in a flight 
-            self.in_flight = self.in_current_flight()
-            # Get current flight number 
-            # self.current_flight_num = angflightrec.get_flight_number(self._AQ)
-            # Get last flight number in data directory 
-            self.last_flight_num = angflightrec.get_last_flight_num()
+            missed = self.scheduler.wait()
+            if missed and self.flight_dictionary is not None: 
+                # Shown in the status as Missed Deadlines
+                self.missed_deadlines += missed
+            status_due = self.status_due()
+            if status_due: 
+                # Check if we are in a flight 
+                self.in_flight = self.in_current_flight()
+                # Get current flight number 
+                # self.current_flight_num = angflightrec.get_flight_number(self._AQ)
+                # Get last flight number in data directory 
+                self.last_flight_num = angflightrec.get_last_flight_num()
             
             if self.is_paused:
+                self.set_loop_rate(self.idle_rate_hz)
                 self.message_text = "RECORD PAUSED."
                 self.signals.message_text.emit(self.message_text)
                 continue  # Skip to the next iteration
                 
             if not self.in_flight:
+                self.set_loop_rate(self.idle_rate_hz)
                 self.message_text = "WAITING FOR FLIGHT..."
                 self.signals.message_text.emit(self.message_text)
+                if self.flight_dictionary is not None: 
+                    # Flight ended, get the rest of it on disk
+                    if self.burst is not None: 
+                        angflightrec.finish_burst(self.burst, self.ang_fnum, self.writer)
+                    self.writer.flush()
+                    angflightrec.finish_flight(self.ang_fnum)
                 # Reset flight dictionary since flight has ended
                 self.flight_dictionary = None
-                # Reset flight number since flight has ended
+                # Reset flight number and header since flight has ended
                 self.ang_fnum = None
+                self.header_str = None
                 continue  # Skip to the next iteration
     
             # At this point, we are in flight
             if self.flight_dictionary is None:
-                # Start a new flight
-                self.wait_loading(30)
+                # Start a new flight once the sim has loaded it
+                if not self.wait_ready() and not self.running: 
+                    continue
                 self.start_new_flight()
                 self.emmit_header()
+                # Deadlines start with the first sample of the flight
+                self.scheduler.set_rate(self.loop_rate_hz)
             else:
                 # Continue recording flight data
-                updated_dict = angflightrec.active_record(
-                    self.flight_dictionary, self._AQ, self._TF, self.ang_fnum)
-                self.emmit_header()
+                self.set_loop_rate(self.loop_rate_hz)
+                updated_dict, nbytes = angflightrec.active_record(
+                    self.flight_dictionary, self._AQ, self._TF, self.ang_fnum, 
+                    self._BQ, self.writer, self.groups, self.burst, self.engine, 
+                    self.phases)
+                if self.phases is not None and self.phases.changed: 
+                    # Group rates follow the new flight phase
+                    self.update_loop_rate()
+                    self.set_loop_rate(self.loop_rate_hz)
+                if status_due: 
+                    self.emmit_header()
+        if self.flight_dictionary is not None and self.burst is not None: 
+            # Keep a burst still being captured when recording stops
+            angflightrec.finish_burst(self.burst, self.ang_fnum, self.writer)
+        self.writer.close()
+        if self.flight_dictionary is not None: 
+            angflightrec.finish_flight(self.ang_fnum)
+
+    def status_due(self): 
+        '''
+        Function checks if the flight presence check and status update are 
+        due: every STATUS_INTERVAL seconds while recording, and on every 
+        tick otherwise (the loop then runs at 1 Hz). A tick within half a 
+        loop period of the deadline counts as due. 
+
+        Returns
+        -------
+        due : Bool
 
+        '''
+        now = time.monotonic()
+        if (self.flight_dictionary is not None and self.next_status is not None and 
+                now < self.next_status - 0.5 * self.scheduler.period): 
+            return False
+        self.next_status = now + STATUS_INTERVAL
+        return True
+
+    def update_loop_rate(self): 
+        '''
+        Function sets the recording loop rate to the fastest channel group 
+        rate, i.e. after the group rates changed with the flight phase. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        loop_groups = self.groups + ([self.burst.group] if self.burst is not None else [])
+        self.loop_rate_hz = min(anggroups.loop_rate(loop_groups), angsched.MAX_RATE_HZ)
+        anggroups.set_loop_rate(loop_groups, self.loop_rate_hz)
+        return 
+
+    def set_loop_rate(self, rate_hz): 
+        '''
+        Function changes the scheduler rate if it differs from rate_hz. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self.scheduler.rate_hz != rate_hz: 
+            self.scheduler.set_rate(rate_hz)
+        return 
+    
     def stop(self):
         '''
         Function signals for the thread to stop. 
@@ -102,25 +252,40 @@ class WorkerThread(QRunnable):
         self.running = False
         return 
     
-    def wait_loading(self, int_load_time): 
+    def wait_ready(self): 
         '''
-        Function used to allow time to load. 
+        Function waits for the sim to finish loading the flight: a position 
+        off the main menu, an aircraft model and a stable sim rate. Gives up 
+        after the readiness timeout. 
 
         Returns
         -------
-        None.
+        ready : Bool
+            False on timeout or when the worker was stopped.
 
         '''
-        for i in range(int_load_time): 
-            time.sleep(1)
-            t_minus = int_load_time - i
-            self.message_text = f"Loading: {t_minus}"
+        start = time.monotonic()
+
+        def progress(reason, left): 
+            self.message_text = f"Loading: waiting for {reason} ({int(left)} s)"
             self.signals.message_text.emit(self.message_text) 
-        return
+            return
+
+        ready = self.readiness.wait(self.get_simvars, progress, 
+                                    lambda: self.running)
+        elapsed = time.monotonic() - start
+        if ready: 
+            print(f"Sim ready after {elapsed:.1f} s.")
+        elif self.running: 
+            print(f"Sim not ready after {elapsed:.1f} s "
+                  f"(waiting for {self.readiness.reason}), recording anyway.")
+        return ready
     
     def emmit_header(self):
         '''
-        Function emits header to app.
+        Function emits header to app. The header text is rendered once in 
+        start_new_flight; only the sample count, elapsed time and bytes 
+        written change per call.
 
         Returns
         -------
@@ -129,22 +294,45 @@ class WorkerThread(QRunnable):
         '''
         if self.ang_fnum == None: 
             print("NO FLIGHT NUMBER")
+        elif self.header_str is None: 
+            # The flight has not started yet or ATC assinged a flight number 
+            # prematurely
+            print('EMMIT HEADER WAITING...')
         else: 
-            try: 
-                dir_str = f'./data/{self.ang_fnum}/{self.ang_fnum}_Flight_Header.pkl'
-                self.header_data = angflightrec.load_data(dir_str)
-                self.header_str = 'RECORDING:\n--FLIGHT HEADER--\n'
-                for k,v in self.header_data.items(): 
-                    self.header_str += str(k) + " : " + str(v) + "\n"
-                self.message_text = self.header_str + f"\nRecording in Directory {dir_str}"
-                self.signals.message_text.emit(self.message_text) 
-            except FileNotFoundError as e: 
-                # If the flight directory is absent the flight has not started yet 
-                # or ATC assinged a flight number prematurely
-                print('EMMIT HEADER WAITING...')
-                # self.start_new_flight()
+            elapsed = int(time.monotonic() - self.flight_start_time)
+            writer_stats = self.writer.stats()
+            self.bytes_written = writer_stats["bytes_written"] - self.bytes_written_at_start
+            self.message_text = self.header_str + \
+                f"\nSamples: {self.flight_dictionary.num_samples}" + \
+                f"\nElapsed: {elapsed // 3600}:{elapsed % 3600 // 60:02d}:{elapsed % 60:02d}" + \
+                f"\nBytes Written: {self.bytes_written}" + \
+                (f"\nFlight Phase: {self.phases.phase}" if self.phases is not None else "") + \
+                f"\nSample Rate: {self.groups[0].rate_hz:g} Hz" + \
+                "".join(f", {g.name} {g.rate_hz:g} Hz" for g in self.groups[1:]) + \
+                f"\nMissed Deadlines: {self.missed_deadlines}" + \
+                (f"\nBursts: {self.burst.segments}" if self.burst is not None else "") + \
+                f"\nWrite Queue: {writer_stats['queue_depth']} " + \
+                f"(max {writer_stats['max_queue_depth']}, dropped {writer_stats['dropped']})"
+            self.signals.message_text.emit(self.message_text) 
         return 
     
+    def render_header(self): 
+        '''
+        Function builds the static part of the recording status text from 
+        the flight header. 
+
+        Returns
+        -------
+        header_str : String
+            Header text.
+
+        '''
+        dir_str = f'./data/{self.current_flight_num}'
+        header_str = 'RECORDING:\n--FLIGHT HEADER--\n'
+        header_str += "".join(f"{k} : {v}\n" for k, v in self.header_data.items())
+        header_str += f"\nRecording in Directory {dir_str}"
+        return header_str
+    
     def check_master_systems_on(self): 
         '''
         Function checks AVIONICS_MASTER_SWITCH and ELECTRICAL_MASTER_BATTERY. 
@@ -155,8 +343,9 @@ class WorkerThread(QRunnable):
         master_systems_on : Bool
             
         '''
-        self.avionics_master_check = self._AQ.get("AVIONICS_MASTER_SWITCH")
-        self.electrical_master_bat_check = self._AQ.get("ELECTRICAL_MASTER_BATTERY")
+        values = self.get_simvars(["AVIONICS_MASTER_SWITCH", "ELECTRICAL_MASTER_BATTERY"])
+        self.avionics_master_check = values["AVIONICS_MASTER_SWITCH"]
+        self.electrical_master_bat_check = values["ELECTRICAL_MASTER_BATTERY"]
         if self.avionics_master_check == 0.0 and self.electrical_master_bat_check == 0.0:
             master_systems_on = False
         elif self.avionics_master_check == 1.0 and self.electrical_master_bat_check == 1.0:
@@ -165,10 +354,29 @@ class WorkerThread(QRunnable):
             master_systems_on = False
         return master_systems_on
     
+    def get_simvars(self, keys): 
+        '''
+        Function reads SimVars, concurrently through the sampling engine if 
+        there is one, and publishes them on the telemetry bus. 
+
+        Returns
+        -------
+        values : Dictionary
+            SimVar key -> value.
+
+        '''
+        if self.engine is None: 
+            values = {key:self._AQ.get(key) for key in keys}
+        else: 
+            values = self.engine.call(self.engine.get_many(keys))
+        angflightrec.TELEMETRY_BUS.publish(values)
+        return values
+
     def in_current_flight(self): 
         '''
         Function checks if currently in flight. The main menu default coordinates 
-        signify that the flight has ended. 
+        signify that the flight has ended. A read that timed out (None) keeps 
+        the previous answer; the next check reads again. 
         
 
         Returns
@@ -177,31 +385,18 @@ class WorkerThread(QRunnable):
             If in flight True else False.
 
         '''
-        curr_pos_lat = self._AQ.get("PLANE_LATITUDE")
-        curr_pos_lon = self._AQ.get("PLANE_LONGITUDE")
-        curr_pos_alt = self._AQ.get("PLANE_ALTITUDE")
-        
-        default_end_pos_lat = round(0.000407442168686809,4)
-        default_end_pos_lon = round(0.01397450300629543,4)
-        # default_end_pos_alt = round(3.276148519246465,4)
+        position = self.get_simvars(["PLANE_LATITUDE", "PLANE_LONGITUDE", "PLANE_ALTITUDE"])
+        curr_pos_lat = position["PLANE_LATITUDE"]
+        curr_pos_lon = position["PLANE_LONGITUDE"]
+        curr_pos_alt = position["PLANE_ALTITUDE"]
         
-        in_current_flight = None 
-        if (curr_pos_lat is not None and 
-            curr_pos_lon is not None and 
-            curr_pos_alt is not None):
-            curr_pos_lat = round(curr_pos_lat,4)
-            curr_pos_lon = round(curr_pos_lon,4)
-            curr_pos_alt = round(curr_pos_alt,4)
-        else: 
-            self.in_current_flight()
+        if (curr_pos_lat is None or 
+            curr_pos_lon is None or 
+            curr_pos_alt is None):
+            return self.in_flight
             
-        if (curr_pos_lat is not None and 
-            curr_pos_lon is not None and 
-            curr_pos_alt is not None and 
-            curr_pos_lat == default_end_pos_lat and 
-            curr_pos_lon == default_end_pos_lon and 
-            curr_pos_alt < 50):
-               in_current_flight = False
+        if angready.is_menu_position(curr_pos_lat, curr_pos_lon, curr_pos_alt):
+            in_current_flight = False
         else: 
             in_current_flight = True
             self.ang_fnum = angflightrec.get_last_flight_num()
@@ -221,11 +416,104 @@ class WorkerThread(QRunnable):
         self.message_text = "Creating Flight Header..."
         self.signals.message_text.emit(self.message_text) 
         
-        self.header_data = angflightrec.make_flight_header(self._AQ, self._TF)
+        self.header_data = angflightrec.make_flight_header(self._AQ, self._TF, 
+                                                           self._HQ, self.engine)
         self.message_text = "Creating Flight Dictionary..."
         self.signals.message_text.emit(self.message_text) 
-        self.flight_dictionary = angflightrec.get_flight_dictionary()
+        # Only request the channels this aircraft has 
+        angflightrec.plan_channel_groups(self._SM, self._AQ, self.groups, 
+                                         self.header_data)
+        self._BQ = self.groups[0].batch
+        self.flight_dictionary = angflightrec.get_flight_dictionary(self.groups[0].schema)
+        for group in self.groups: 
+            group.reset()
+        if self.phases is not None: 
+            self.phases.reset()
+            angflightrec.apply_phase_rates(self.groups, None)
+            self.update_loop_rate()
+        if self.burst is not None: 
+            self.burst.reset()
         self.current_flight_num = angflightrec.get_last_flight_num() # CURRENT FLIGHT NUMBER FROM DIR
+        self.header_str = self.render_header()
+        self.flight_start_time = time.monotonic()
+        self.bytes_written = 0
+        self.bytes_written_at_start = self.writer.bytes_written
+        self.missed_deadlines = 0
+        return 
+
+class DashboardSignals(QObject):
+    '''
+    Class defines signals available from a running dashboard worker. 
+    
+    Signals: 
+        values : dictionary of DASHBOARD_SIMVARS values via emit(). 
+        error : string error message; the worker has stopped. 
+    '''
+    values = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+class DashboardWorker(QRunnable):
+    '''
+    Dashboard worker class. Reads DASHBOARD_SIMVARS at refresh_hz off the GUI 
+    thread and emits them to the ANG Sim Dashboard, so a slow SimConnect 
+    never freezes the window. Values published on the telemetry bus within 
+    one refresh period, plus their publish period (i.e. until the recorder 
+    samples the main group again), are reused; the others are read through 
+    the sampling engine. 
+    
+    '''
+    def __init__(self, engine, refresh_hz=DASHBOARD_REFRESH_HZ):
+        super(DashboardWorker, self).__init__()
+        self.engine = engine
+        self.running = True
+        self.signals = DashboardSignals()
+        self.refresh_hz = refresh_hz
+        self.scheduler = angsched.DeadlineScheduler(refresh_hz)
+        
+    @pyqtSlot()
+    def run(self):
+        '''
+        Reads and emits the dashboard values every 1 / refresh_hz seconds 
+        until stopped. 
+        '''
+        while self.running:
+            self.scheduler.wait()
+            if self.scheduler.rate_hz != self.refresh_hz: 
+                self.scheduler.set_rate(self.refresh_hz)
+            try: 
+                values = angflightrec.TELEMETRY_BUS.fetch(DASHBOARD_SIMVARS, 
+                                                          1.0 / self.refresh_hz, 
+                                                          self.engine)
+            except (OSError, RuntimeError) as e: 
+                self.running = False
+                self.signals.error.emit(str(e))
+                break
+            if self.running: 
+                self.signals.values.emit(values)
+        return 
+
+    def set_refresh_rate(self, refresh_hz): 
+        '''
+        Function changes the refresh rate; applied from the next refresh. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.refresh_hz = min(max(refresh_hz, 1), DASHBOARD_MAX_REFRESH_HZ)
+        return 
+
+    def stop(self):
+        '''
+        Function signals for the worker to stop. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.running = False
         return 
 
 class SimUtilsApp(QWidget):
@@ -295,6 +583,8 @@ class SimUtilsApp(QWidget):
                 self._AQ = angflightrec.connect_aq(self._SM) # AircraftRequests(self._SM, _time=2000)
                 self._AE = angflightrec.connect_ae(self._SM) # AircraftEvents(self._SM)
                 self._TF = angflightrec.connect_tf()
+                # All SimConnect traffic of the app is scheduled by the engine
+                self.engine = angflightrec.connect_engine(self._SM, self._AQ, self._AE)
                 self.switch = 1 # On/Off proper connect to SimConnect
                 angflightrec.check_test_data_dir()
                 angflightrec.check_test_csv_data_dirs()
@@ -319,6 +609,11 @@ class SimUtilsApp(QWidget):
         start_record_button = QPushButton('START LOCAL RECORD') 
         pause_record_button = QPushButton("PAUSE LOCAL RECORD")
         resume_record_button = QPushButton("RESUME LOCAL RECORD")
+        sample_rate_spin = QSpinBox()
+        sample_rate_spin.setRange(int(angsched.MIN_RATE_HZ), int(angsched.MAX_RATE_HZ))
+        sample_rate_spin.setValue(1)
+        sample_rate_spin.setSuffix(' Hz')
+        sample_rate_label = QLabel('SAMPLE RATE:')
         self.header_switch = 0
         self.text_trigger_switch = 0
         self.worker_true = False
@@ -332,6 +627,8 @@ class SimUtilsApp(QWidget):
         # ADD WIDGETS TO LAYOUT
         layout.addWidget(text_input_diag)
         layout.addWidget(start_push_button)
+        layout.addWidget(sample_rate_label)
+        layout.addWidget(sample_rate_spin)
         layout.addWidget(start_record_button)
         layout.addWidget(pause_record_button)
         layout.addWidget(resume_record_button)
@@ -403,8 +700,12 @@ class SimUtilsApp(QWidget):
 
             '''
             start_record_button.hide()
+            sample_rate_label.hide()
+            sample_rate_spin.hide()
             pause_record_button.show()
-            self.worker = WorkerThread(self._SM, self._AQ, self._AE, self._TF) 
+            self.worker = WorkerThread(self._SM, self._AQ, self._AE, self._TF, 
+                                       sample_rate_hz=sample_rate_spin.value(), 
+                                       engine=self.engine) 
             self.worker.setAutoDelete(True)
             self.worker.signals.message_text.connect(lambda checked: update_progress(self, self.worker.message_text))
             self.worker_true = True
@@ -435,23 +736,18 @@ class SimUtilsApp(QWidget):
         layout.addWidget(stop_push_button) 
         
         # INSTANTIATE METHODS OF THE STACK
+        # Events are sent in order by the sampling engine; the buttons do not 
+        # wait for the round-trips
         def start_all_systems(self): 
-            event_to_trigger = self._AE.find("ENGINE_AUTO_START")  
-            event_to_trigger()
-            toggle_master_batt_alternator = self._AE.find("TOGGLE_MASTER_BATTERY_ALTERNATOR")  
-            toggle_master_batt_alternator()
-            # TOGGLE_AVIONICS_MASTER
-            toggle_avionics_mast = self._AE.find("TOGGLE_AVIONICS_MASTER")  
-            toggle_avionics_mast()
+            self.engine.submit(self.engine.trigger("ENGINE_AUTO_START", 
+                                                   "TOGGLE_MASTER_BATTERY_ALTERNATOR", 
+                                                   "TOGGLE_AVIONICS_MASTER"))
             return 
         
         def stop_all_systems(self): 
-            event_to_trigger = self._AE.find("ENGINE_AUTO_SHUTDOWN")  
-            event_to_trigger()
-            toggle_master_batt_alternator = self._AE.find("TOGGLE_MASTER_BATTERY_ALTERNATOR")  
-            toggle_master_batt_alternator()
-            toggle_avionics_mast = self._AE.find("TOGGLE_AVIONICS_MASTER")  
-            toggle_avionics_mast()
+            self.engine.submit(self.engine.trigger("ENGINE_AUTO_SHUTDOWN", 
+                                                   "TOGGLE_MASTER_BATTERY_ALTERNATOR", 
+                                                   "TOGGLE_AVIONICS_MASTER"))
             return 
         
         # CONNECT METHODS TO WIDGETS
@@ -493,12 +789,14 @@ class SimUtilsApp(QWidget):
             fast_lat = text_input_lat.text()
             fast_lon = text_input_lon.text()
             fast_alt = text_input_alt.text()
+            values = {}
             if fast_lat != '': 
-                self._AQ.set("PLANE_LATITUDE", float(fast_lat))
+                values["PLANE_LATITUDE"] = float(fast_lat)
             if fast_lon != '': 
-                self._AQ.set("PLANE_LONGITUDE", float(fast_lon))
+                values["PLANE_LONGITUDE"] = float(fast_lon)
             if fast_alt != '': 
-                self._AQ.set("PLANE_ALT_ABOVE_GROUND", float(fast_alt))
+                values["PLANE_ALT_ABOVE_GROUND"] = float(fast_alt)
+            self.engine.submit(self.engine.set_many(values))
             return 
         
         # CONNECT METHODS TO WIDGETS
@@ -518,8 +816,7 @@ class SimUtilsApp(QWidget):
         layout.addWidget(start_push_button)
         # INSTANTIATE METHODS OF THE STACK
         def do_repair_and_refuel(self):
-            event_to_trigger = self._AE.find("REPAIR_AND_REFUEL")  
-            event_to_trigger() 
+            self.engine.submit(self.engine.trigger("REPAIR_AND_REFUEL"))
             return 
         # CONNECT METHODS TO WIDGETS
         start_push_button.clicked.connect(lambda checked: do_repair_and_refuel(self))
@@ -543,7 +840,14 @@ class SimUtilsApp(QWidget):
         dis_to_targ = QLabel('...')
         monitor_label = QLabel('...')
         my_auto_pilot_button = QPushButton('AUTO HOLD')
+        refresh_rate_spin = QSpinBox()
+        refresh_rate_spin.setRange(1, DASHBOARD_MAX_REFRESH_HZ)
+        refresh_rate_spin.setValue(DASHBOARD_REFRESH_HZ)
+        refresh_rate_spin.setSuffix(' Hz')
+        self.dashboard = None
         # ADD WIDGETS TO LAYOUT 
+        layout.addWidget(QLabel('REFRESH RATE:'))
+        layout.addWidget(refresh_rate_spin)
         layout.addWidget(start_push_button)
         layout.addWidget(stop_push_button)
         layout.addWidget(QLabel('PLANE_LATITUDE:'))
@@ -569,7 +873,6 @@ class SimUtilsApp(QWidget):
         layout.addWidget(monitor_label)
         monitor_label.setFont(QFont('Consolas', font_size_)) 
         monitor_label.setStyleSheet("background-color: red; border: 1px solid black;")
-        timer = QTimer()
         stop_push_button.hide()
         
         # INSTANTIATE METHODS OF THE STACK
@@ -594,7 +897,7 @@ class SimUtilsApp(QWidget):
                 degrees = -99999999999999.99
             return degrees
         
-        def update_lat(): 
+        def update_lat(lat): 
             '''
             Function updates Dashboard display latitude. 
 
@@ -603,11 +906,10 @@ class SimUtilsApp(QWidget):
             None.
 
             '''
-            lat = self._AQ.get("PLANE_LATITUDE")
             lat_label.setText(str(lat))
             return 
         
-        def update_lon():
+        def update_lon(lon):
             '''
             Function updates Dashboard display longitude. 
 
@@ -616,11 +918,10 @@ class SimUtilsApp(QWidget):
             None.
 
             '''
-            lon = self._AQ.get("PLANE_LONGITUDE")
             lon_label.setText(str(lon))
             return 
         
-        def update_alt_ground():
+        def update_alt_ground(alt):
             '''
             Function updates Dashboard display altitude from ground. 
 
@@ -629,11 +930,10 @@ class SimUtilsApp(QWidget):
             None.
 
             '''
-            alt = self._AQ.get("PLANE_ALT_ABOVE_GROUND")
             alt_label.setText(str(alt))
             return 
         
-        def update_dist_to_targ():
+        def update_dist_to_targ(dis):
             '''
             Function updates Dashboard distance to next waypoint. 
 
@@ -643,7 +943,6 @@ class SimUtilsApp(QWidget):
 
             '''
             try: 
-                dis = self._AQ.get("GPS_WP_DISTANCE")
                 dis_in_k = dis / 1000
                 dis_to_targ.setText(str(dis_in_k))
             except TypeError:
@@ -666,34 +965,30 @@ class SimUtilsApp(QWidget):
         
         def start_sim_rate_mon(self):
             '''
-            Function monitors sim rate and other variables and displays in the 
-            app. Refreshes every 2.5 seconds. 
+            Function starts the dashboard worker, which reads the sim rate and 
+            other variables off the GUI thread and sends them to the app 
+            refresh_rate_spin times per second. 
 
             Returns
             -------
             None.
 
             '''
-            try: 
-                if self.switch == 1: # On/Off proper connect to SimConnect
-                    timer.start(2500)
-                    # print("MONITOR START")
-                    start_push_button.hide()
-                    stop_push_button.show()
-                else:  
-                    stop_sim_rate_mon(self)
-                    msg = QMessageBox()
-                    msg.setIcon(QMessageBox.Critical)
-                    msg.setWindowTitle("MSFS Not Detected...")
-                    msg.setText("Connection Error. Microsoft Flight Simulator Must Be Running.")
-                    x = msg.exec_()
-            except OSError: 
-                timer.stop()
-                monitor_label.setText('...')
+            if self.switch == 1: # On/Off proper connect to SimConnect
+                self.dashboard = DashboardWorker(self.engine, refresh_rate_spin.value())
+                self.dashboard.setAutoDelete(True)
+                self.dashboard.signals.values.connect(update_dashboard)
+                self.dashboard.signals.error.connect(dashboard_error)
+                self.threadpool.start(self.dashboard)
+                # print("MONITOR START")
+                start_push_button.hide()
+                stop_push_button.show()
+            else:  
+                stop_sim_rate_mon(self)
                 msg = QMessageBox()
                 msg.setIcon(QMessageBox.Critical)
                 msg.setWindowTitle("MSFS Not Detected...")
-                msg.setText("Microsoft Flight Simulator Must Be Running.")
+                msg.setText("Connection Error. Microsoft Flight Simulator Must Be Running.")
                 x = msg.exec_()
             return 
             
@@ -707,7 +1002,9 @@ class SimUtilsApp(QWidget):
             None.
 
             '''
-            timer.stop()
+            if self.dashboard is not None: 
+                self.dashboard.stop()
+                self.dashboard = None
             print("MONITOR STOP")
             start_push_button.show()
             stop_push_button.hide()
@@ -718,37 +1015,63 @@ class SimUtilsApp(QWidget):
             dis_to_targ.setText('...')
             return 
         
-        def every_second_while_pressed():
+        def set_refresh_rate(refresh_hz): 
             '''
-            Function runs every 2.5 seconds and updates ANG Sim Dashboard--
-            connected to start_push_button. 
+            Function changes the refresh rate of a running dashboard--
+            connected to refresh_rate_spin. 
 
             Returns
             -------
             None.
 
             '''
-            try:
-                monitor_label.setText(str(self._AQ.get("SIMULATION_RATE"))) 
-                update_lat()
-                update_lon()
-                update_alt_ground()
-                update_dist_to_targ()
-            except OSError: 
-                timer.stop()
-                monitor_label.setText('...')
-                msg = QMessageBox()
-                msg.setIcon(QMessageBox.Critical)
-                msg.setWindowTitle("MSFS Not Detected...")
-                msg.setText("Microsoft Flight Simulator Must Be Running.")
-                x = msg.exec_()
+            if self.dashboard is not None: 
+                self.dashboard.set_refresh_rate(refresh_hz)
+            return 
+        
+        def update_dashboard(values):
+            '''
+            Function updates ANG Sim Dashboard with the values emitted by the 
+            dashboard worker; runs on the GUI thread and does no SimConnect 
+            reads. 
+
+            Returns
+            -------
+            None.
+
+            '''
+            if self.dashboard is None: 
+                return 
+            monitor_label.setText(str(values["SIMULATION_RATE"])) 
+            update_lat(values["PLANE_LATITUDE"])
+            update_lon(values["PLANE_LONGITUDE"])
+            update_alt_ground(values["PLANE_ALT_ABOVE_GROUND"])
+            update_dist_to_targ(values["GPS_WP_DISTANCE"])
+            return 
+        
+        def dashboard_error(str_error): 
+            '''
+            Function stops the dashboard when the worker lost SimConnect. 
+
+            Returns
+            -------
+            None.
+
+            '''
+            print(f"Dashboard stopped: {str_error}")
+            stop_sim_rate_mon(self)
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setWindowTitle("MSFS Not Detected...")
+            msg.setText("Microsoft Flight Simulator Must Be Running.")
+            x = msg.exec_()
             return 
         
         # CONNECT METHODS TO WIDGETS
         start_push_button.clicked.connect(lambda checked: start_sim_rate_mon(self))
         stop_push_button.clicked.connect(lambda checked: stop_sim_rate_mon(self))
         copy_to_clip_button.clicked.connect(lambda checked: copy_lat_long_to_clip(self))
-        timer.timeout.connect(every_second_while_pressed)
+        refresh_rate_spin.valueChanged.connect(set_refresh_rate)
         # APPLY THE STACK 
         self.stack4.setLayout(layout)    
     
@@ -772,8 +1095,14 @@ class SimUtilsApp(QWidget):
         print("Window closing...")
         # Perform cleanup tasks here
         print("Killing Thread...")
+        if self.dashboard is not None: 
+            self.dashboard.stop()
         if self.worker_true:
             self.worker.running = False
+        # The workers read through the engine until their loops exit
+        self.threadpool.waitForDone(3000)
+        if self.switch == 1: 
+            self.engine.stop()
 
 def main():
     app = QApplication(sys.argv)
@@ -4,10 +4,12 @@ Created on Thu Oct 10 16:59:50 2024
 
 @author: ANG
 """
+import argparse
+import os
 import ang_data_reader_utils as angdru
 import time 
 
-def main():
+def main(jobs=1):
     help_str = "\nWelcome to ANG Flight Data Converter!\n"\
                        "0. Show all Flights not converted to .csv\n"\
                        "1. Convert flight to .csv\n"\
@@ -15,7 +17,9 @@ def main():
                        "3. Convert all flights to .csv\n"\
                        "4. Convert all headers to .csv\n"\
                        "5. Convert all flights and all headers not converted to .csv\n"\
-                       "6. Exit\n\n"
+                       "6. Convert all flights to columnar format\n"\
+                       "7. Rebuild flight catalog\n"\
+                       "8. Exit\n\n"
     print(help_str)
     while True:
         user_input = input("Enter your choice: ")
@@ -34,14 +38,14 @@ def main():
                 print('Not converting... continue...')
                 continue 
             elif user_cont_0 == 'y': 
-                angdru.export_all_flights_to_csv()
+                angdru.export_all_flights_to_csv(jobs=jobs)
         elif user_input == "4": 
             angdru.show_all_flights_and_headers_not_converted()
             user_cont_0 = input('The flight headers from the above table will be converted to .csv. Continue [y n]:')
             if user_cont_0 == 'n': 
                 continue 
             elif user_cont_0 == 'y': 
-                angdru.export_all_headers_to_csv()
+                angdru.export_all_headers_to_csv(jobs=jobs)
             else: 
                 continue
         elif user_input == "5": 
@@ -51,20 +55,29 @@ def main():
                 print('Not converting... continue...')
                 continue 
             elif user_cont_0 == 'y': 
-                angdru.export_all_headers_to_csv()
-                angdru.export_all_flights_to_csv()
+                angdru.export_all_headers_to_csv(jobs=jobs)
+                angdru.export_all_flights_to_csv(jobs=jobs)
             else: 
                 continue
-        elif user_input == "6":
+        elif user_input == "6": 
+            angdru.export_all_flights_to_columns()
+        elif user_input == "7": 
+            angdru.rebuild_flight_catalog()
+        elif user_input == "8":
             print("Exiting the application. Goodbye!")
             time.sleep(4)
             break
         else:
             # Handle invalid input
             print(help_str)
-            print("Please enter a valid input [0 1 2 3 4 5 6]")
+            print("Please enter a valid input [0 1 2 3 4 5 6 7 8]")
             
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="ANG Flight Data Converter")
+    parser.add_argument("--jobs", type=int, default=1, 
+                        help="processes for the batch conversions to .csv "
+                             f"(0 for one per core, {os.cpu_count()} here)")
+    args = parser.parse_args()
+    main(args.jobs if args.jobs > 0 else os.cpu_count())
 
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Event triggered burst capture.
+
+A small set of channels is sampled at a high rate into a fixed size ring
+buffer holding the last pre_seconds of data. When a trigger channel leaves
+its allowed range (a stall or overspeed warning, a G_FORCE or VERTICAL_SPEED
+limit) the ring buffer becomes the start of a burst segment, sampling carries
+on for post_seconds after the last triggered sample, and the segment is saved
+as its own high resolution log ./data/f#/bursts/f#.burst#.log. Only the
+seconds around an event are stored at the high rate.
+
+@author: ANG
+"""
+import math
+import time
+from collections import deque
+import ang_flight_buffer as angfb
+import ang_channel_groups as anggroups
+
+BURST_GROUP = 'burst'
+
+class BurstCapture(object):
+    '''
+    Class keeps the pre-trigger ring buffer and cuts burst segments.
+
+    Parameters
+    ----------
+    schema : FlightSchema
+        Channels sampled at the burst rate; the first is TIME_NS and every
+        trigger channel must be included.
+    triggers : Dictionary
+        Channel name -> (low, high). A sample outside low..high trips the
+        trigger; None leaves that side open.
+    rate_hz : Float
+        Burst sample rate.
+    pre_seconds : Float
+        Seconds kept before the trigger.
+    post_seconds : Float
+        Seconds recorded after the last triggered sample.
+    max_seconds : Float
+        Longest segment; a trigger that stays on is cut here.
+    clock : Callable
+        Monotonic clock in seconds.
+    '''
+    def __init__(self, schema, triggers, rate_hz=20.0, pre_seconds=10.0,
+                 post_seconds=10.0, max_seconds=120.0, clock=time.monotonic):
+        for name in triggers:
+            if name not in schema:
+                raise ValueError(f'Burst trigger channel {name} is not sampled.')
+        self.group = anggroups.ChannelGroup(BURST_GROUP, schema, rate_hz, clock)
+        self.schema = schema
+        self.rate_hz = float(rate_hz)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.triggers = [(schema.names.index(name), name, low, high)
+                         for name, (low, high) in triggers.items()]
+        self.pre_samples = max(int(round(pre_seconds * rate_hz)), 1)
+        self.post_samples = max(int(round(post_seconds * rate_hz)), 1)
+        self.max_samples = max(int(round(max_seconds * rate_hz)), self.pre_samples + 1)
+        self.ring = deque(maxlen=self.pre_samples)
+        self.reset()
+
+    def reset(self):
+        '''
+        Function clears the ring buffer and segment count for a new flight.
+        '''
+        self.ring.clear()
+        self.segment = None
+        self.remaining = 0
+        self.was_tripped = False
+        self.segments = 0
+        self.group.reset()
+        return
+
+    def check(self, row):
+        '''
+        Function returns the first trigger a sample trips.
+
+        Returns
+        -------
+        tripped : Tuple or None
+            (channel name, value) or None.
+
+        '''
+        for i, name, low, high in self.triggers:
+            value = row[i]
+            if value is None or isinstance(value, float) and math.isnan(value):
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                return name, value
+        return None
+
+    def add(self, row):
+        '''
+        Function adds one burst sample.
+
+        Parameters
+        ----------
+        row : List
+            Sample values in schema order.
+
+        Returns
+        -------
+        segment : Tuple or None
+            (info, rows) of a burst segment that just completed.
+
+        '''
+        tripped = self.check(row)
+        done = None
+        if self.segment is None:
+            # A segment starts when a trigger trips, not while it stays on
+            if tripped is not None and not self.was_tripped:
+                self.segments += 1
+                info = {"index":self.segments,
+                        "trigger":tripped[0],
+                        "value":tripped[1],
+                        "trigger_time":row[0],
+                        "trigger_sample":len(self.ring),
+                        "rate_hz":self.rate_hz,
+                        "pre_seconds":self.pre_seconds,
+                        "post_seconds":self.post_seconds,
+                        }
+                self.segment = (info, list(self.ring) + [row])
+                self.remaining = self.post_samples
+        else:
+            self.segment[1].append(row)
+            if tripped is not None:
+                self.remaining = self.post_samples
+            else:
+                self.remaining -= 1
+            if self.remaining <= 0 or len(self.segment[1]) >= self.max_samples:
+                done = self.finish()
+        self.ring.append(row)
+        self.was_tripped = tripped is not None
+        return done
+
+    def finish(self):
+        '''
+        Function closes the segment being captured, i.e. at the end of a
+        flight.
+
+        Returns
+        -------
+        segment : Tuple or None
+            (info, rows), None if no segment is open.
+
+        '''
+        segment = self.segment
+        self.segment = None
+        self.remaining = 0
+        if segment is not None:
+            segment[0]["samples"] = len(segment[1])
+        return segment
+
+def burst_schema(schema, channels):
+    '''
+    Function returns the burst schema: TIME_NS and the given channels of
+    the flight schema.
+    '''
+    fields = [(anggroups.TIME_CHANNEL, schema.dtype(anggroups.TIME_CHANNEL))]
+    fields += [(name, schema.dtype(name)) for name in channels]
+    return angfb.FlightSchema(fields)
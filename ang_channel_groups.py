@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Channel groups sampled at independent rates.
+
+A flight is split into channel groups. The main group holds every channel
+that is not assigned to another group, including TIME_NS and the aircraft
+position, and is sampled at the recorder sample rate. Every other group has
+its own rate, its own SimConnect request and its own flight log
+./data/f#/f#.<group>.log, with a TIME_NS channel so the groups can be
+lined up again on export. The recorder loop runs at the fastest group rate
+and each tick only samples the groups that are due. A group's rate can be
+changed during a flight (i.e. per flight phase) with set_rate; base_rate_hz
+keeps the configured rate.
+
+@author: ANG
+"""
+import time
+import ang_flight_buffer as angfb
+import ang_flight_log as angfl
+
+MAIN_GROUP = 'main'
+TIME_CHANNEL = 'TIME_NS'
+
+class ChannelGroup(object):
+    '''
+    Class is a set of channels sampled together at one rate.
+
+    Parameters
+    ----------
+    name : String
+        Group name; also the suffix of the group flight log.
+    schema : FlightSchema
+        Channels of the group; the first is TIME_NS.
+    rate_hz : Float
+        Samples per second.
+    clock : Callable
+        Monotonic clock in seconds.
+    '''
+    def __init__(self, name, schema, rate_hz, clock=time.monotonic):
+        if rate_hz <= 0:
+            raise ValueError(f'Rate of channel group {name} must be positive, got {rate_hz}.')
+        self.name = name
+        # All channels of the group; schema is what is recorded this flight
+        self.base_schema = schema
+        self.set_schema(schema)
+        self.next_due = None
+        self.base_rate_hz = float(rate_hz)
+        self.set_rate(rate_hz)
+        self.clock = clock
+        self.batch = None
+        # A tick this early still counts as on time; half a loop period
+        self.slack = 0.0
+
+    def set_schema(self, schema):
+        '''
+        Function sets the channels recorded by the group, i.e. the request 
+        plan for the current aircraft. The SimConnect batch must be 
+        reconnected afterwards.
+        '''
+        self.schema = schema
+        self.simvars = [n for n in schema.names if n != TIME_CHANNEL]
+        return
+
+    def set_rate(self, rate_hz):
+        '''
+        Function changes the sample rate of the group; the next sample is due
+        one new period after the last one.
+        '''
+        if rate_hz <= 0:
+            raise ValueError(f'Rate of channel group {self.name} must be positive, got {rate_hz}.')
+        rate_hz = float(rate_hz)
+        if self.next_due is not None:
+            self.next_due += 1.0 / rate_hz - self.period
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        return
+
+    @property
+    def is_main(self):
+        return self.name == MAIN_GROUP
+
+    def log_path(self, flight_num):
+        return angfl.flight_log_path(flight_num, None if self.is_main else self.name)
+
+    def reset(self):
+        '''
+        Function makes the group due on the next tick, i.e. at the start of a
+        new flight.
+        '''
+        self.next_due = None
+        return
+
+    def due(self):
+        '''
+        Function checks if the group should be sampled now and, if so, moves
+        its deadline one period on. A group that fell more than a period
+        behind restarts its deadlines from now instead of catching up.
+
+        Returns
+        -------
+        due : Bool
+
+        '''
+        now = self.clock()
+        if self.next_due is not None and now < self.next_due - self.slack:
+            return False
+        if self.next_due is None or now - self.next_due > self.period:
+            self.next_due = now
+        self.next_due += self.period
+        return True
+
+def split_schema(schema, channel_groups, main_rate_hz, clock=time.monotonic):
+    '''
+    Function splits the flight schema into channel groups.
+
+    Parameters
+    ----------
+    schema : FlightSchema
+        All recorded channels, starting with TIME_NS.
+    channel_groups : Dictionary
+        Group name -> (rate_hz, list of channel names). Channels not listed
+        stay in the main group.
+    main_rate_hz : Float
+        Rate of the main group.
+    clock : Callable
+        Monotonic clock in seconds.
+
+    Returns
+    -------
+    groups : List
+        ChannelGroup list; the main group first.
+
+    '''
+    assigned = {}
+    for name, (rate_hz, channels) in channel_groups.items():
+        if name == MAIN_GROUP:
+            raise ValueError(f'{MAIN_GROUP} is reserved for the ungrouped channels.')
+        for channel in channels:
+            if channel not in schema or channel == TIME_CHANNEL:
+                raise ValueError(f'Channel group {name}: unknown channel {channel}.')
+            if channel in assigned:
+                raise ValueError(f'Channel {channel} is in groups {assigned[channel]} and {name}.')
+            assigned[channel] = name
+    main_fields = [f for f in schema.fields if f[0] not in assigned]
+    groups = [ChannelGroup(MAIN_GROUP, angfb.FlightSchema(main_fields), main_rate_hz, clock)]
+    for name, (rate_hz, channels) in channel_groups.items():
+        fields = [(TIME_CHANNEL, schema.dtype(TIME_CHANNEL))]
+        fields += [f for f in schema.fields if assigned.get(f[0]) == name]
+        groups.append(ChannelGroup(name, angfb.FlightSchema(fields), rate_hz, clock))
+    set_loop_rate(groups, loop_rate(groups))
+    return groups
+
+def loop_rate(groups):
+    '''
+    Function returns the loop rate needed to sample every group on time.
+    '''
+    return max(group.rate_hz for group in groups)
+
+def set_loop_rate(groups, rate_hz):
+    '''
+    Function tells the groups the rate of the loop sampling them: a group is 
+    on time on the loop tick nearest to its deadline, up to half a loop 
+    period early.
+    '''
+    for group in groups:
+        group.slack = 0.5 / rate_hz
+    return
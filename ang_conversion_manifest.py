@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Persisted manifest of the CSV conversions.
+
+The converter used to decide what to convert by walking ./data and
+./data_csv for every flight. The manifest ./data_csv/manifest.json records,
+per flight number, the source files each flight and header was converted
+from, with their size, mtime and a SHA-1 of their content. The pending work
+of a batch is then worked out once with set operations:
+
+    pending = (recorded - converted) | changed | (converted - csv files)
+
+A source counts as changed only if its size or mtime differ and its hash
+does too, so touching a file does not cause a conversion and the hashes are
+only read for files that look changed. The manifest lives with the CSV
+files, so removing ./data_csv starts over.
+
+@author: ANG
+"""
+import hashlib
+import json
+import os
+import ang_flight_log as angfl
+
+MANIFEST_PATH = './data_csv/manifest.json'
+MANIFEST_VERSION = 1
+FLIGHTS = 'flights'
+HEADERS = 'headers'
+HASH_CHUNK = 1 << 20
+
+def file_stat(path):
+    '''
+    Function returns [size, mtime ns] of a file.
+    '''
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def file_hash(paths):
+    '''
+    Function returns the SHA-1 of the content of files, in the given order.
+
+    Returns
+    -------
+    digest : String
+
+    '''
+    sha1 = hashlib.sha1()
+    for path in paths:
+        sha1.update(path.encode())
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(HASH_CHUNK), b''):
+                sha1.update(chunk)
+    return sha1.hexdigest()
+
+def fingerprint(paths, digest=True):
+    '''
+    Function fingerprints the source files of a conversion.
+
+    Parameters
+    ----------
+    paths : List
+        Source file paths.
+    digest : Bool
+        Also hash the content; without it sha1 is None.
+
+    Returns
+    -------
+    entry : Dictionary
+        {"files":{path:[size, mtime ns]}, "sha1":digest}.
+
+    '''
+    paths = sorted(paths)
+    entry = {"files":{path:file_stat(path) for path in paths},
+             "sha1":file_hash(paths) if digest else None}
+    return entry
+
+class ConversionManifest(object):
+    '''
+    Class holds the conversion manifest.
+
+    Parameters
+    ----------
+    path : String
+        Manifest file.
+    '''
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = {FLIGHTS:{}, HEADERS:{}}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        '''
+        Function reads the manifest; a missing or unreadable manifest is
+        empty.
+        '''
+        try:
+            with open(self.path, 'rb') as fp:
+                payload = json.loads(fp.read())
+            if payload.get("version") == MANIFEST_VERSION:
+                self.entries = {kind:dict(payload.get(kind, {})) for kind in (FLIGHTS, HEADERS)}
+        except (OSError, ValueError):
+            pass
+        return
+
+    def save(self):
+        '''
+        Function writes the manifest with an atomic rename, if it changed.
+        '''
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        payload = dict(self.entries, version=MANIFEST_VERSION)
+        angfl.write_file_atomic(self.path, json.dumps(payload, sort_keys=True).encode())
+        self.dirty = False
+        return
+
+    def changed(self, kind, flight_num, paths):
+        '''
+        Function checks if the sources of a conversion changed since it was
+        recorded. Files with the same size and mtime are taken as unchanged;
+        the others are hashed.
+
+        Returns
+        -------
+        changed : Bool
+
+        '''
+        entry = self.entries[kind].get(flight_num)
+        if entry is None:
+            return True
+        paths = sorted(paths)
+        stats = {}
+        for path in paths:
+            try:
+                stats[path] = file_stat(path)
+            except OSError:
+                return True
+        if stats == entry["files"]:
+            return False
+        if entry["sha1"] is None or set(stats) != set(entry["files"]):
+            return True
+        if file_hash(paths) != entry["sha1"]:
+            return True
+        # Touched but not changed
+        entry["files"] = stats
+        self.dirty = True
+        return False
+
+    def pending(self, kind, sources, converted_files):
+        '''
+        Function works out the conversions to do.
+
+        Parameters
+        ----------
+        kind : String
+            FLIGHTS or HEADERS.
+        sources : Dictionary
+            Recorded flight number -> source paths.
+        converted_files : Set
+            Flight numbers with a CSV file.
+
+        Returns
+        -------
+        pending : List
+            Flight numbers in flight number order.
+
+        '''
+        recorded = set(sources)
+        converted = set(self.entries[kind])
+        # CSV files from before the manifest: taken as converted from the
+        # sources as they are now
+        for flight_num in (recorded & set(converted_files)) - converted:
+            self.entries[kind][flight_num] = fingerprint(sources[flight_num], digest=False)
+            self.dirty = True
+        converted = set(self.entries[kind]) & set(converted_files)
+        changed = {f for f in recorded & converted if self.changed(kind, f, sources[f])}
+        pending = (recorded - converted) | changed
+        return sorted(pending, key=lambda f: (len(f), f))
+
+    def record(self, kind, flight_num, entry):
+        '''
+        Function records a finished conversion with the fingerprint of its
+        sources, from fingerprint().
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.entries[kind][flight_num] = entry
+        self.dirty = True
+        return
@@ -6,7 +6,23 @@ Created on Wed Sep 25 15:21:28 2024
 """
 import os
 import pickle 
-from pandas import DataFrame 
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+import numpy as np
+from pandas import DataFrame, merge_asof, to_datetime 
+import ang_flight_log as angfl
+import ang_flight_columns as angcols
+import ang_flight_catalog as angcat
+import ang_conversion_manifest as angman
+
+TIME_CHANNEL = 'TIME_NS'
+LOCAL_TIME = 'LOCAL_TIME'
+FLIGHT_PHASE = 'FLIGHT_PHASE'
+# Converted files in ./data_csv, i.e. f12.csv and f12_Flight_Header.csv
+CSV_FLIGHT_RE = re.compile(r'^(f\d+)\.csv$')
+CSV_HEADER_RE = re.compile(r'^(f\d+)_Flight_Header\.csv$')
 
 def test_check_data_dirs(): 
     os.makedirs('data_csv', exist_ok=True)
@@ -34,13 +50,282 @@ def load_data(some_pickle_file_path_str):
     return the_data
 
 def load_header(flight_num): 
-    data = load_data(f"./data/{flight_num}/{flight_num}_Flight_Header.pkl")
+    '''
+    Function loads the header of a flight, from its typed JSON header if it 
+    has one, else from its pickle. 
+    '''
+    if os.path.exists(angcols.header_path(flight_num)): 
+        data = angcols.load_header(flight_num)
+    else: 
+        data = load_data(f"./data/{flight_num}/{flight_num}_Flight_Header.pkl")
     return data
 
-def load_flight_data(flight_num): 
-    data = load_data(f"./data/{flight_num}/{flight_num}.pkl")
+def project_columns(data, columns=None): 
+    '''
+    Function keeps only the given channels of a flight data dictionary. 
+    '''
+    if columns is None: 
+        return data
+    missing = [name for name in columns if name not in data]
+    if missing: 
+        raise KeyError(f'Channels not in flight: {sorted(missing)}')
+    for name in [name for name in data if name not in columns]: 
+        del data[name]
+    return data
+
+def load_flight_data(flight_num, columns=None, group=None): 
+    '''
+    Function loads the flight data of a flight. Flights with a column store 
+    (./data/f#/f#.cols) only read the requested channels. Flights recorded 
+    to an append only flight log (./data/f#/f#.log) are reassembled from 
+    their frames, older flights are loaded from their pickle 
+    (./data/f#/f#.pkl). 
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+    columns : List, optional
+        Channel names to load; defaults to all.
+    group : String, optional
+        Channel group to load instead of the main flight data.
+
+    Returns
+    -------
+    data : Dictionary
+        Flight data dictionary; NumPy arrays from a column store.
+
+    '''
+    if angcols.columns_exist(flight_num, group): 
+        data = angcols.load_columns(angcols.columns_path(flight_num, group), 
+                                    columns, np.load)
+    elif group is not None or angfl.flight_log_exists(flight_num): 
+        data = project_columns(angfl.load_flight_log(
+            angfl.flight_log_path(flight_num, group)), columns)
+    else: 
+        data = project_columns(load_data(f"./data/{flight_num}/{flight_num}.pkl"), columns)
+    return data
+
+def map_flight_data(flight_num, columns=None, group=None): 
+    '''
+    Function memory-maps the column store of a flight. Nothing is read until 
+    the columns are used, and then only the pages touched. 
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+    columns : List, optional
+        Channel names to map; defaults to all.
+    group : String, optional
+        Channel group to map instead of the main flight data.
+
+    Returns
+    -------
+    data : FlightBuffer
+        Channel name -> read-only numpy.memmap.
+
+    '''
+    data = angcols.load_columns(angcols.columns_path(flight_num, group), columns, 
+                                partial(np.load, mmap_mode='r'))
     return data
 
+def to_time_ns(value): 
+    '''
+    Function returns a time as UTC nanoseconds since the epoch; integers are 
+    taken as nanoseconds, anything else is parsed by pandas.to_datetime 
+    (naive times are UTC). 
+    '''
+    if value is None or isinstance(value, (int, np.integer)): 
+        return value
+    return int(to_datetime(value, utc=True).value)
+
+def time_window(time_ns, start=None, end=None): 
+    '''
+    Function finds the samples of a sorted time column in [start, end) with 
+    a binary search. 
+
+    Returns
+    -------
+    first : Integer
+    last : Integer
+        Sample slice first:last of the window.
+
+    '''
+    first = 0 if start is None else int(np.searchsorted(time_ns, to_time_ns(start), side='left'))
+    last = len(time_ns) if end is None else int(np.searchsorted(time_ns, to_time_ns(end), side='left'))
+    return first, max(first, last)
+
+def load_flight_window(flight_num, start=None, end=None, columns=None, group=None): 
+    '''
+    Function returns the samples of a flight in the time window [start, end). 
+    Flights with a column store are memory-mapped and the channels are 
+    zero-copy views of the window, so the cost follows the window and the 
+    number of channels rather than the length of the flight. Other flights 
+    are loaded whole and then sliced. 
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+    start : Integer or time, optional
+        Window start in UTC nanoseconds, or a time pandas.to_datetime parses; 
+        defaults to the start of the flight.
+    end : Integer or time, optional
+        Window end (excluded); defaults to the end of the flight.
+    columns : List, optional
+        Channel names; TIME_NS is always included. Defaults to all.
+    group : String, optional
+        Channel group instead of the main flight data.
+
+    Returns
+    -------
+    data : Dictionary
+        Channel name -> values of the window, with the timezones and phases 
+        of the flight.
+
+    '''
+    if columns is not None: 
+        columns = [TIME_CHANNEL] + [name for name in columns if name != TIME_CHANNEL]
+    if angcols.columns_exist(flight_num, group): 
+        data = map_flight_data(flight_num, columns, group)
+    else: 
+        data = load_flight_data(flight_num, columns, group)
+    if TIME_CHANNEL not in data: 
+        raise ValueError(f'Flight {flight_num} has no {TIME_CHANNEL} channel.')
+    first, last = time_window(np.asarray(data[TIME_CHANNEL]), start, end)
+    for name in list(data): 
+        data[name] = data[name][first:last]
+    return data
+
+def load_flight_groups(flight_num): 
+    '''
+    Function loads the channel groups a flight recorded at their own rate 
+    (./data/f#/f#.<group>.cols or ./data/f#/f#.<group>.log). 
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+
+    Returns
+    -------
+    groups : Dictionary
+        Group name -> flight data dictionary with its own TIME_NS channel; 
+        empty for flights recorded without channel groups.
+
+    '''
+    groups = {}
+    for group in angfl.flight_log_groups(flight_num): 
+        groups[group] = load_flight_data(flight_num, group=group)
+    return groups
+
+def load_flight_bursts(flight_num): 
+    '''
+    Function loads the high rate burst segments of a flight 
+    (./data/f#/bursts/f#.burst#.log). 
+
+    Returns
+    -------
+    bursts : List
+        (info, flight data dictionary) per segment; info holds the trigger 
+        channel, value and time.
+
+    '''
+    bursts = [angfl.load_segment(log_path) for log_path in angfl.flight_burst_logs(flight_num)]
+    return bursts
+
+def resample_flight_groups(flight_data, groups): 
+    '''
+    Function puts the channel groups on the timeline of the main flight data. 
+    Every main sample gets the group sample nearest to it in time (TIME_NS, 
+    or LOCAL_TIME for older flights), so faster groups are decimated and 
+    slower groups are repeated. 
+
+    Parameters
+    ----------
+    flight_data : Dictionary
+        Main flight data dictionary.
+    groups : Dictionary
+        Group name -> group flight data dictionary.
+
+    Returns
+    -------
+    df : DataFrame
+        One row per main sample with the channels of every group.
+
+    '''
+    df = data_to_dataframe(flight_data)
+    for name, group_data in groups.items(): 
+        group_df = data_to_dataframe(group_data)
+        if len(df) == 0 or len(group_df) == 0: 
+            continue
+        on = TIME_CHANNEL if TIME_CHANNEL in df else LOCAL_TIME
+        df = merge_asof(df.sort_values(on), group_df.sort_values(on), 
+                        on=on, direction='nearest')
+    return df
+
+def render_local_time(df, timezones): 
+    '''
+    Function adds the LOCAL_TIME column to flight data stamped in UTC 
+    nanoseconds (TIME_NS). Every sample gets the UTC offset of the timezone 
+    segment it falls in; the whole column is converted at once. 
+
+    Parameters
+    ----------
+    df : DataFrame
+        Flight data with a TIME_NS column.
+    timezones : List
+        (start time ns, UTC offset seconds, zone name) timezone segments of 
+        the flight, sorted by start time.
+
+    Returns
+    -------
+    df : DataFrame
+        Flight data with LOCAL_TIME as the first column. Older flights 
+        without TIME_NS are returned unchanged.
+
+    '''
+    if TIME_CHANNEL not in df or LOCAL_TIME in df: 
+        return df
+    time_ns = df[TIME_CHANNEL].to_numpy(dtype=np.int64)
+    offsets_ns = np.zeros(len(time_ns), dtype=np.int64)
+    if timezones: 
+        starts = np.array([t for t, offset, zone in timezones], dtype=np.int64)
+        offsets = np.array([offset for t, offset, zone in timezones], dtype=np.int64)
+        # Samples before the first segment use its offset
+        segment = np.maximum(np.searchsorted(starts, time_ns, side='right') - 1, 0)
+        offsets_ns = offsets[segment] * 1000000000
+    df.insert(0, LOCAL_TIME, to_datetime(time_ns + offsets_ns, unit='ns'))
+    return df
+
+def render_flight_phase(df, phases): 
+    '''
+    Function adds the FLIGHT_PHASE column from the phase transitions of the 
+    flight; every sample gets the phase that started last at or before it. 
+
+    Parameters
+    ----------
+    df : DataFrame
+        Flight data with a TIME_NS column.
+    phases : List
+        (sample index, time ns, phase) transitions sorted by sample index.
+
+    Returns
+    -------
+    df : DataFrame
+        Flight data with a FLIGHT_PHASE column; unchanged without phases.
+
+    '''
+    if TIME_CHANNEL not in df or not phases: 
+        return df
+    starts = np.array([t for i, t, phase in phases], dtype=np.int64)
+    names = np.array([''] + [phase for i, t, phase in phases], dtype=object)
+    # Samples before the first transition have no phase yet
+    segment = np.searchsorted(starts, df[TIME_CHANNEL].to_numpy(dtype=np.int64), side='right')
+    df[FLIGHT_PHASE] = names[segment]
+    return df
+
 def data_to_dataframe(data_dictionary):
     try: 
         df = DataFrame(data_dictionary)
@@ -48,14 +333,60 @@ def data_to_dataframe(data_dictionary):
         df = DataFrame(data_dictionary, index=[0]).T
     return df
 
+def get_flight_catalog(): 
+    '''
+    Function returns the flight catalog (see ang_flight_catalog), building 
+    it from ./data the first time. 
+
+    Returns
+    -------
+    catalog : FlightCatalog
+    '''
+    catalog = angcat.FlightCatalog()
+    if not catalog.exists() and os.path.isdir('./data'): 
+        print('Building flight catalog...')
+        catalog.rebuild()
+    return catalog
+
+def get_recorded_files(): 
+    '''
+    Function lists the flight data file and header file of every catalogued 
+    flight, in flight number order. Flights still recording have no data 
+    file yet.
+
+    Returns
+    -------
+    recorded : List
+        List of (flight num, data file name or None, header file name or None).
+    '''
+    if not os.path.isdir('./data'): 
+        return []
+    recorded = [(flight["flight_num"], flight["data_file"], flight["header_file"]) 
+                for flight in get_flight_catalog().find(
+                    columns=['flight_num', 'data_file', 'header_file'])]
+    return recorded
+
+def rebuild_flight_catalog(): 
+    '''
+    Function recreates the flight catalog from the flight directories in 
+    ./data. 
+
+    Returns
+    -------
+    None.
+    '''
+    count = angcat.FlightCatalog().rebuild()
+    print(f'Catalogued {count} flights.')
+    return 
+
 def show_all_flights_and_headers_pkl():
     # Header for the table
     print(f'{"Flights in ./data:":<30} {"Headers in ./data:"}')
-    for root, dirs, files in os.walk('./data'):  # iterates through all flight directories in ./data
-        if len(files) < 2:
+    for flight_num, data_file, header_file in get_recorded_files():
+        if data_file is None or header_file is None:
             continue
         else:
-            print(f'{files[0]:<30} {files[1]}')
+            print(f'{data_file:<30} {header_file}')
     return
 
 def get_csv_flight_nums(): 
@@ -69,15 +400,19 @@ def get_csv_flight_nums():
         List of string flight nums i.e. ['f1','f2','f3',...].
     '''
     current_csv_flight_nums = []
-    for i in os.walk('./data_csv/flight_data'): 
-        for i2 in i[2]:
-            current_csv_flight_nums.append(i2.split('.')[0])
+    if not os.path.isdir('./data_csv/flight_data'): 
+        return current_csv_flight_nums
+    with os.scandir('./data_csv/flight_data') as entries: 
+        for entry in entries: 
+            match = CSV_FLIGHT_RE.match(entry.name)
+            if match and entry.is_file(): 
+                current_csv_flight_nums.append(match.group(1))
     return current_csv_flight_nums
 
 def get_csv_flight_headers(): 
     '''
     Function returns a list of string flight headers that currently exist in 
-    ./data_csv/flight_data
+    ./data_csv/flight_headers
 
     Returns
     -------
@@ -85,9 +420,13 @@ def get_csv_flight_headers():
         List of string flight nums i.e. ['f1','f2','f3',...].
     '''
     current_csv_flight_headers = []
-    for i in os.walk('./data_csv/flight_headers'): 
-        for i2 in i[2]:
-            current_csv_flight_headers.append(i2.split('_')[0])
+    if not os.path.isdir('./data_csv/flight_headers'): 
+        return current_csv_flight_headers
+    with os.scandir('./data_csv/flight_headers') as entries: 
+        for entry in entries: 
+            match = CSV_HEADER_RE.match(entry.name)
+            if match and entry.is_file(): 
+                current_csv_flight_headers.append(match.group(1))
     return current_csv_flight_headers
 
 def get_all_headers_pkl(): 
@@ -100,9 +439,9 @@ def get_all_headers_pkl():
         List of string flight header nums i.e. ['f1','f2','f3',...].
     '''
     headers_lst = []
-    for root, dirs, files in os.walk('./data'):  # iterates through all flight directories in ./data
-        if len(files) == 2:
-            headers_lst.append(files[1].split('_')[0])
+    for flight_num, data_file, header_file in get_recorded_files():
+        if data_file is not None and header_file is not None:
+            headers_lst.append(flight_num)
     return headers_lst
 
 def get_all_flight_pkl(): 
@@ -115,39 +454,92 @@ def get_all_flight_pkl():
         List of string flight nums i.e. ['f1','f2','f3',...].
     '''
     flights_lst = []
-    for root, dirs, files in os.walk('./data'):  # iterates through all flight directories in ./data
-        if len(files) == 2:  
-            flights_lst.append(files[0].split('.')[0])
+    for flight_num, data_file, header_file in get_recorded_files():
+        if data_file is not None and header_file is not None:  
+            flights_lst.append(flight_num)
     return flights_lst
 
-def check_convert_headers_to_csv(): 
+def flight_sources(flight_num): 
+    '''
+    Function lists the files the .csv of a flight is converted from: its main 
+    flight log (or pickle, or column store schema), group logs and burst 
+    logs. 
+
+    Returns
+    -------
+    sources : List
+        File paths.
+    '''
+    pkl_path = f"./data/{flight_num}/{flight_num}.pkl"
+    if angfl.flight_log_exists(flight_num): 
+        sources = [angfl.flight_log_path(flight_num)]
+    elif os.path.exists(pkl_path): 
+        sources = [pkl_path]
+    else: 
+        sources = [os.path.join(angcols.columns_path(flight_num), angcols.SCHEMA_FILE)]
+    sources += [angfl.flight_log_path(flight_num, group) for group in angfl.flight_log_groups(flight_num)]
+    sources += angfl.flight_burst_logs(flight_num)
+    return sources
+
+def header_sources(flight_num): 
+    '''
+    Function lists the files the header .csv of a flight is converted from. 
+    '''
+    pkl_path = f"./data/{flight_num}/{flight_num}_Flight_Header.pkl"
+    if os.path.exists(pkl_path): 
+        return [pkl_path]
+    return [angcols.header_path(flight_num)]
+
+def check_convert_headers_to_csv(flight_nums=None, manifest=None): 
     '''
     Function checks for all header numbers recorded in ./data that are not 
-    yet converted to .csv in ./data_csv/flight_headers
+    yet converted to .csv in ./data_csv/flight_headers, or whose header 
+    changed since it was converted (see ang_conversion_manifest). 
+
+    Parameters
+    ----------
+    flight_nums : Set, optional
+        Only check these flight numbers.
+    manifest : ConversionManifest, optional
+        Manifest to check against; defaults to ./data_csv/manifest.json. 
+        The manifest is not saved; callers that record conversions save it.
 
     Returns
     -------
     diff_lst : List
         List of string flight nums i.e. ['f1','f2','f3',...].
     '''
-    current_csv_flight_headers_lst = get_csv_flight_headers()
-    current_pkl_headers_lst = get_all_headers_pkl()
-    diff_lst = [i for i in current_pkl_headers_lst if i not in current_csv_flight_headers_lst]
+    if manifest is None: 
+        manifest = angman.ConversionManifest()
+    sources = {i:header_sources(i) for i in get_all_headers_pkl() 
+               if flight_nums is None or i in flight_nums}
+    diff_lst = manifest.pending(angman.HEADERS, sources, set(get_csv_flight_headers()))
     return diff_lst
 
-def check_convert_flights_to_csv(): 
+def check_convert_flights_to_csv(flight_nums=None, manifest=None): 
     '''
-    Fucntion checks for all flight data numbers recorded in ./data that are not 
-    yet converted to .csv in ./data_csv/flight_data
+    Function checks for all flight data numbers recorded in ./data that are 
+    not yet converted to .csv in ./data_csv/flight_data, or whose flight 
+    data changed since it was converted (see ang_conversion_manifest). 
+
+    Parameters
+    ----------
+    flight_nums : Set, optional
+        Only check these flight numbers.
+    manifest : ConversionManifest, optional
+        Manifest to check against; defaults to ./data_csv/manifest.json. 
+        The manifest is not saved; callers that record conversions save it.
 
     Returns
     -------
     diff_lst : List
         List of string flight nums i.e. ['f1','f2','f3',...].
     '''
-    current_csv_flights_lst = get_csv_flight_nums()
-    current_pkl_flights_lst = get_all_flight_pkl()
-    diff_lst = [i for i in current_pkl_flights_lst if i not in current_csv_flights_lst]
+    if manifest is None: 
+        manifest = angman.ConversionManifest()
+    sources = {i:flight_sources(i) for i in get_all_flight_pkl() 
+               if flight_nums is None or i in flight_nums}
+    diff_lst = manifest.pending(angman.FLIGHTS, sources, set(get_csv_flight_nums()))
     return diff_lst
 
 def show_all_flights_and_headers_not_converted():
@@ -169,52 +561,242 @@ def show_all_flights_and_headers_not_converted():
     print('---------------------------------')
     return
 
-def convert_single_flight_to_csv(flight_num_str): 
-    if flight_num_str in check_convert_flights_to_csv():
+def write_flight_csv(flight_num_str, resample=True): 
+    '''
+    Function converts a flight to ./data_csv/flight_data/f#.csv. Channel groups 
+    are resampled onto the main timeline, or with resample=False exported at 
+    their own rate to ./data_csv/flight_data/f#.<group>.csv. Burst segments 
+    are exported to ./data_csv/flight_data/bursts/f#.burst#.csv. LOCAL_TIME 
+    is rendered from TIME_NS with the timezone segments of the main flight 
+    log, and FLIGHT_PHASE from its phase transitions.
+
+    Returns
+    -------
+    None.
+    '''
+    flight_data = load_flight_data(flight_num_str)
+    timezones = getattr(flight_data, 'timezones', [])
+    phases = getattr(flight_data, 'phases', [])
+    groups = load_flight_groups(flight_num_str)
+    if resample: 
+        df = resample_flight_groups(flight_data, groups)
+    else: 
+        df = data_to_dataframe(flight_data)
+        for name, group_data in groups.items(): 
+            render_flight_phase(render_local_time(data_to_dataframe(group_data), timezones), phases).to_csv(f'./data_csv/flight_data/{flight_num_str}.{name}.csv', index=False)
+    render_flight_phase(render_local_time(df, timezones), phases).to_csv(f'./data_csv/flight_data/{flight_num_str}.csv', index=False)
+    bursts = load_flight_bursts(flight_num_str)
+    if bursts: 
+        os.makedirs('./data_csv/flight_data/bursts', exist_ok=True)
+    for info, burst_data in bursts: 
+        render_flight_phase(render_local_time(data_to_dataframe(burst_data), timezones), phases).to_csv(f'./data_csv/flight_data/bursts/{flight_num_str}.burst{info["index"]}.csv', index=False)
+    return 
+
+def write_header_csv(flight_num_str): 
+    '''
+    Function converts a flight header to 
+    ./data_csv/flight_headers/f#_Flight_Header.csv. 
+    '''
+    data_to_dataframe(load_header(flight_num_str)).to_csv(f'./data_csv/flight_headers/{flight_num_str}_Flight_Header.csv')
+    return 
+
+def convert_task(kind, flight_num_str, resample=True): 
+    '''
+    Function converts one flight or header of a batch to .csv. It runs in 
+    the worker processes of run_conversions, so errors are returned instead 
+    of raised and the catalog and manifest are left to the caller. 
+
+    Parameters
+    ----------
+    kind : String
+        angman.FLIGHTS or angman.HEADERS.
+    flight_num_str : String
+        Flight number string i.e. 'f1'.
+    resample : Bool
+        See write_flight_csv.
+
+    Returns
+    -------
+    flight_num_str : String
+    entry : Dictionary or None
+        Manifest entry of the sources (see angman.fingerprint); None on error.
+    error : String or None
+    seconds : Float
+
+    '''
+    start = time.perf_counter()
+    try: 
+        if kind == angman.FLIGHTS: 
+            sources = flight_sources(flight_num_str)
+            write_flight_csv(flight_num_str, resample)
+        else: 
+            sources = header_sources(flight_num_str)
+            write_header_csv(flight_num_str)
+        entry, error = angman.fingerprint(sources), None
+    except Exception as e: 
+        entry, error = None, f'{type(e).__name__}: {e}'
+    return flight_num_str, entry, error, time.perf_counter() - start
+
+def run_conversions(kind, flight_nums, jobs=1, resample=True): 
+    '''
+    Function runs convert_task for flight numbers, in a pool of jobs worker 
+    processes when jobs > 1. Every flight writes its own files, so the 
+    output does not depend on the order the workers finish in. 
+
+    Yields
+    ------
+    result : Tuple
+        Result of convert_task, in the order the flights finish.
+    '''
+    if jobs <= 1 or len(flight_nums) <= 1: 
+        for i in flight_nums: 
+            yield convert_task(kind, i, resample)
+        return 
+    with ProcessPoolExecutor(max_workers=min(jobs, len(flight_nums))) as pool: 
+        futures = {pool.submit(convert_task, kind, i, resample):i for i in flight_nums}
+        for future in as_completed(futures): 
+            try: 
+                yield future.result()
+            except Exception as e: 
+                # i.e. a worker killed by running out of memory 
+                yield futures[future], None, f'{type(e).__name__}: {e}', 0.0
+    return 
+
+def export_to_csv(kind, jobs=1, resample=True): 
+    '''
+    Function converts every flight or header that is pending (see 
+    check_convert_flights_to_csv) with run_conversions, printing the 
+    progress of each flight. A flight that fails is reported and stays 
+    pending; the rest of the batch carries on. 
+
+    Returns
+    -------
+    failed : List
+        Flight numbers that failed, in flight number order.
+    '''
+    test_check_data_dirs()
+    manifest = angman.ConversionManifest()
+    if kind == angman.FLIGHTS: 
+        label, converted = 'flight', {'csv':True}
+        pending = check_convert_flights_to_csv(manifest=manifest)
+    else: 
+        label, converted = 'flight header', {'header_csv':True}
+        pending = check_convert_headers_to_csv(manifest=manifest)
+    catalog = get_flight_catalog()
+    failed = []
+    try: 
+        results = run_conversions(kind, pending, jobs, resample)
+        for done, (flight_num, entry, error, seconds) in enumerate(results, 1): 
+            if error is None: 
+                manifest.record(kind, flight_num, entry)
+                catalog.set_converted(flight_num, **converted)
+                print(f'[{done}/{len(pending)}] Converted {label} {flight_num} to csv ({seconds:.1f} s)')
+            else: 
+                failed.append(flight_num)
+                print(f'[{done}/{len(pending)}] Failed to convert {label} {flight_num}: {error}')
+    finally: 
+        manifest.save()
+    failed = set(failed)
+    failed = [i for i in pending if i in failed]
+    if failed: 
+        print(f'Not converted ({len(failed)} of {len(pending)}): {" ".join(failed)}')
+    return failed
+
+def convert_single_flight_to_csv(flight_num_str, resample=True): 
+    '''
+    Function converts a flight to .csv (see write_flight_csv) if it is not 
+    converted yet or its flight data changed, and records it in the 
+    conversion manifest. 
+    '''
+    manifest = angman.ConversionManifest()
+    if flight_num_str in check_convert_flights_to_csv({flight_num_str}, manifest):
         print(f'Converting flight {flight_num_str} to csv...')
-        data_to_dataframe(load_flight_data(flight_num_str)).to_csv(f'./data_csv/flight_data/{flight_num_str}.csv', index=False)
+        sources = flight_sources(flight_num_str)
+        write_flight_csv(flight_num_str, resample)
+        get_flight_catalog().set_converted(flight_num_str, csv=True)
+        manifest.record(angman.FLIGHTS, flight_num_str, angman.fingerprint(sources))
     else: 
         print(f"Flight {flight_num_str} already converted or does not exist. ")
+    manifest.save()
     return 
 
 def convert_single_header_to_csv(flight_num_str): 
-    if flight_num_str in check_convert_headers_to_csv():
+    manifest = angman.ConversionManifest()
+    if flight_num_str in check_convert_headers_to_csv({flight_num_str}, manifest):
         print(f'Converting flight header {flight_num_str} to csv...')
-        data_to_dataframe(load_header(flight_num_str)).to_csv(f'./data_csv/flight_headers/{flight_num_str}_Flight_Header.csv')
+        sources = header_sources(flight_num_str)
+        write_header_csv(flight_num_str)
+        get_flight_catalog().set_converted(flight_num_str, header_csv=True)
+        manifest.record(angman.HEADERS, flight_num_str, angman.fingerprint(sources))
     else: 
         print(f"Flight header {flight_num_str} already converted or does not exist. ")
+    manifest.save()
     return 
 
-def export_all_flights_to_csv(): 
+def export_all_flights_to_csv(resample=True, jobs=1): 
     '''
     Function converts and exports all flight data from .pkl in ./data 
     to .csv in data_csv directory if it does not 
-    already exist in ./flight_data 
+    already exist in ./flight_data, or if its flight data changed since it 
+    was converted. Channel groups are resampled onto the main timeline 
+    unless resample is False. With jobs > 1 the flights are converted in 
+    that many processes (see export_to_csv). 
+
+    Returns
+    -------
+    failed : List
+        Flight numbers that failed to convert.
+    '''
+    return export_to_csv(angman.FLIGHTS, jobs, resample)
+
+def convert_flight_to_columns(flight_num_str): 
+    '''
+    Function writes the column store and typed header of a flight recorded 
+    before the recorder wrote them, from its flight logs or its pickle. 
+
+    Returns
+    -------
+    nbytes : Integer
+        Size of the column stores in bytes.
+
+    '''
+    print(f'Converting flight {flight_num_str} to columns...')
+    if angfl.flight_log_exists(flight_num_str): 
+        nbytes = angcols.write_flight_columns(flight_num_str)
+    else: 
+        nbytes = angcols.write_columns(angcols.columns_path(flight_num_str), 
+                                       load_data(f"./data/{flight_num_str}/{flight_num_str}.pkl"))
+    if not os.path.exists(angcols.header_path(flight_num_str)): 
+        angcols.save_header(load_header(flight_num_str), flight_num_str)
+    get_flight_catalog().finish_flight(flight_num_str)
+    return nbytes
+
+def export_all_flights_to_columns(): 
+    '''
+    Function writes the column store of every flight in ./data that does not 
+    have one yet. 
 
     Returns
     -------
     None.
     '''
-    # All flight nums in ./data_csv 
-    test_check_data_dirs()
-    check_convert_flights_lst = check_convert_flights_to_csv()
-    for i in check_convert_flights_lst:
-        convert_single_flight_to_csv(i)
+    for i in get_all_flight_pkl(): 
+        if not angcols.columns_exist(i): 
+            convert_flight_to_columns(i)
     return 
 
-def export_all_headers_to_csv(): 
+def export_all_headers_to_csv(jobs=1): 
     '''
     Function converts and exports all flight header data from .pkl in ./data 
     to .csv in data_csv directory if it does not 
-    already exist in ./flight_headers 
+    already exist in ./flight_headers, or if its header changed since it was 
+    converted. With jobs > 1 the headers are converted in that many 
+    processes (see export_to_csv). 
 
     Returns
     -------
-    None.
+    failed : List
+        Flight numbers whose header failed to convert.
     '''
-    test_check_data_dirs()
-    check_convert_headers_lst = check_convert_headers_to_csv()
-    for i in check_convert_headers_lst:
-        convert_single_header_to_csv(i)
-    return 
+    return export_to_csv(angman.HEADERS, jobs)
 
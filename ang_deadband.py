@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Deadband (delta) encoding of flight samples.
+
+Most channels barely change between samples: unused engine slots, warnings,
+fuel tank quantities, trim. DeadbandEncoder stores a channel value only when
+it has moved more than the channel tolerance away from the last stored value.
+An encoded sample is a (channel indices, values) pair holding just those
+channels; readers carry the last stored value of every other channel forward
+to rebuild the dense sample. A tolerance of 0 stores every change exactly.
+
+@author: ANG
+"""
+import math
+
+_UNSET = object()
+
+def tolerance_for(tolerances, name, default=0.0):
+    '''
+    Function returns the tolerance of a channel. Indexed channels such as
+    'GENERAL_ENG_RPM:2' fall back to the tolerance of 'GENERAL_ENG_RPM'.
+
+    Parameters
+    ----------
+    tolerances : Dictionary
+        Channel name -> tolerance.
+    name : String
+        Channel name.
+    default : Float
+        Tolerance of channels not in tolerances.
+
+    Returns
+    -------
+    tolerance : Float
+
+    '''
+    if name in tolerances:
+        return tolerances[name]
+    return tolerances.get(name.split(':')[0], default)
+
+class DeadbandEncoder(object):
+    '''
+    Class encodes the samples of one flight as deadband deltas.
+
+    Parameters
+    ----------
+    fields : FlightSchema or List
+        (channel name, dtype) tuples of the flight.
+    tolerances : Dictionary, optional
+        Channel name -> absolute tolerance of float channels. Other channels
+        are stored whenever they change.
+    default_tolerance : Float
+        Tolerance of float channels not in tolerances.
+    '''
+    def __init__(self, fields, tolerances=None, default_tolerance=0.0):
+        tolerances = tolerances if tolerances is not None else {}
+        self.fields = [tuple(f) for f in fields]
+        self.tolerances = [tolerance_for(tolerances, name, default_tolerance)
+                           if dtype == 'd' else None
+                           for name, dtype in self.fields]
+        self.last = [_UNSET] * len(self.fields)
+        self.samples = 0
+        self.values_stored = 0
+
+    def channel_tolerances(self):
+        '''
+        Function returns the tolerance of every float channel, as saved with
+        the flight.
+
+        Returns
+        -------
+        tolerances : Dictionary
+
+        '''
+        return {name:tol for (name, dtype), tol in zip(self.fields, self.tolerances)
+                if tol is not None}
+
+    def encode(self, row):
+        '''
+        Function encodes one sample.
+
+        Parameters
+        ----------
+        row : List
+            Sample values in field order.
+
+        Returns
+        -------
+        delta : Tuple
+            (channel indices, values) of the channels that are stored.
+
+        '''
+        indices = []
+        values = []
+        last = self.last
+        for i, (value, tol) in enumerate(zip(row, self.tolerances)):
+            prev = last[i]
+            if prev is _UNSET:
+                changed = True
+            elif tol is None:
+                changed = value != prev
+            elif value is None or prev is None:
+                changed = value is not prev
+            elif math.isnan(value) or math.isnan(prev):
+                changed = not (math.isnan(value) and math.isnan(prev))
+            else:
+                changed = abs(value - prev) > tol
+            if changed:
+                indices.append(i)
+                values.append(value)
+                last[i] = value
+        self.samples += 1
+        self.values_stored += len(indices)
+        return indices, values
+
+def apply_delta(last, delta):
+    '''
+    Function updates the last stored values with an encoded sample.
+
+    Parameters
+    ----------
+    last : List
+        Last stored value of every channel; updated in place.
+    delta : Tuple
+        (channel indices, values) from DeadbandEncoder.encode.
+
+    Returns
+    -------
+    row : List
+        Dense sample values in field order.
+
+    '''
+    indices, values = delta
+    for i, value in zip(indices, values):
+        last[i] = value
+    return list(last)
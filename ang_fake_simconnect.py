@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the SimConnect package, used to benchmark the recorder
+without Microsoft Flight Simulator. It provides SimConnect, AircraftRequests
+and AircraftEvents with the calls the recorder makes, answers every request
+after a configurable latency plus random jitter and synthesizes the SimVar 
+values of a plausible flight (taxi, takeoff, climb, cruise, descent and 
+landing) from a FlightProfile. The profile runs on a clock that can be a 
+ManualClock, so hours of flight can be replayed in seconds.
+
+Call install() before importing ANG_Flight_Recorder_v_0_5 so that
+"from SimConnect import ..." resolves to this module.
+
+@author: ANG
+"""
+import math
+import random
+import sys
+import time
+
+STRING_SIMVARS = {"ATC_FLIGHT_NUMBER":b'ANG001',
+                  "ATC_TYPE":b'Cessna',
+                  "ATC_MODEL":b'C172',
+                  "ATC_ID":b'N172AN',
+                  }
+# Values read while a flight loads: the main menu position, no aircraft yet
+LOADING_SIMVARS = {"PLANE_LATITUDE":0.000407442168686809,
+                   "PLANE_LONGITUDE":0.01397450300629543,
+                   "PLANE_ALTITUDE":3.276148519246465,
+                   "ATC_MODEL":None,
+                   "SIMULATION_RATE":0.0,
+                   }
+
+FEET_PER_NM = 6076.12
+METERS_PER_NM = 1852.0
+PSI_TO_PSF = 144.0
+FUEL_LBS_PER_GAL = 6.0
+
+def install():
+    '''
+    Function registers this module as the SimConnect package.
+
+    Returns
+    -------
+    None.
+
+    '''
+    sys.modules['SimConnect'] = sys.modules[__name__]
+    return
+
+class ManualClock(object):
+    '''
+    Clock that only moves when advanced, so a long flight can be simulated 
+    faster than real time.
+    '''
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+class FlightProfile(object):
+    '''
+    Class synthesizes a flight from taxi out to taxi in: takeoff, climb at 
+    climb_fpm, cruise, descent at descent_fpm and landing. Every channel of 
+    the recorder is derived from the phase, altitude and speed at a time.
+
+    Parameters
+    ----------
+    duration : Float
+        Seconds from the start of taxi out to the end of taxi in.
+    cruise_alt : Float
+        Cruise altitude in feet above the field; lower if the flight is too 
+        short to reach it.
+    cruise_speed : Float
+        Cruise airspeed in knots.
+    engines : Integer
+        NUMBER_OF_ENGINES; channels of the other engine slots read 0.
+    engine_type : Integer
+        ENGINE_TYPE (0 piston, 1 jet, 5 turboprop).
+    '''
+    def __init__(self, duration=3600.0, cruise_alt=8000.0, cruise_speed=120.0,
+                 engines=1, engine_type=0, field_elev=570.0, lat=43.68,
+                 lon=-79.63, heading=60.0, climb_fpm=700.0, descent_fpm=500.0,
+                 fuel_gal=53.0):
+        self.duration = float(duration)
+        self.cruise_speed = cruise_speed
+        self.engines = engines
+        self.engine_type = engine_type
+        self.field_elev = field_elev
+        self.lat0 = lat
+        self.lon0 = lon
+        self.heading = heading
+        self.climb_fps = climb_fpm / 60.0
+        self.descent_fps = descent_fpm / 60.0
+        self.fuel_gal = fuel_gal
+        self.taxi = min(300.0, self.duration * 0.05)
+        self.roll = min(30.0, self.duration * 0.02)
+        self.t_takeoff = self.taxi + self.roll
+        self.t_landing = self.duration - self.taxi - self.roll
+        airborne = max(self.t_landing - self.t_takeoff, 0.0)
+        self.cruise_alt = min(cruise_alt,
+                              airborne / (1.0/self.climb_fps + 1.0/self.descent_fps))
+        self.t_top_of_climb = self.t_takeoff + self.cruise_alt / self.climb_fps
+        self.t_top_of_descent = self.t_landing - self.cruise_alt / self.descent_fps
+        self.destination_nm = self.distance_nm(self.duration)
+
+    def phase(self, t):
+        if t < self.taxi:
+            return 'taxi'
+        if t < self.t_takeoff:
+            return 'takeoff'
+        if t < self.t_top_of_climb:
+            return 'climb'
+        if t < self.t_top_of_descent:
+            return 'cruise'
+        if t < self.t_landing:
+            return 'descent'
+        if t < self.t_landing + self.roll:
+            return 'landing'
+        return 'taxi'
+
+    def altitude(self, t):
+        if t <= self.t_takeoff or t >= self.t_landing:
+            return 0.0
+        if t < self.t_top_of_climb:
+            return (t - self.t_takeoff) * self.climb_fps
+        if t < self.t_top_of_descent:
+            return self.cruise_alt
+        return (self.t_landing - t) * self.descent_fps
+
+    def airspeed(self, t):
+        phase = self.phase(t)
+        if phase == 'taxi':
+            return 8.0
+        if phase == 'takeoff':
+            return 8.0 + 57.0 * (t - self.taxi) / self.roll
+        if phase == 'landing':
+            return 60.0 - 52.0 * (t - self.t_landing) / self.roll
+        if phase == 'climb':
+            return 75.0
+        if phase == 'descent':
+            return 0.85 * self.cruise_speed
+        return self.cruise_speed
+
+    def distance_nm(self, t):
+        '''
+        Function integrates the airspeed from the start of the flight; 1 s 
+        steps are plenty for a position track.
+        '''
+        step = 1.0
+        n = int(t // step)
+        dist = sum(self.airspeed(i * step) for i in range(n)) * step
+        dist += self.airspeed(n * step) * (t - n * step)
+        return dist / 3600.0
+
+    def throttle(self, t):
+        return {'taxi':15.0, 'takeoff':100.0, 'climb':90.0, 'cruise':70.0,
+                'descent':35.0, 'landing':5.0}[self.phase(t)]
+
+    def state(self, t, dist_nm):
+        '''
+        Function returns every synthesized SimVar at time t.
+
+        Parameters
+        ----------
+        t : Float
+            Seconds since the start of the flight.
+        dist_nm : Float
+            Distance flown in nautical miles.
+
+        Returns
+        -------
+        values : Dictionary
+            SimVar name (without engine index) -> value. Engine channels are 
+            lists with one value per engine slot.
+
+        '''
+        phase = self.phase(t)
+        agl = self.altitude(t)
+        alt = self.field_elev + agl
+        ias = self.airspeed(t)
+        tas = ias * (1.0 + 0.02 * alt / 1000.0)
+        gust = math.sin(t / 7.0) * math.sin(t / 3.1)
+        airborne = agl > 0.0
+        if phase == 'climb':
+            vs = self.climb_fps * 60.0
+        elif phase == 'descent':
+            vs = -self.descent_fps * 60.0
+        else:
+            vs = 0.0
+        if airborne:
+            vs += 40.0 * gust
+        heading = math.radians(self.heading)
+        dlat = dist_nm / 60.0 * math.cos(heading)
+        lat = self.lat0 + dlat
+        lon = self.lon0 + dist_nm / 60.0 * math.sin(heading) / max(
+            math.cos(math.radians(lat)), 0.01)
+        wind_speed = 12.0 + 3.0 * math.sin(t / 300.0)
+        wind_dir = math.radians(270.0)
+        wind_ms = wind_speed * 0.514444
+        wind_x = -wind_ms * math.sin(wind_dir)
+        wind_z = -wind_ms * math.cos(wind_dir)
+        rel = wind_dir - heading
+        throttle = self.throttle(t)
+        burned = min(self.fuel_gal * 0.9, t / 3600.0 * 9.0 * self.engines)
+        fuel = self.fuel_gal - burned
+        flaps = {'takeoff':0.1, 'landing':0.3}.get(phase, 0.0)
+        if phase == 'descent' and agl < 1000.0:
+            flaps = 0.3
+        pitch = math.atan2(vs / 60.0, max(tas * 1.68781, 1.0))
+        turbine = self.engine_type in (1, 5)
+        def per_engine(value):
+            return [value if n < self.engines else 0.0 for n in range(4)]
+        values = {"PLANE_LATITUDE":lat,
+                  "PLANE_LONGITUDE":lon,
+                  "PLANE_ALTITUDE":alt,
+                  "PLANE_ALT_ABOVE_GROUND":agl,
+                  "AMBIENT_WIND_VELOCITY":wind_speed,
+                  "AMBIENT_WIND_DIRECTION":math.degrees(wind_dir),
+                  "AMBIENT_WIND_X":wind_x,
+                  "AMBIENT_WIND_Y":0.5 * gust if airborne else 0.0,
+                  "AMBIENT_WIND_Z":wind_z,
+                  "AIRCRAFT_WIND_X":-wind_ms * math.sin(rel),
+                  "AIRCRAFT_WIND_Y":0.5 * gust if airborne else 0.0,
+                  "AIRCRAFT_WIND_Z":-wind_ms * math.cos(rel),
+                  "AMBIENT_VISIBILITY":20000.0,
+                  "AMBIENT_TEMPERATURE":15.0 - 1.98 * alt / 1000.0,
+                  "BAROMETER_PRESSURE":1013.25 * (1.0 - 6.8756e-6 * alt) ** 5.2559,
+                  "AILERON_LEFT_DEFLECTION":0.02 * gust,
+                  "AILERON_RIGHT_DEFLECTION":-0.02 * gust,
+                  "ANGLE_OF_ATTACK_INDICATOR":pitch + (0.05 if airborne else 0.0),
+                  "AIRSPEED_TRUE":tas,
+                  "GROUND_VELOCITY":max(tas - wind_speed * math.cos(rel), 0.0),
+                  "GPS_WP_TRUE_BEARING":heading,
+                  "GPS_WP_DISTANCE":max(self.destination_nm - dist_nm, 0.0) * METERS_PER_NM,
+                  "ELEVATOR_TRIM_POSITION":0.01 * (vs / 500.0),
+                  "FLAPS_HANDLE_PERCENT":flaps,
+                  "HEADING_INDICATOR":heading + 0.005 * gust,
+                  "PLANE_PITCH_DEGREES":-pitch,
+                  "PLANE_BANK_DEGREES":0.03 * gust if airborne else 0.0,
+                  "RUDDER_POSITION":2.0 * gust,
+                  "VERTICAL_SPEED":vs,
+                  "G_FORCE":1.0 + 0.08 * gust if airborne else 1.0,
+                  "FUEL_TOTAL_QUANTITY":fuel,
+                  "GENERAL_ENG_THROTTLE_LEVER_POSITION":per_engine(throttle),
+                  "PROP_THRUST":per_engine(throttle * 6.0),
+                  "GENERAL_ENG_EXHAUST_GAS_TEMPERATURE":per_engine(1100.0 + throttle * 5.0),
+                  "GENERAL_ENG_FUEL_PRESSURE":per_engine(20.0 + throttle * 0.05),
+                  "ENG_FUEL_FLOW_GPH":per_engine(1.0 + throttle * 0.1),
+                  "TURB_ENG_VIBRATION":per_engine(0.1 + throttle * 0.002 if turbine else 0.0),
+                  "GENERAL_ENG_OIL_PRESSURE":per_engine((40.0 + throttle * 0.3) * PSI_TO_PSF),
+                  "GENERAL_ENG_RPM":per_engine(700.0 + throttle * 17.0),
+                  "FUEL_TANK_RIGHT_MAIN_QUANTITY":fuel / 2.0,
+                  "FUEL_TANK_LEFT_MAIN_QUANTITY":fuel / 2.0,
+                  "FUEL_TOTAL_QUANTITY_WEIGHT":fuel * FUEL_LBS_PER_GAL,
+                  "STALL_WARNING":1.0 if airborne and ias < 50.0 else 0.0,
+                  "OVERSPEED_WARNING":1.0 if ias > 160.0 else 0.0,
+                  "SIMULATION_RATE":1.0,
+                  "TOTAL_WEIGHT":1700.0 + fuel * FUEL_LBS_PER_GAL,
+                  "ENGINE_TYPE":float(self.engine_type),
+                  "NUMBER_OF_ENGINES":float(self.engines),
+                  "GPS_WP_NEXT_LAT":self.lat0 + self.destination_nm / 60.0 * math.cos(heading),
+                  "GPS_WP_NEXT_LON":self.lon0 + self.destination_nm / 60.0 * math.sin(heading)
+                                    / max(math.cos(math.radians(lat)), 0.01),
+                  "GPS_WP_NEXT_ALT":self.field_elev * 0.3048,
+                  }
+        return values
+
+class _Id(object):
+    def __init__(self, value):
+        self.value = value
+
+class _FakeDll(object):
+    '''
+    The SimConnect.dll calls used by batched requests.
+    '''
+    def __init__(self, sm):
+        self.sm = sm
+        self.definitions = {}
+
+    def AddToDataDefinition(self, hSimConnect, definition_id, name, units,
+                            datatype, epsilon, datum_id):
+        self.definitions.setdefault(definition_id, []).append(name.decode())
+        return 0
+
+    def RequestDataOnSimObjectType(self, hSimConnect, request_id,
+                                   definition_id, radius, simobject_type):
+        self.sm.round_trip()
+        values = [self.sm.value(name) for name in self.definitions[definition_id]]
+        self.sm.batch_requests[request_id].receive(values)
+        return 0
+
+class SimConnect(object):
+    '''
+    Fake SimConnect link.
+
+    Parameters
+    ----------
+    latency : Float
+        Seconds every request round-trip takes.
+    jitter : Float
+        Up to this many seconds are randomly added to each round-trip.
+    profile : FlightProfile, optional
+        Flight the SimVar values are taken from; defaults to a 1 h flight.
+    clock : Callable, optional
+        Clock in seconds driving the flight profile, i.e. a ManualClock; 
+        defaults to time.monotonic.
+    seed : Integer
+        Seed of the jitter.
+    load_time : Float
+        Seconds after connecting that the flight is still loading; see 
+        LOADING_SIMVARS.
+    '''
+    def __init__(self, auto_connect=True, library_path=None, latency=0.002,
+                 jitter=0.0, profile=None, clock=None, seed=0, load_time=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.profile = profile if profile is not None else FlightProfile()
+        self.clock = clock if clock is not None else time.monotonic
+        self.random = random.Random(seed)
+        self.load_time = load_time
+        self.hSimConnect = 0
+        self.dll = _FakeDll(self)
+        self.batch_requests = {}
+        self.round_trips = 0
+        self.start_time = self.clock()
+        self._next_def_id = 0
+        self._next_request_id = 0
+        self._state_time = None
+        self._state = None
+        self._dist_time = 0.0
+        self._dist_nm = 0.0
+
+    def new_def_id(self):
+        self._next_def_id += 1
+        return _Id(self._next_def_id)
+
+    def new_request_id(self):
+        self._next_request_id += 1
+        return _Id(self._next_request_id)
+
+    def round_trip(self):
+        self.round_trips += 1
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.random.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return
+
+    def sim_time(self):
+        return self.clock() - self.start_time
+
+    def flight_state(self):
+        '''
+        Function returns the flight profile values at the current sim time. 
+        The values are computed once per time step and shared by all requests 
+        of that step.
+        '''
+        t = self.sim_time()
+        if t != self._state_time:
+            if t >= self._dist_time:
+                self._dist_nm += self.profile.airspeed(self._dist_time) * (t - self._dist_time) / 3600.0
+            else:
+                self._dist_nm = self.profile.distance_nm(t)
+            self._dist_time = t
+            self._state = self.profile.state(t, self._dist_nm)
+            self._state_time = t
+        return self._state
+
+    def value(self, key):
+        '''
+        Function returns the synthesized value of a SimVar, i.e. 
+        "PLANE_ALTITUDE" or "GENERAL ENG RPM:2".
+        '''
+        key = key.replace(' ', '_')
+        if key in LOADING_SIMVARS and self.sim_time() < self.load_time:
+            return LOADING_SIMVARS[key]
+        if key in STRING_SIMVARS:
+            return STRING_SIMVARS[key]
+        name, _, index = key.partition(':')
+        values = self.flight_state()
+        if name not in values:
+            return 100.0 * math.sin(self.sim_time() / 60.0 + len(key))
+        value = values[name]
+        if isinstance(value, list):
+            value = value[int(index) - 1] if index else value[0]
+        return value
+
+    def exit(self):
+        return
+
+class _FakeRequest(object):
+    def __init__(self, key):
+        units = b'String' if key in STRING_SIMVARS else b'Number'
+        self.definitions = [(key.replace('_', ' ').encode(), units)]
+
+class AircraftRequests(object):
+    '''
+    Fake AircraftRequests; every get is one round-trip.
+    '''
+    def __init__(self, _sm, _time=10, _attemps=10):
+        self.sm = _sm
+        self.time = _time
+        self.list = []
+
+    def find(self, key):
+        return _FakeRequest(key)
+
+    def get(self, key):
+        self.sm.round_trip()
+        return self.sm.value(key)
+
+    def set(self, key, value):
+        self.sm.round_trip()
+        return True
+
+class AircraftEvents(object):
+    '''
+    Fake AircraftEvents; every event is a no-op round-trip.
+    '''
+    def __init__(self, _sm):
+        self.sm = _sm
+
+    def find(self, key):
+        return lambda *args: self.sm.round_trip()
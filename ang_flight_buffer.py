@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar in-memory flight buffer used by the flight recorder.
+
+Numeric channels are held in typed array('d') columns (8 bytes per value)
+instead of lists of boxed floats. The buffer is a dictionary keyed by channel
+name so existing code that indexes, appends to or builds a DataFrame from a
+flight data dictionary keeps working.
+
+@author: ANG
+"""
+from array import array
+
+OBJECT = 'object'
+MISSING = float('nan')
+
+class TypedColumn(array):
+    '''
+    Base of the typed columns. Subclasses take only the values, so pickling
+    rebuilds them from a list of values; array's own reduce passes the
+    typecode too, which only protocols 3+ rebuild without calling __new__.
+    '''
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+    def __reduce_ex__(self, protocol):
+        if protocol < 3:
+            return self.__reduce__()
+        return super(TypedColumn, self).__reduce_ex__(protocol)
+
+class FloatColumn(TypedColumn):
+    '''
+    Typed float64 column. Values SimConnect could not read (None) are stored
+    as NaN. Growth is handled by array, which over-allocates geometrically.
+    '''
+    def __new__(cls, values=()):
+        return super(FloatColumn, cls).__new__(cls, 'd', values)
+
+    def append(self, value):
+        if value is None:
+            value = MISSING
+        super(FloatColumn, self).append(value)
+
+class IntColumn(TypedColumn):
+    '''
+    Typed int64 column.
+    '''
+    def __new__(cls, values=()):
+        return super(IntColumn, cls).__new__(cls, 'q', values)
+
+COLUMN_TYPES = {'d':FloatColumn,
+                'q':IntColumn,
+                OBJECT:list,
+                }
+
+class FlightSchema(object):
+    '''
+    Class describes the channels of a flight and the dtype of each channel.
+
+    Parameters
+    ----------
+    fields : List
+        List of (channel name, dtype) tuples. dtype is 'd' (float64),
+        'q' (int64) or 'object'.
+    omitted : Dictionary, optional
+        Channels left out of the flight -> reason, i.e. engine slots the
+        aircraft does not have.
+    '''
+    def __init__(self, fields, omitted=None):
+        self.fields = [(str(name), dtype) for name, dtype in fields]
+        self.names = [name for name, dtype in self.fields]
+        self.dtypes = dict(self.fields)
+        self.omitted = dict(omitted) if omitted else {}
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, name):
+        return name in self.dtypes
+
+    def dtype(self, name):
+        return self.dtypes[name]
+
+    def new_column(self, name, values=()):
+        '''
+        Function creates an empty (or pre-filled) column for a channel.
+
+        Parameters
+        ----------
+        name : String
+            Channel name.
+        values : Iterable
+            Values to fill the column with.
+
+        Returns
+        -------
+        column : FloatColumn, IntColumn or List
+            Column matching the channel dtype.
+
+        '''
+        column = COLUMN_TYPES[self.dtypes[name]]()
+        for v in values:
+            column.append(v)
+        return column
+
+    def to_payload(self):
+        '''
+        Function returns the schema as stored in a flight log: the list of
+        fields, or a dictionary of fields and omitted channels.
+        '''
+        if not self.omitted:
+            return list(self.fields)
+        return {"fields":list(self.fields), "omitted":dict(self.omitted)}
+
+    @classmethod
+    def from_fields(cls, fields):
+        '''
+        Function builds a schema from stored fields (see to_payload). Plain
+        channel names (no dtype) are read as 'object' channels.
+
+        Returns
+        -------
+        schema : FlightSchema
+
+        '''
+        omitted = None
+        if isinstance(fields, dict):
+            omitted = fields.get("omitted")
+            fields = fields["fields"]
+        schema = cls([(f, OBJECT) if isinstance(f, str) else tuple(f)
+                      for f in fields], omitted)
+        return schema
+
+class FlightBuffer(dict):
+    '''
+    Columnar flight data buffer. Behaves like the flight data dictionary
+    (channel name -> column) and adds row helpers for the flight log.
+
+    Parameters
+    ----------
+    schema : FlightSchema
+        Channels and dtypes of the flight.
+
+    The timezones list holds one (start time ns, UTC offset seconds, zone
+    name) tuple per timezone segment of the flight, and the phases list one
+    (sample index, time ns, phase) tuple per flight phase transition.
+    '''
+    def __init__(self, schema):
+        super(FlightBuffer, self).__init__(
+            (name, schema.new_column(name)) for name in schema.names)
+        self.schema = schema
+        self.timezones = []
+        self.timezones_saved = 0
+        self.phases = []
+        self.phases_saved = 0
+
+    @property
+    def num_samples(self):
+        '''
+        Number of complete samples (shortest column length).
+        '''
+        if len(self) == 0:
+            return 0
+        return min(len(c) for c in self.values())
+
+    def append_row(self, row):
+        '''
+        Function appends a sample given as values in schema order.
+
+        Parameters
+        ----------
+        row : List
+            Sample values in schema order.
+
+        Returns
+        -------
+        None.
+
+        '''
+        for name, value in zip(self.schema.names, row):
+            self[name].append(value)
+        return
+
+    def append_sample(self, sample):
+        '''
+        Function appends a sample given as a dictionary keyed by channel name. 
+        Channels missing from the sample are stored as missing values.
+
+        Parameters
+        ----------
+        sample : Dictionary
+            Channel name -> value.
+
+        Returns
+        -------
+        None.
+
+        '''
+        for name in self.schema.names:
+            self[name].append(sample.get(name))
+        return
+
+    def row(self, i):
+        '''
+        Function returns sample i as a list of values in schema order.
+
+        Parameters
+        ----------
+        i : Integer
+            Sample index; negative values count from the end.
+
+        Returns
+        -------
+        row : List
+
+        '''
+        row = [self[name][i] for name in self.schema.names]
+        return row
+
+    def nbytes(self):
+        '''
+        Function returns the approximate memory used by the column data.
+
+        Returns
+        -------
+        nbytes : Integer
+
+        '''
+        nbytes = 0
+        for column in self.values():
+            if isinstance(column, array):
+                nbytes += column.itemsize * len(column)
+            else:
+                nbytes += 8 * len(column)
+        return nbytes
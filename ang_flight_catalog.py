@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite catalog of the recorded flights.
+
+Listing the flights used to walk the whole ./data tree, and finding flights
+by aircraft or date meant unpickling every header. The catalog
+./data/catalog.sqlite keeps one row per flight with:
+
+- the header fields (LOCAL_TIME, ATC_MODEL, ...) and the whole header as
+  typed JSON;
+- the recording status, sample count, first and last TIME_NS and duration;
+- the sizes of the flight logs, column stores, pickles and header;
+- whether the flight and its header were converted to CSV.
+
+The recorder adds the row when it saves the flight header and fills in the
+rest when the flight ends. rebuild() recreates the catalog from ./data, i.e.
+for flights recorded before it existed:
+
+    python ang_flight_catalog.py rebuild
+    python ang_flight_catalog.py list --model C172 --since 2024-09-01
+
+Every call opens its own connection, so the recorder thread and the GUI can
+both use the catalog.
+
+@author: ANG
+"""
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import time
+import ang_flight_buffer as angfb
+import ang_flight_columns as angcols
+import ang_flight_log as angfl
+
+CATALOG_PATH = './data/catalog.sqlite'
+DATA_DIR = './data'
+CSV_FLIGHT_DIR = './data_csv/flight_data'
+CSV_HEADER_DIR = './data_csv/flight_headers'
+
+RECORDING = 'recording'
+RECORDED = 'recorded'
+
+# Header fields with their own column, for filtering
+HEADER_COLUMNS = [("LOCAL_TIME", "TEXT"),
+                  ("ATC_FLIGHT_NUMBER", "TEXT"),
+                  ("ATC_TYPE", "TEXT"),
+                  ("ATC_MODEL", "TEXT"),
+                  ("TOTAL_WEIGHT", "REAL"),
+                  ("ENGINE_TYPE", "INTEGER"),
+                  ("NUMBER_OF_ENGINES", "INTEGER"),
+                  ("PLANE_LATITUDE", "REAL"),
+                  ("PLANE_LONGITUDE", "REAL"),
+                  ("PLANE_ALTITUDE", "REAL"),
+                  ("DESTINATION_LAT", "REAL"),
+                  ("DESTINATION_LON", "REAL"),
+                  ("FUEL_TOTAL_QUANTITY", "REAL"),
+                  ]
+STAT_COLUMNS = [("status", "TEXT"),
+                ("data_file", "TEXT"),
+                ("header_file", "TEXT"),
+                ("num_samples", "INTEGER"),
+                ("start_ns", "INTEGER"),
+                ("end_ns", "INTEGER"),
+                ("duration_s", "REAL"),
+                ("log_bytes", "INTEGER"),
+                ("columns_bytes", "INTEGER"),
+                ("pickle_bytes", "INTEGER"),
+                ("header_bytes", "INTEGER"),
+                ("csv_converted", "INTEGER"),
+                ("header_csv_converted", "INTEGER"),
+                ("updated_ns", "INTEGER"),
+                ]
+CATALOG_SCHEMA = ('CREATE TABLE IF NOT EXISTS flights ('
+                  'number INTEGER PRIMARY KEY, flight_num TEXT UNIQUE, ' +
+                  ', '.join(f'{name} {kind}' for name, kind in HEADER_COLUMNS + STAT_COLUMNS) +
+                  ', header_json TEXT);'
+                  'CREATE INDEX IF NOT EXISTS flights_model ON flights (ATC_MODEL);'
+                  'CREATE INDEX IF NOT EXISTS flights_time ON flights (LOCAL_TIME);')
+
+def _sql_value(value):
+    if isinstance(value, bytes):
+        return value.decode('latin1')
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def _dir_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+def flight_files(flight_num):
+    '''
+    Function finds the data and header files of a flight by name.
+
+    Returns
+    -------
+    data_file : String or None
+        Column store, flight log or pickle i.e. 'f1.cols'.
+    header_file : String or None
+        Header pickle i.e. 'f1_Flight_Header.pkl'.
+
+    '''
+    flight_dir = f'{DATA_DIR}/{flight_num}'
+    data_file = None
+    for name in (f'{flight_num}.cols', f'{flight_num}.log', f'{flight_num}.pkl'):
+        if os.path.exists(f'{flight_dir}/{name}'):
+            data_file = name
+            break
+    header_file = f'{flight_num}_Flight_Header.pkl'
+    if not os.path.exists(f'{flight_dir}/{header_file}'):
+        header_file = None
+    return data_file, header_file
+
+def _column_time_range(dir_path):
+    '''
+    Function reads the sample count and the first and last TIME_NS of a
+    column store without reading the column.
+    '''
+    schema = angcols.read_schema(dir_path)
+    num_samples = schema["num_samples"]
+    files = {f["name"]:f["file"] for f in schema["fields"]}
+    if num_samples == 0 or 'TIME_NS' not in files:
+        return num_samples, None, None
+    with open(os.path.join(dir_path, files['TIME_NS']), 'rb') as fp:
+        typecode, length, offset = angcols.read_npy_header(fp)
+        times = angfb.IntColumn()
+        times.fromfile(fp, 1)
+        fp.seek(offset + times.itemsize * (length - 1))
+        times.fromfile(fp, 1)
+    return num_samples, times[0], times[-1]
+
+def flight_stats(flight_num):
+    '''
+    Function works out the catalog statistics of a flight from its files.
+
+    Returns
+    -------
+    stats : Dictionary
+        STAT_COLUMNS values except status and updated_ns.
+
+    '''
+    flight_dir = f'{DATA_DIR}/{flight_num}'
+    data_file, header_file = flight_files(flight_num)
+    stats = {"data_file":data_file, "header_file":header_file,
+             "num_samples":0, "start_ns":None, "end_ns":None, "duration_s":None,
+             "log_bytes":0, "columns_bytes":0, "pickle_bytes":0, "header_bytes":0}
+    for name in os.listdir(flight_dir) if os.path.isdir(flight_dir) else []:
+        path = os.path.join(flight_dir, name)
+        if name.endswith('.cols'):
+            stats["columns_bytes"] += _dir_size(path)
+        elif name.endswith('.log') or name == 'bursts':
+            stats["log_bytes"] += _dir_size(path) if name == 'bursts' else os.path.getsize(path)
+        elif name.startswith(f'{flight_num}_Flight_Header'):
+            stats["header_bytes"] += os.path.getsize(path)
+        elif name.endswith('.pkl'):
+            stats["pickle_bytes"] += os.path.getsize(path)
+    if angcols.columns_exist(flight_num):
+        num_samples, start_ns, end_ns = _column_time_range(angcols.columns_path(flight_num))
+    elif angfl.flight_log_exists(flight_num):
+        flight_dict = angfl.load_flight_log(angfl.flight_log_path(flight_num))
+        num_samples = flight_dict.num_samples
+        times = flight_dict.get('TIME_NS')
+        start_ns, end_ns = (times[0], times[-1]) if times else (None, None)
+    elif data_file is not None:
+        with open(f'{flight_dir}/{data_file}', 'rb') as fp:
+            flight_dict = pickle.load(fp)
+        num_samples = min((len(v) for v in flight_dict.values()), default=0)
+        start_ns, end_ns = None, None
+    else:
+        num_samples, start_ns, end_ns = 0, None, None
+    stats["num_samples"] = num_samples
+    stats["start_ns"], stats["end_ns"] = start_ns, end_ns
+    if start_ns is not None:
+        stats["duration_s"] = (end_ns - start_ns) / 1e9
+    return stats
+
+def load_flight_header(flight_num):
+    '''
+    Function loads a flight header, from its typed JSON or its pickle.
+
+    Returns
+    -------
+    header : Dictionary or None
+
+    '''
+    if os.path.exists(angcols.header_path(flight_num)):
+        return angcols.load_header(flight_num)
+    header_path = f'{DATA_DIR}/{flight_num}/{flight_num}_Flight_Header.pkl'
+    if os.path.exists(header_path):
+        with open(header_path, 'rb') as fp:
+            return pickle.load(fp)
+    return None
+
+class FlightCatalog(object):
+    '''
+    Class reads and updates the flight catalog.
+
+    Parameters
+    ----------
+    path : String
+        Catalog database file.
+    '''
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+
+    def connect(self):
+        '''
+        Function opens the catalog, creating it if needed.
+
+        Returns
+        -------
+        connection : sqlite3.Connection
+
+        '''
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.row_factory = sqlite3.Row
+        connection.executescript(CATALOG_SCHEMA)
+        return connection
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _upsert(self, connection, flight_num, values):
+        values = dict(values, updated_ns=time.time_ns())
+        updates = ', '.join(f'{name}=?' for name in values)
+        params = [_sql_value(v) for v in values.values()]
+        # INSERT ... ON CONFLICT DO UPDATE needs SQLite 3.24; insert the row
+        # if it is missing, then update it, which works on any version
+        connection.execute(
+            'INSERT OR IGNORE INTO flights (flight_num, number) VALUES (?, ?)',
+            [flight_num, int(flight_num[1:])])
+        connection.execute(f'UPDATE flights SET {updates} WHERE flight_num=?',
+                           params + [flight_num])
+        return
+
+    def _header_values(self, header):
+        values = {name:header.get(name) for name, kind in HEADER_COLUMNS}
+        values["header_json"] = json.dumps({k:angcols.encode_value(v)
+                                            for k, v in header.items()})
+        return values
+
+    def add_flight(self, flight_num, header):
+        '''
+        Function adds a flight being recorded, with its header.
+
+        Returns
+        -------
+        None.
+
+        '''
+        values = self._header_values(header)
+        values["status"] = RECORDING
+        with self.connect() as connection:
+            self._upsert(connection, flight_num, values)
+        connection.close()
+        return
+
+    def finish_flight(self, flight_num):
+        '''
+        Function records the sample count, duration and file sizes of a
+        flight that ended.
+
+        Returns
+        -------
+        None.
+
+        '''
+        values = flight_stats(flight_num)
+        values["status"] = RECORDED
+        with self.connect() as connection:
+            self._upsert(connection, flight_num, values)
+        connection.close()
+        return
+
+    def set_converted(self, flight_num, csv=None, header_csv=None):
+        '''
+        Function records the CSV conversion of a flight and/or its header.
+
+        Returns
+        -------
+        None.
+
+        '''
+        values = {}
+        if csv is not None:
+            values["csv_converted"] = int(csv)
+        if header_csv is not None:
+            values["header_csv_converted"] = int(header_csv)
+        with self.connect() as connection:
+            self._upsert(connection, flight_num, values)
+        connection.close()
+        return
+
+    def get(self, flight_num):
+        '''
+        Function returns the catalog row of a flight, None if it is not 
+        catalogued.
+        '''
+        connection = self.connect()
+        try:
+            row = connection.execute('SELECT * FROM flights WHERE flight_num = ?',
+                                     (flight_num,)).fetchone()
+        finally:
+            connection.close()
+        return None if row is None else dict(row)
+
+    def remove_flight(self, flight_num):
+        '''
+        Function removes a flight from the catalog.
+        '''
+        with self.connect() as connection:
+            connection.execute('DELETE FROM flights WHERE flight_num = ?', (flight_num,))
+        connection.close()
+        return
+
+    def rebuild(self):
+        '''
+        Function recreates the catalog from the flight directories in ./data.
+
+        Returns
+        -------
+        count : Integer
+            Number of flights catalogued.
+
+        '''
+        flight_nums = []
+        if os.path.isdir(DATA_DIR):
+            flight_nums = [d for d in os.listdir(DATA_DIR)
+                           if d[:1] == 'f' and d[1:].isdigit() and
+                           os.path.isdir(f'{DATA_DIR}/{d}')]
+        with self.connect() as connection:
+            connection.execute('DELETE FROM flights')
+            for flight_num in flight_nums:
+                values = flight_stats(flight_num)
+                header = load_flight_header(flight_num)
+                if header is not None:
+                    values.update(self._header_values(header))
+                values["status"] = RECORDED
+                values["csv_converted"] = int(os.path.exists(
+                    f'{CSV_FLIGHT_DIR}/{flight_num}.csv'))
+                values["header_csv_converted"] = int(os.path.exists(
+                    f'{CSV_HEADER_DIR}/{flight_num}_Flight_Header.csv'))
+                self._upsert(connection, flight_num, values)
+        connection.close()
+        return len(flight_nums)
+
+    def find(self, model=None, atc_type=None, since=None, until=None,
+             status=None, converted=None, columns=None):
+        '''
+        Function lists catalogued flights in flight number order.
+
+        Parameters
+        ----------
+        model : String, optional
+            ATC_MODEL i.e. 'A320'.
+        atc_type : String, optional
+            ATC_TYPE.
+        since : String, optional
+            First LOCAL_TIME, ISO format i.e. '2024-09-01'.
+        until : String, optional
+            LOCAL_TIME to stop before, ISO format.
+        status : String, optional
+            RECORDING or RECORDED.
+        converted : Bool, optional
+            Only flights (not) converted to CSV.
+        columns : List, optional
+            Catalog columns to return; defaults to all. Listing only the 
+            columns needed is much faster for large archives.
+
+        Returns
+        -------
+        flights : List
+            Dictionary per flight.
+
+        '''
+        where, params = [], []
+        for clause, value in (('ATC_MODEL = ?', model), ('ATC_TYPE = ?', atc_type),
+                              ('LOCAL_TIME >= ?', since), ('LOCAL_TIME < ?', until),
+                              ('status = ?', status)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        if converted is not None:
+            where.append('COALESCE(csv_converted, 0) = ?')
+            params.append(int(converted))
+        sql = f'SELECT {"*" if columns is None else ", ".join(columns)} FROM flights'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY number'
+        connection = self.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(sql, params).fetchall()
+            names = [d[0] for d in cursor.description]
+        finally:
+            connection.close()
+        flights = [dict(zip(names, row)) for row in rows]
+        return flights
+
+def main():
+    parser = argparse.ArgumentParser(description='ANG flight catalog')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help='recreate the catalog from ./data')
+    listing = commands.add_parser('list', help='list catalogued flights')
+    listing.add_argument('--model', help='ATC_MODEL i.e. A320')
+    listing.add_argument('--since', help='first local time, i.e. 2024-09-01')
+    listing.add_argument('--until', help='local time to stop before')
+    args = parser.parse_args()
+    catalog = FlightCatalog()
+    if args.command == 'rebuild':
+        start = time.perf_counter()
+        count = catalog.rebuild()
+        print(f'Catalogued {count} flights in {time.perf_counter() - start:.2f} s.')
+        return
+    for flight in catalog.find(args.model, since=args.since, until=args.until, 
+                               columns=['flight_num', 'LOCAL_TIME', 'ATC_MODEL', 
+                                        'num_samples', 'duration_s', 'status']):
+        duration = flight["duration_s"]
+        duration = '' if duration is None else f'{duration / 60:.0f} min'
+        print(f'{flight["flight_num"]:<8} {flight["LOCAL_TIME"] or "":<28} '
+              f'{flight["ATC_MODEL"] or "":<12} {flight["num_samples"] or 0:>9} '
+              f'{duration:>9} {flight["status"]}')
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar binary flight store.
+
+The flight log (see ang_flight_log) is made for appending samples safely
+while recording; reading it back means unpickling every frame. When a flight
+ends the recorder also writes it as a column store, a directory
+./data/f#/f#.cols (./data/f#/f#.<group>.cols for channel groups) with:
+
+- schema.json: format, sample count, the channels in order with their dtype,
+  file and DATA_KEY.txt description, omitted channels, timezone segments and
+  flight phase transitions;
+- one file per channel: c0000.npy, c0001.npy, ... in NumPy .npy format
+  (float64 or int64 little endian), or c0000.pkl for 'object' channels.
+  Files are named by channel index since channel names contain ':'.
+
+A column is a raw array, so loading it is a single read with no unpickling,
+and readers only open the columns they ask for. The .npy files are written
+without NumPy, so the recorder does not depend on it; NumPy can load or
+memory-map them directly.
+
+The flight header is saved the same way as typed JSON next to its pickle,
+./data/f#/f#_Flight_Header.json.
+
+@author: ANG
+"""
+import ast
+import datetime
+import functools
+import json
+import os
+import pickle
+import shutil
+import struct
+import sys
+from array import array
+import ang_flight_buffer as angfb
+import ang_flight_log as angfl
+
+COLUMNS_FORMAT = 'ANGCOLS1'
+SCHEMA_FILE = 'schema.json'
+NPY_MAGIC = b'\x93NUMPY'
+NPY_DESCR = {'d':'<f8', 'q':'<i8'}
+NPY_TYPECODES = {descr:typecode for typecode, descr in NPY_DESCR.items()}
+# .npy headers are padded so the data starts on a 64 byte boundary
+NPY_ALIGN = 64
+DATA_KEY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DATA_KEY.txt')
+
+def columns_path(flight_num, group=None):
+    '''
+    Function returns the column store of a flight i.e. ./data/f1/f1.cols or
+    ./data/f1/f1.attitude.cols.
+    '''
+    if group is None:
+        return f'./data/{flight_num}/{flight_num}.cols'
+    return f'./data/{flight_num}/{flight_num}.{group}.cols'
+
+def columns_exist(flight_num, group=None):
+    '''
+    Function checks if a flight has a complete column store.
+
+    Returns
+    -------
+    exists : Bool
+
+    '''
+    return os.path.exists(os.path.join(columns_path(flight_num, group), SCHEMA_FILE))
+
+def header_path(flight_num):
+    '''
+    Function returns the typed header file of a flight i.e.
+    ./data/f1/f1_Flight_Header.json.
+    '''
+    return f'./data/{flight_num}/{flight_num}_Flight_Header.json'
+
+@functools.lru_cache(maxsize=1)
+def read_data_key(data_key_path=DATA_KEY_PATH):
+    '''
+    Function reads the channel descriptions of the flight data section of
+    DATA_KEY.txt. Engine channels listed as "NAME:1-4" are expanded to
+    NAME:1 ... NAME:4.
+
+    Returns
+    -------
+    data_key : Dictionary
+        Channel name -> (type, description); empty without DATA_KEY.txt.
+
+    '''
+    data_key = {}
+    try:
+        with open(data_key_path, encoding='utf-8', errors='replace') as fp:
+            lines = fp.read().splitlines()
+    except OSError:
+        return data_key
+    in_flight_data = False
+    for line in lines:
+        if line.startswith('----'):
+            in_flight_data = 'FLIGHT DATA' in line
+            continue
+        name, sep, rest = line.partition(': ')
+        if not in_flight_data or not sep:
+            continue
+        kind, _, description = rest.partition(' - ')
+        names = [name]
+        base, _, indices = name.partition(':')
+        first, dash, last = indices.partition('-')
+        if dash and first.isdigit() and last.isdigit():
+            names = [f'{base}:{i}' for i in range(int(first), int(last) + 1)]
+        for name in names:
+            data_key[name] = (kind.strip(), description.strip())
+    return data_key
+
+def infer_schema(flight_data):
+    '''
+    Function builds a schema for flight data without one, i.e. the flight
+    data dictionaries of older .pkl flights. Channels of numbers and None
+    are float64, everything else 'object'.
+
+    Returns
+    -------
+    schema : FlightSchema
+
+    '''
+    if isinstance(flight_data, angfb.FlightBuffer):
+        return flight_data.schema
+    fields = []
+    for name, column in flight_data.items():
+        numeric = all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+                      for v in column)
+        fields.append((name, 'd' if numeric else angfb.OBJECT))
+    return angfb.FlightSchema(fields)
+
+def _npy_header(descr, length):
+    header = repr({'descr':descr, 'fortran_order':False, 'shape':(length,)})
+    size = len(NPY_MAGIC) + 2 + 2 + len(header) + 1
+    header += ' ' * (-size % NPY_ALIGN) + '\n'
+    return NPY_MAGIC + b'\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+def write_npy(file_path, column, dtype):
+    '''
+    Function writes a float64 or int64 column as a version 1.0 .npy file.
+
+    Parameters
+    ----------
+    file_path : String
+    column : Iterable
+        Column values; None is stored as NaN in float64 columns.
+    dtype : String
+        'd' (float64) or 'q' (int64).
+
+    Returns
+    -------
+    nbytes : Integer
+        Size of the file.
+
+    '''
+    if not isinstance(column, array) or column.typecode != dtype:
+        values = column
+        column = angfb.COLUMN_TYPES[dtype]()
+        for v in values:
+            # FloatColumn.append stores None as NaN
+            column.append(v)
+    if sys.byteorder == 'big':
+        column = array(dtype, column)
+        column.byteswap()
+    header = _npy_header(NPY_DESCR[dtype], len(column))
+    with open(file_path, 'wb') as fp:
+        fp.write(header)
+        column.tofile(fp)
+    return len(header) + column.itemsize * len(column)
+
+def read_npy_header(fp):
+    '''
+    Function reads the header of a .npy file written by write_npy.
+
+    Returns
+    -------
+    typecode : String
+        'd' or 'q'.
+    length : Integer
+        Number of values.
+    offset : Integer
+        Byte offset of the data.
+
+    '''
+    if fp.read(len(NPY_MAGIC)) != NPY_MAGIC:
+        raise ValueError(f'{fp.name} is not a .npy file.')
+    major = fp.read(2)[0]
+    if major == 1:
+        (header_len,) = struct.unpack('<H', fp.read(2))
+    else:
+        (header_len,) = struct.unpack('<I', fp.read(4))
+    header = ast.literal_eval(fp.read(header_len).decode('latin1'))
+    if header['descr'] not in NPY_TYPECODES or header['fortran_order']:
+        raise ValueError(f'{fp.name} holds unsupported {header["descr"]} data.')
+    return NPY_TYPECODES[header['descr']], header['shape'][0], fp.tell()
+
+def read_npy(file_path):
+    '''
+    Function reads a column written by write_npy into a typed column.
+
+    Returns
+    -------
+    column : FloatColumn or IntColumn
+
+    '''
+    with open(file_path, 'rb') as fp:
+        typecode, length, offset = read_npy_header(fp)
+        column = angfb.COLUMN_TYPES[typecode]()
+        column.fromfile(fp, length)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+def column_file(index, dtype):
+    '''
+    Function returns the file name of channel index i.e. c0003.npy.
+    '''
+    return f'c{index:04d}.pkl' if dtype == angfb.OBJECT else f'c{index:04d}.npy'
+
+def write_columns(dir_path, flight_data, schema=None):
+    '''
+    Function writes flight data as a column store. The store is built in a
+    temporary directory and renamed into place, so readers never see half
+    of it.
+
+    Parameters
+    ----------
+    dir_path : String
+        Column store directory i.e. ./data/f1/f1.cols.
+    flight_data : FlightBuffer or Dictionary
+        Flight data; timezones and phases of a FlightBuffer are kept.
+    schema : FlightSchema, optional
+        Channels and dtypes; defaults to the schema of the buffer, or one
+        inferred from the values.
+
+    Returns
+    -------
+    nbytes : Integer
+        Size of the store in bytes.
+
+    '''
+    schema = infer_schema(flight_data) if schema is None else schema
+    data_key = read_data_key()
+    num_samples = min((len(flight_data[name]) for name in schema.names), default=0)
+    tmp_path = dir_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    nbytes = 0
+    fields = []
+    for index, (name, dtype) in enumerate(schema.fields):
+        file_name = column_file(index, dtype)
+        column = flight_data[name][:num_samples]
+        if dtype == angfb.OBJECT:
+            data = pickle.dumps(list(column), protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp_path, file_name), 'wb') as fp:
+                fp.write(data)
+            nbytes += len(data)
+        else:
+            nbytes += write_npy(os.path.join(tmp_path, file_name), column, dtype)
+        kind, description = data_key.get(name, (None, None))
+        fields.append({"name":name, "dtype":dtype, "file":file_name,
+                       "type":kind, "description":description})
+    payload = {"format":COLUMNS_FORMAT,
+               "num_samples":num_samples,
+               "fields":fields,
+               "omitted":dict(schema.omitted),
+               "timezones":[list(t) for t in getattr(flight_data, 'timezones', [])],
+               "phases":[list(p) for p in getattr(flight_data, 'phases', [])],
+               }
+    data = json.dumps(payload, indent=1).encode()
+    # schema.json last: a store without it is incomplete
+    angfl.write_file_atomic(os.path.join(tmp_path, SCHEMA_FILE), data)
+    nbytes += len(data)
+    shutil.rmtree(dir_path, ignore_errors=True)
+    os.replace(tmp_path, dir_path)
+    return nbytes
+
+def read_schema(dir_path):
+    '''
+    Function reads the schema.json of a column store.
+
+    Returns
+    -------
+    schema : Dictionary
+        See write_columns.
+
+    '''
+    with open(os.path.join(dir_path, SCHEMA_FILE), 'rb') as fp:
+        schema = json.loads(fp.read())
+    if schema.get("format") != COLUMNS_FORMAT:
+        raise ValueError(f'{dir_path} is not a flight column store.')
+    return schema
+
+def select_fields(schema, columns=None):
+    '''
+    Function returns the schema fields of the given channels, in schema
+    order.
+
+    Raises
+    ------
+    KeyError
+        For channels the store does not have.
+
+    '''
+    if columns is None:
+        return schema["fields"]
+    wanted = set(columns)
+    fields = [f for f in schema["fields"] if f["name"] in wanted]
+    missing = wanted - {f["name"] for f in fields}
+    if missing:
+        raise KeyError(f'Channels not in flight: {sorted(missing)}')
+    return fields
+
+def load_columns(dir_path, columns=None, read=read_npy):
+    '''
+    Function loads a column store into a flight buffer; only the requested
+    channels are read.
+
+    Parameters
+    ----------
+    dir_path : String
+        Column store directory.
+    columns : List, optional
+        Channel names to load; defaults to all.
+    read : Callable
+        Reads a .npy file; defaults to read_npy (typed columns), i.e. 
+        numpy.load for NumPy arrays.
+
+    Returns
+    -------
+    flight_dict : FlightBuffer
+        Flight data with timezones and phases.
+
+    '''
+    schema = read_schema(dir_path)
+    fields = select_fields(schema, columns)
+    flight_dict = angfb.FlightBuffer(angfb.FlightSchema(
+        [(f["name"], f["dtype"]) for f in fields], schema["omitted"]))
+    for field in fields:
+        file_path = os.path.join(dir_path, field["file"])
+        if field["dtype"] == angfb.OBJECT:
+            with open(file_path, 'rb') as fp:
+                flight_dict[field["name"]] = pickle.load(fp)
+        else:
+            flight_dict[field["name"]] = read(file_path)
+    flight_dict.timezones = [tuple(t) for t in schema["timezones"]]
+    flight_dict.timezones_saved = len(flight_dict.timezones)
+    flight_dict.phases = [tuple(p) for p in schema["phases"]]
+    flight_dict.phases_saved = len(flight_dict.phases)
+    return flight_dict
+
+def write_flight_columns(flight_num):
+    '''
+    Function writes the column stores of a recorded flight from its flight
+    logs: the main log and every channel group log.
+
+    Returns
+    -------
+    nbytes : Integer
+        Size of the stores in bytes.
+
+    '''
+    nbytes = 0
+    for group in [None] + angfl.flight_log_groups(flight_num):
+        log_path = angfl.flight_log_path(flight_num, group)
+        if os.path.exists(log_path):
+            nbytes += write_columns(columns_path(flight_num, group),
+                                    angfl.load_flight_log(log_path))
+    return nbytes
+
+def encode_value(value):
+    '''
+    Function returns a header value as a [type, JSON value] pair.
+    '''
+    if value is None:
+        return ['none', None]
+    if isinstance(value, bool):
+        return ['bool', value]
+    if isinstance(value, int):
+        return ['int', value]
+    if isinstance(value, float):
+        return ['float', value]
+    if isinstance(value, bytes):
+        return ['bytes', value.decode('latin1')]
+    if isinstance(value, datetime.datetime):
+        return ['datetime', value.isoformat()]
+    return ['str', str(value)]
+
+def decode_value(pair):
+    '''
+    Function returns the header value of a [type, JSON value] pair.
+    '''
+    kind, value = pair
+    if kind == 'bytes':
+        return value.encode('latin1')
+    if kind == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'float':
+        return float(value)
+    return value
+
+def save_header(header, flight_num):
+    '''
+    Function saves a flight header as typed JSON, see header_path.
+
+    Returns
+    -------
+    nbytes : Integer
+
+    '''
+    data = json.dumps({"format":COLUMNS_FORMAT,
+                       "header":{k:encode_value(v) for k, v in header.items()}},
+                      indent=1).encode()
+    angfl.write_file_atomic(header_path(flight_num), data)
+    return len(data)
+
+def load_header(flight_num):
+    '''
+    Function loads a flight header saved by save_header.
+
+    Returns
+    -------
+    header : Dictionary
+
+    '''
+    with open(header_path(flight_num), 'rb') as fp:
+        payload = json.loads(fp.read())
+    return {k:decode_value(v) for k, v in payload["header"].items()}
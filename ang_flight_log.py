@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only flight log used by the flight recorder.
+
+A flight log is a single file ./data/f#/f#.log made of framed records. Every
+frame is a 4 byte little endian length and a 4 byte CRC32 followed by a
+pickled (kind, payload) tuple. The first frame holds the channel names and
+dtypes of the flight and every following frame holds only the samples
+recorded since the previous frame, so the cost of a write does not depend on
+the length of the flight. Samples are stored either dense ('rows' frames) or
+deadband encoded ('deltas' frames, see ang_deadband), in which case a
+'deadband' frame records the channel tolerances.
+
+A 'timezone' frame holds the UTC offset of the flight from a start time on;
+one is written per timezone segment, not per sample. A 'phase' frame holds
+one flight phase transition (sample index, time ns, phase).
+
+Burst segments (see ang_burst_capture) are complete logs written in one go
+to ./data/f#/bursts/f#.burst#.log, with a 'segment' frame describing the
+trigger.
+
+After each fsync'ed write the end offset of the log is saved to the
+checkpoint file ./data/f#/f#.ckpt with an atomic rename. Everything before
+the checkpoint is known to be on disk, so recovery after a crash only has to
+check the frames after it.
+
+@author: ANG
+"""
+import io
+import os
+import json
+import pickle
+import struct
+import zlib
+import ang_flight_buffer as angfb
+import ang_deadband as angdb
+
+FLIGHT_LOG_MAGIC = b'ANGFLOG2'
+FRAME_HEADER = struct.Struct('<II') # length, crc32
+# Logs written before checksums were added
+FLIGHT_LOG_MAGIC_V1 = b'ANGFLOG1'
+FRAME_HEADER_V1 = struct.Struct('<I') # length
+
+def flight_log_path(flight_num, group=None):
+    '''
+    Function returns the flight log path for a flight number.
+
+    Parameters
+    ----------
+    flight_num : String
+        Flight number string i.e. 'f1'.
+    group : String, optional
+        Channel group name; None for the main flight log.
+
+    Returns
+    -------
+    log_path : String
+        Path to the flight log i.e. ./data/f1/f1.log or ./data/f1/f1.attitude.log.
+
+    '''
+    if group is None:
+        log_path = f'./data/{flight_num}/{flight_num}.log'
+    else:
+        log_path = f'./data/{flight_num}/{flight_num}.{group}.log'
+    return log_path
+
+def flight_log_groups(flight_num):
+    '''
+    Function lists the channel groups of a flight that have their own log.
+
+    Returns
+    -------
+    groups : List
+        Group names i.e. ['attitude', 'slow'].
+
+    '''
+    flight_dir = f'./data/{flight_num}'
+    prefix = f'{flight_num}.'
+    groups = []
+    if os.path.isdir(flight_dir):
+        for name in sorted(os.listdir(flight_dir)):
+            if name.startswith(prefix) and name.endswith('.log') and name.count('.') == 2:
+                groups.append(name[len(prefix):-len('.log')])
+    return groups
+
+def burst_log_path(flight_num, index):
+    '''
+    Function returns the path of burst segment index of a flight i.e. 
+    ./data/f1/bursts/f1.burst2.log.
+    '''
+    return f'./data/{flight_num}/bursts/{flight_num}.burst{index}.log'
+
+def flight_burst_logs(flight_num):
+    '''
+    Function lists the burst segment logs of a flight in segment order.
+
+    Returns
+    -------
+    log_paths : List
+
+    '''
+    burst_dir = f'./data/{flight_num}/bursts'
+    prefix = f'{flight_num}.burst'
+    indices = []
+    if os.path.isdir(burst_dir):
+        for name in os.listdir(burst_dir):
+            index = name[len(prefix):-len('.log')]
+            if name.startswith(prefix) and name.endswith('.log') and index.isdigit():
+                indices.append(int(index))
+    log_paths = [burst_log_path(flight_num, i) for i in sorted(indices)]
+    return log_paths
+
+def checkpoint_path(log_path):
+    '''
+    Function returns the checkpoint path of a flight log i.e. ./data/f1/f1.ckpt.
+    '''
+    return os.path.splitext(log_path)[0] + '.ckpt'
+
+def write_file_atomic(file_path, data):
+    '''
+    Function replaces a file with data so that readers see either the old or 
+    the new content, never a partial write. The data is written to a 
+    temporary file, fsync'ed and renamed over file_path.
+
+    Parameters
+    ----------
+    file_path : String
+        Path of the file to write.
+    data : Bytes
+        New file content.
+
+    Returns
+    -------
+    None.
+
+    '''
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(data)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, file_path)
+    return
+
+def write_checkpoint(log_path, offset):
+    '''
+    Function atomically records the end offset of the durable part of a log.
+    '''
+    write_file_atomic(checkpoint_path(log_path),
+                      json.dumps({"offset":offset}).encode())
+    return
+
+def read_checkpoint(log_path):
+    '''
+    Function returns the checkpointed offset of a log, None if there is no 
+    readable checkpoint.
+    '''
+    try:
+        with open(checkpoint_path(log_path), 'rb') as fp:
+            offset = int(json.loads(fp.read())["offset"])
+    except (OSError, ValueError, KeyError, TypeError):
+        offset = None
+    return offset
+
+def write_frame(fp, kind, payload):
+    '''
+    Function writes a single framed record to an open binary file.
+
+    Parameters
+    ----------
+    fp : File object
+        Binary file opened for appending.
+    kind : String
+        Frame kind i.e. 'schema' or 'rows'.
+    payload : *
+        Picklable frame content.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written.
+
+    '''
+    body = pickle.dumps((kind, payload), protocol=pickle.HIGHEST_PROTOCOL)
+    fp.write(FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body)
+    nbytes = FRAME_HEADER.size + len(body)
+    return nbytes
+
+def _open_log(fp, log_path):
+    magic = fp.read(len(FLIGHT_LOG_MAGIC))
+    if magic == FLIGHT_LOG_MAGIC:
+        return FRAME_HEADER
+    if magic == FLIGHT_LOG_MAGIC_V1:
+        return FRAME_HEADER_V1
+    raise ValueError(f'{log_path} is not a flight log.')
+
+def scan_frames(fp, frame_header):
+    '''
+    Function yields the valid frames from the current position of an open 
+    log. Scanning stops at the first truncated frame or checksum mismatch.
+
+    Yields
+    ------
+    frame : Tuple
+        (end offset, frame body bytes).
+
+    '''
+    while True:
+        head = fp.read(frame_header.size)
+        if len(head) < frame_header.size:
+            break
+        if frame_header is FRAME_HEADER:
+            size, crc = frame_header.unpack(head)
+        else:
+            (size,), crc = frame_header.unpack(head), None
+        body = fp.read(size)
+        if len(body) < size:
+            break
+        if crc is not None and zlib.crc32(body) != crc:
+            break
+        yield fp.tell(), body
+
+def read_frames(log_path):
+    '''
+    Function yields the (kind, payload) frames of a flight log in order. 
+    Reading stops before a partially written or corrupt frame, so a damaged 
+    log gives its valid prefix.
+
+    Parameters
+    ----------
+    log_path : String
+        Path to the flight log.
+
+    Yields
+    ------
+    frame : Tuple
+        (kind, payload) tuple.
+
+    '''
+    with open(log_path, 'rb') as fp:
+        frame_header = _open_log(fp, log_path)
+        for end, body in scan_frames(fp, frame_header):
+            yield pickle.loads(body)
+
+def append_rows(log_path, fields, rows, fsync=True, encoder=None, frames=()):
+    '''
+    Function appends sample rows to a flight log. The log and its schema frame
+    are created on first write. With fsync the rows are forced to disk and 
+    the checkpoint is moved to the new end of the log. With an encoder the 
+    rows are stored as deadband deltas.
+
+    Parameters
+    ----------
+    log_path : String
+        Path to the flight log.
+    fields : FlightSchema or List
+        Schema of the rows, or (channel name, dtype) tuples in row order.
+    rows : List
+        List of sample rows; each row is a list of values in channel order.
+    fsync : Bool
+        Force the write to disk and update the checkpoint.
+    encoder : DeadbandEncoder, optional
+        Encoder of this flight log; keeps the last stored values between calls.
+    frames : List
+        Other (kind, payload) frames to write with the rows, i.e. 'timezone'.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written.
+
+    '''
+    nbytes = 0
+    with open(log_path, 'ab') as fp:
+        if fp.tell() == 0:
+            fp.write(FLIGHT_LOG_MAGIC)
+            nbytes += len(FLIGHT_LOG_MAGIC)
+            if isinstance(fields, angfb.FlightSchema):
+                nbytes += write_frame(fp, 'schema', fields.to_payload())
+            else:
+                nbytes += write_frame(fp, 'schema', list(fields))
+        for kind, payload in frames:
+            nbytes += write_frame(fp, kind, payload)
+        if not rows:
+            pass
+        elif encoder is None:
+            nbytes += write_frame(fp, 'rows', [list(row) for row in rows])
+        else:
+            if encoder.samples == 0:
+                nbytes += write_frame(fp, 'deadband', encoder.channel_tolerances())
+            nbytes += write_frame(fp, 'deltas', [encoder.encode(row) for row in rows])
+        if fsync:
+            fp.flush()
+            os.fsync(fp.fileno())
+            end = fp.tell()
+    if fsync:
+        write_checkpoint(log_path, end)
+    return nbytes
+
+def write_segment(log_path, fields, rows, info):
+    '''
+    Function writes a burst segment as a complete flight log with an atomic 
+    rename, so a segment is either saved whole or not at all.
+
+    Parameters
+    ----------
+    log_path : String
+        Segment log path; its directory is created if needed.
+    fields : FlightSchema or List
+        Schema of the rows.
+    rows : List
+        Sample rows of the segment.
+    info : Dictionary
+        Trigger description saved in the 'segment' frame.
+
+    Returns
+    -------
+    nbytes : Integer
+        Number of bytes written.
+
+    '''
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    buf = io.BytesIO()
+    buf.write(FLIGHT_LOG_MAGIC)
+    if isinstance(fields, angfb.FlightSchema):
+        write_frame(buf, 'schema', fields.to_payload())
+    else:
+        write_frame(buf, 'schema', list(fields))
+    write_frame(buf, 'segment', dict(info))
+    write_frame(buf, 'rows', [list(row) for row in rows])
+    data = buf.getvalue()
+    write_file_atomic(log_path, data)
+    return len(data)
+
+def load_segment(log_path):
+    '''
+    Function loads a burst segment.
+
+    Returns
+    -------
+    info : Dictionary
+        Trigger description of the segment.
+    flight_dict : FlightBuffer
+        Segment samples.
+
+    '''
+    info = {}
+    for kind, payload in read_frames(log_path):
+        if kind == 'segment':
+            info = payload
+    return info, load_flight_log(log_path)
+
+def recover_flight_log(log_path):
+    '''
+    Function repairs a flight log after a crash by cutting off a damaged or 
+    partially written tail. Frames before the checkpoint are trusted, so only 
+    the frames written after it are read and checked. A log that does not 
+    even have a complete file header is removed.
+
+    Parameters
+    ----------
+    log_path : String
+        Path to the flight log.
+
+    Returns
+    -------
+    good_end : Integer
+        Size of the repaired log in bytes.
+    dropped : Integer
+        Number of damaged bytes removed from the end of the log.
+
+    '''
+    size = os.path.getsize(log_path)
+    with open(log_path, 'r+b') as fp:
+        try:
+            frame_header = _open_log(fp, log_path)
+        except ValueError:
+            frame_header = None
+        else:
+            good_end = read_checkpoint(log_path)
+            if good_end is None or not len(FLIGHT_LOG_MAGIC) <= good_end <= size:
+                good_end = len(FLIGHT_LOG_MAGIC)
+            fp.seek(good_end)
+            for end, body in scan_frames(fp, frame_header):
+                good_end = end
+            if good_end < size:
+                fp.truncate(good_end)
+                fp.flush()
+                os.fsync(fp.fileno())
+    if frame_header is None:
+        # Crashed before the file header was complete
+        os.remove(log_path)
+        if os.path.exists(checkpoint_path(log_path)):
+            os.remove(checkpoint_path(log_path))
+        return 0, size
+    write_checkpoint(log_path, good_end)
+    return good_end, size - good_end
+
+def load_flight_log(log_path):
+    '''
+    Function reassembles a flight log into a columnar flight buffer. Deadband 
+    encoded samples are expanded to dense samples by carrying forward the 
+    last stored value of every channel. Timezone segments are returned in 
+    flight_dict.timezones and flight phase transitions in flight_dict.phases.
+
+    Parameters
+    ----------
+    log_path : String
+        Path to the flight log.
+
+    Returns
+    -------
+    flight_dict : FlightBuffer
+        Flight data dictionary keyed by channel name.
+
+    '''
+    flight_dict = angfb.FlightBuffer(angfb.FlightSchema([]))
+    last = []
+    timezones = []
+    phases = []
+    for kind, payload in read_frames(log_path):
+        if kind == 'schema':
+            flight_dict = angfb.FlightBuffer(angfb.FlightSchema.from_fields(payload))
+            last = [None] * len(flight_dict.schema)
+        elif kind == 'timezone':
+            timezones.append(tuple(payload))
+        elif kind == 'phase':
+            phases.append(tuple(payload))
+        elif kind == 'rows':
+            for row in payload:
+                flight_dict.append_row(row)
+            if payload:
+                last = list(payload[-1])
+        elif kind == 'deltas':
+            for delta in payload:
+                flight_dict.append_row(angdb.apply_delta(last, delta))
+    flight_dict.timezones = sorted(timezones)
+    flight_dict.timezones_saved = len(timezones)
+    flight_dict.phases = sorted(phases)
+    flight_dict.phases_saved = len(phases)
+    return flight_dict
+
+def flight_log_exists(flight_num):
+    '''
+    Function checks if a flight has a flight log.
+
+    Returns
+    -------
+    exists : Bool
+
+    '''
+    return os.path.exists(flight_log_path(flight_num))
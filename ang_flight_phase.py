@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental flight phase detection.
+
+FlightPhaseDetector is a small state machine fed one main sample at a time.
+It looks only at the latest values of PLANE_ALT_ABOVE_GROUND, VERTICAL_SPEED,
+GROUND_VELOCITY, FLAPS_HANDLE_PERCENT and the throttle, plus the current
+phase, so every update is O(1) whatever the length of the flight. A new phase
+is taken once it has held for hold_seconds, so gusts and bounces do not cause
+a stream of transitions.
+
+Each transition is kept as (sample index, time ns, phase): the index of the
+main sample where the new phase started. The recorder stores the transitions
+with the flight and uses the phase to pick the sample rate of the channel
+groups (see PHASE_RATE_FACTORS in the recorder).
+
+@author: ANG
+"""
+import math
+
+PARKED = 'parked'
+TAXI = 'taxi'
+TAKEOFF = 'takeoff'
+CLIMB = 'climb'
+CRUISE = 'cruise'
+DESCENT = 'descent'
+APPROACH = 'approach'
+LANDING = 'landing'
+PHASES = (PARKED, TAXI, TAKEOFF, CLIMB, CRUISE, DESCENT, APPROACH, LANDING)
+AIRBORNE_PHASES = {CLIMB, CRUISE, DESCENT, APPROACH}
+
+ALT_CHANNEL = "PLANE_ALT_ABOVE_GROUND"
+VS_CHANNEL = "VERTICAL_SPEED"
+SPEED_CHANNEL = "GROUND_VELOCITY"
+FLAPS_CHANNEL = "FLAPS_HANDLE_PERCENT"
+THROTTLE_CHANNEL = "GENERAL_ENG_THROTTLE_LEVER_POSITION:1"
+PHASE_CHANNELS = (ALT_CHANNEL, VS_CHANNEL, SPEED_CHANNEL, FLAPS_CHANNEL,
+                  THROTTLE_CHANNEL)
+
+NS_PER_SECOND = 1000000000
+
+def _value(sample, key):
+    value = sample.get(key)
+    if value is None or isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class FlightPhaseDetector(object):
+    '''
+    Class tracks the flight phase from one sample to the next.
+
+    Parameters
+    ----------
+    hold_seconds : Float
+        Seconds a new phase must hold before it is taken.
+    ground_agl : Float
+        Feet above ground below which the aircraft is on the ground.
+    level_fpm : Float
+        Vertical speed in feet/minute below which flight is level.
+    taxi_knots : Float
+        Ground speed above which ground movement is a takeoff or landing roll.
+    stopped_knots : Float
+        Ground speed below which the aircraft is parked.
+    takeoff_throttle : Float
+        Throttle percent that starts a takeoff roll.
+    takeoff_agl : Float
+        Feet above ground where the takeoff becomes a climb.
+    approach_agl : Float
+        Feet above ground below which a descent is an approach.
+    approach_flaps : Float
+        FLAPS_HANDLE_PERCENT (0-1) above which a descent is an approach.
+    '''
+    def __init__(self, hold_seconds=5.0, ground_agl=10.0, level_fpm=300.0,
+                 taxi_knots=40.0, stopped_knots=1.0, takeoff_throttle=70.0,
+                 takeoff_agl=500.0, approach_agl=2500.0, approach_flaps=0.2):
+        self.hold_ns = int(hold_seconds * NS_PER_SECOND)
+        self.ground_agl = ground_agl
+        self.level_fpm = level_fpm
+        self.taxi_knots = taxi_knots
+        self.stopped_knots = stopped_knots
+        self.takeoff_throttle = takeoff_throttle
+        self.takeoff_agl = takeoff_agl
+        self.approach_agl = approach_agl
+        self.approach_flaps = approach_flaps
+        self.reset()
+
+    def reset(self):
+        '''
+        Function forgets the phase, i.e. at the start of a new flight.
+        '''
+        self.phase = None
+        self.candidate = None
+        self.candidate_index = None
+        self.candidate_time_ns = None
+        self.transition = None
+        self.changed = False
+        return
+
+    def classify(self, agl, vs, gs, flaps, throttle):
+        '''
+        Function returns the phase the values point to, given the current
+        phase.
+
+        Returns
+        -------
+        phase : String
+
+        '''
+        phase = self.phase
+        if agl < self.ground_agl and abs(vs) < self.level_fpm:
+            if gs < self.stopped_knots:
+                return PARKED
+            if gs >= self.taxi_knots and (phase in AIRBORNE_PHASES or phase == LANDING):
+                return LANDING
+            if gs >= self.taxi_knots or throttle >= self.takeoff_throttle:
+                return TAKEOFF
+            return TAXI
+        if phase == TAKEOFF and agl < self.takeoff_agl and vs > -self.level_fpm:
+            return TAKEOFF
+        if vs > self.level_fpm:
+            return CLIMB
+        low = agl < self.approach_agl or flaps > self.approach_flaps
+        if vs < -self.level_fpm:
+            return APPROACH if low else DESCENT
+        if phase == APPROACH and low:
+            # Level segments of a pattern or an approach
+            return APPROACH
+        return CRUISE
+
+    def update(self, sample, time_ns, index):
+        '''
+        Function updates the phase with one main sample.
+
+        Parameters
+        ----------
+        sample : Dictionary
+            Channel -> latest value; see PHASE_CHANNELS. Samples missing the
+            altitude, vertical speed or ground speed are skipped.
+        time_ns : Integer
+            UTC time of the sample in nanoseconds since the epoch.
+        index : Integer
+            Index of the sample in the flight.
+
+        Returns
+        -------
+        changed : Bool
+            True if the phase changed; the change is in self.transition as
+            (index, time ns, phase) of the sample where the phase started.
+
+        '''
+        self.changed = False
+        agl = _value(sample, ALT_CHANNEL)
+        vs = _value(sample, VS_CHANNEL)
+        gs = _value(sample, SPEED_CHANNEL)
+        if agl is None or vs is None or gs is None:
+            return False
+        flaps = _value(sample, FLAPS_CHANNEL) or 0.0
+        throttle = _value(sample, THROTTLE_CHANNEL) or 0.0
+        phase = self.classify(agl, vs, gs, flaps, throttle)
+        if phase == self.phase:
+            self.candidate = None
+            return False
+        if phase != self.candidate:
+            self.candidate = phase
+            self.candidate_index = index
+            self.candidate_time_ns = time_ns
+        if self.phase is not None and time_ns - self.candidate_time_ns < self.hold_ns:
+            return False
+        self.phase = phase
+        self.transition = (self.candidate_index, self.candidate_time_ns, phase)
+        self.candidate = None
+        self.changed = True
+        return True
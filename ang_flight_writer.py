@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Background flight log writer.
+
+The recorder thread puts each sample on a bounded queue and returns straight
+away; a dedicated writer thread takes samples off the queue and appends them
+to the flight log in batches, one frame per flush interval. A slow disk then
+delays the writer thread instead of the next sample.
+
+When the queue is full the writer either drops the sample (on_full='drop',
+the default, so sampling never waits on storage) or blocks the sampler for
+up to block_timeout seconds (on_full='block'). Both are counted. Timezone
+and phase frames are never dropped; submit_frame waits for room instead.
+
+A write that fails is counted in write_errors and the writer carries on.
+flush() and close() do not wait on a writer thread that has stopped.
+
+With tolerances the writer keeps one DeadbandEncoder per flight log and
+stores samples as deadband deltas. Burst segments are queued whole with
+submit_segment and written as their own log; other frames (i.e. timezone
+segments) are queued with submit_frame.
+
+@author: ANG
+"""
+import queue
+import threading
+import time
+import ang_flight_log as angfl
+import ang_deadband as angdb
+
+_STOP = object()
+
+class _Frame(object):
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
+
+class _Segment(object):
+    def __init__(self, rows, info):
+        self.rows = rows
+        self.info = info
+
+class FlightLogWriter(threading.Thread):
+    '''
+    Class writes queued samples to flight logs on its own thread.
+
+    Parameters
+    ----------
+    max_queue : Integer
+        Maximum number of samples waiting to be written.
+    flush_interval : Float
+        Seconds samples are collected before being written as one frame.
+    on_full : String
+        'drop' or 'block'; what submit does when the queue is full.
+    block_timeout : Float
+        Seconds submit waits for room when on_full is 'block'.
+    tolerances : Dictionary, optional
+        Channel name -> deadband tolerance. None stores every sample in full.
+    '''
+    def __init__(self, max_queue=4096, flush_interval=1.0, on_full='drop',
+                 block_timeout=1.0, tolerances=None):
+        super(FlightLogWriter, self).__init__(name='FlightLogWriter', daemon=True)
+        if on_full not in ('drop', 'block'):
+            raise ValueError(f"on_full must be 'drop' or 'block', got {on_full!r}.")
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.on_full = on_full
+        self.block_timeout = block_timeout
+        self.tolerances = tolerances
+        self.encoders = {}
+        self.max_queue_depth = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.segments_written = 0
+        self.write_errors = 0
+
+    def submit(self, log_path, fields, row):
+        '''
+        Function queues one sample for writing.
+
+        Parameters
+        ----------
+        log_path : String
+            Flight log path.
+        fields : FlightSchema or List
+            Schema of the flight, or its (channel name, dtype) tuples.
+        row : List
+            Sample values in field order.
+
+        Returns
+        -------
+        queued : Bool
+            False if the sample was dropped.
+
+        '''
+        return self._put((log_path, fields, row))
+
+    def submit_segment(self, log_path, fields, rows, info):
+        '''
+        Function queues a burst segment for writing as its own log.
+
+        Parameters
+        ----------
+        log_path : String
+            Segment log path.
+        fields : FlightSchema or List
+            Schema of the segment.
+        rows : List
+            Segment sample rows.
+        info : Dictionary
+            Trigger description of the segment.
+
+        Returns
+        -------
+        queued : Bool
+            False if the segment was dropped.
+
+        '''
+        return self._put((log_path, fields, _Segment(rows, info)))
+
+    def submit_frame(self, log_path, fields, kind, payload):
+        '''
+        Function queues a (kind, payload) frame for a flight log; it is 
+        written ahead of the rows of the same flush. Frames carry the time 
+        and phase metadata of the log, so when the queue is full this waits
+        for room whatever on_full is.
+
+        Returns
+        -------
+        queued : Bool
+            False if the writer thread is not running.
+
+        '''
+        item = (log_path, fields, _Frame(kind, payload))
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.backpressure_waits += 1
+            if not self._put_wait(item):
+                self.dropped += 1
+                print(f'Flight log writer is not running, {kind} frame for {log_path} lost.')
+                return False
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.on_full == 'drop':
+                self.dropped += 1
+                return False
+            self.backpressure_waits += 1
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def _put_wait(self, item, deadline=None):
+        '''
+        Function waits for room in the queue while the writer thread is 
+        alive, until the monotonic deadline if given.
+
+        Returns
+        -------
+        queued : Bool
+
+        '''
+        while self.is_alive():
+            timeout = 0.1
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return False
+            try:
+                self.queue.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+                if item[0] is None:
+                    # flush() marker
+                    break
+            self._write_batch(batch)
+        return
+
+    def _write_batch(self, batch):
+        try:
+            self._write_items(batch)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+        return
+
+    def _write_items(self, batch):
+        rows_by_log = {}
+        for log_path, fields, row in batch:
+            if log_path is None:
+                continue
+            if isinstance(row, _Segment):
+                try:
+                    self.bytes_written += angfl.write_segment(log_path, fields,
+                                                              row.rows, row.info)
+                    self.rows_written += len(row.rows)
+                    self.segments_written += 1
+                except Exception as e:
+                    self.write_errors += 1
+                    print(f'Burst segment write to {log_path} failed: {e!r}')
+                continue
+            entry = rows_by_log.setdefault(log_path, (fields, [], []))
+            if isinstance(row, _Frame):
+                entry[2].append((row.kind, row.payload))
+            else:
+                entry[1].append(row)
+        for log_path, (fields, rows, frames) in rows_by_log.items():
+            encoder = None
+            try:
+                if self.tolerances is not None:
+                    encoder = self.encoders.get(log_path)
+                    if encoder is None:
+                        encoder = angdb.DeadbandEncoder(fields, self.tolerances)
+                        self.encoders[log_path] = encoder
+                self.bytes_written += angfl.append_rows(log_path, fields, rows,
+                                                        encoder=encoder,
+                                                        frames=frames)
+                self.rows_written += len(rows)
+                self.frames_written += 1
+            except Exception as e:
+                # The next write starts over with a full sample
+                self.encoders.pop(log_path, None)
+                self.write_errors += 1
+                print(f'Flight log write to {log_path} failed: {e!r}')
+        return
+
+    def flush(self, timeout=None):
+        '''
+        Function writes everything queued so far and waits until it is on disk.
+
+        Parameters
+        ----------
+        timeout : Float, optional
+            Maximum seconds to wait. It never waits on a writer thread that
+            is not running.
+
+        Returns
+        -------
+        flushed : Bool
+            False if the timeout passed or the writer thread is not running.
+
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._put_wait((None, None, None), deadline):
+            return False
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                wait = 0.1
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                if not self.is_alive() or wait <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(wait)
+        return True
+
+    def close(self):
+        '''
+        Function writes everything queued and stops the writer thread.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self._put_wait(_STOP):
+            self.join()
+        return
+
+    def stats(self):
+        '''
+        Function returns the writer counters.
+
+        Returns
+        -------
+        stats : Dictionary
+
+        '''
+        stats = {"queue_depth":self.queue.qsize(),
+                 "max_queue_depth":self.max_queue_depth,
+                 "dropped":self.dropped,
+                 "backpressure_waits":self.backpressure_waits,
+                 "rows_written":self.rows_written,
+                 "frames_written":self.frames_written,
+                 "segments_written":self.segments_written,
+                 "bytes_written":self.bytes_written,
+                 "write_errors":self.write_errors,
+                 }
+        return stats
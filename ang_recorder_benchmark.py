@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Recorder benchmark against the local SimConnect stand-in.
+
+Compares the sampling rate of get_flight_data when every SimVar is its own
+AircraftRequests.get round-trip with the batched single-request path, and
+replays whole flights through make_flight_header, active_record (with the
+background writer) and the CSV converter. Flights run on a ManualClock, so a
+24 h flight takes minutes instead of a day. For every flight length it
+reports samples/sec, per-tick latency percentiles, bytes written and peak
+Python memory (tracemalloc, which also slows the run down a little).
+
+Usage:
+    python ang_recorder_benchmark.py --latency 0.002 --duration 5
+    python ang_recorder_benchmark.py --flights 1 10 24 --rate 1 --latency 0 --jitter 0
+
+@author: ANG
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import ang_fake_simconnect as angfake
+angfake.install()
+import ANG_Flight_Recorder_v_0_5 as angflightrec
+import ang_flight_writer as angwriter
+import ang_channel_groups as anggroups
+import ang_flight_phase as angphase
+import ang_flight_columns as angcols
+import ang_flight_log as angfl
+
+def time_samples(sample_func, duration):
+    '''
+    Function calls sample_func repeatedly for duration seconds.
+
+    Returns
+    -------
+    samples_per_sec : Float
+
+    '''
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        sample_func()
+        count += 1
+    samples_per_sec = count / (time.perf_counter() - start)
+    return samples_per_sec
+
+def bench_sampling(latency, duration, jitter=0.0):
+    '''
+    Function reports samples/sec and round-trips per sample for the
+    sequential, sequential with the request plan of a single engine piston 
+    aircraft, concurrent reads through the sampling engine, and batched 
+    sampling paths.
+
+    Returns
+    -------
+    results : Dictionary
+        Path name -> (samples_per_sec, round_trips_per_sample).
+
+    '''
+    results = {}
+    for name in ('sequential', 'planned', 'engine', 'batched'):
+        _SM = angfake.SimConnect(latency=latency, jitter=jitter)
+        _AQ = angflightrec.connect_aq(_SM)
+        _BQ = None
+        engine = None
+        schema = angflightrec.FLIGHT_DATA_SCHEMA
+        if name == 'planned':
+            schema = angflightrec.plan_flight_schema({"NUMBER_OF_ENGINES":1.0,
+                                                      "ENGINE_TYPE":0.0})
+        if name == 'batched':
+            _BQ = angflightrec.connect_bq(_SM, _AQ, angflightrec.FLIGHT_DATA_SIMVARS)
+        if name == 'engine':
+            engine = angflightrec.connect_engine(_SM, _AQ)
+        flight_dict = angflightrec.get_flight_dictionary(schema)
+        simvars = [n for n in schema.names if n != anggroups.TIME_CHANNEL]
+
+        def sample():
+            if engine is not None:
+                values = engine.call(engine.get_many(simvars))
+            elif _BQ is None:
+                values = angflightrec.angbatch.get_sequential_sample(_AQ, simvars)
+            else:
+                values = _BQ.get_sample()
+            values[anggroups.TIME_CHANNEL] = angflightrec.EPOCH_CLOCK()
+            flight_dict.append_sample(values)
+
+        rate = time_samples(sample, duration)
+        if engine is not None:
+            engine.stop()
+        trips = _SM.round_trips / max(flight_dict.num_samples, 1)
+        results[name] = (rate, trips)
+    return results
+
+def percentile(sorted_values, pct):
+    '''
+    Function returns the pct percentile (nearest rank) of sorted values.
+    '''
+    if not sorted_values:
+        return float('nan')
+    rank = min(int(round(pct / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[rank]
+
+def dir_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+def bench_flight(hours, rate_hz=1.0, latency=0.0, jitter=0.0, convert=True,
+                 tolerances=None, channel_groups=None, phases=False):
+    '''
+    Function records a whole synthetic flight of the given length into a 
+    temporary ./data directory, then converts it to CSV.
+
+    Parameters
+    ----------
+    hours : Float
+        Flight length in simulated hours.
+    rate_hz : Float
+        Samples per simulated second.
+    latency : Float
+        Seconds per SimConnect round-trip.
+    jitter : Float
+        Random extra seconds per round-trip.
+    convert : Bool
+        Also time the CSV conversion (needs pandas).
+    tolerances : Dictionary, optional
+        Deadband tolerances of the writer; None stores dense samples.
+    channel_groups : Dictionary, optional
+        Channel groups sampled at their own rate (see CHANNEL_GROUPS); None 
+        samples every channel at rate_hz.
+    phases : Bool
+        Detect the flight phases and let them set the group rates (see 
+        PHASE_RATE_FACTORS).
+
+    Returns
+    -------
+    results : Dictionary
+        Benchmark figures of the flight.
+
+    '''
+    work_dir = tempfile.mkdtemp(prefix='ang_bench_')
+    epoch_clock = angflightrec.EPOCH_CLOCK
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        os.makedirs('./data')
+        angflightrec._flight_number_allocator = angflightrec.FlightNumberAllocator()
+        tracemalloc.start()
+        clock = angfake.ManualClock()
+        # Sample times follow the simulated clock, i.e. for the phase holds
+        angflightrec.EPOCH_CLOCK = angflightrec.angtz.EpochClock(
+            monotonic_ns=lambda: int(clock() * 1e9))
+        profile = angfake.FlightProfile(duration=hours * 3600.0)
+        _SM = angfake.SimConnect(latency=latency, jitter=jitter, profile=profile,
+                                 clock=clock)
+        _AQ = angflightrec.connect_aq(_SM, rate_hz)
+        _TF = angflightrec.connect_tf()
+        _HQ = angflightrec.connect_bq(_SM, _AQ, angflightrec.FLIGHT_HEADER_SIMVARS.values())
+        writer = angwriter.FlightLogWriter(tolerances=tolerances)
+        writer.start()
+
+        start = time.perf_counter()
+        header = angflightrec.make_flight_header(_AQ, _TF, _HQ)
+        header_time = time.perf_counter() - start
+        flight_num = angflightrec.get_last_flight_num()
+        if phases and channel_groups is None:
+            channel_groups = {}
+        if channel_groups is None:
+            groups = None
+            schema = angflightrec.plan_flight_schema(header)
+            loop_rate_hz = rate_hz
+            _BQ = angflightrec.connect_bq(_SM, _AQ, [n for n in schema.names
+                                                     if n != anggroups.TIME_CHANNEL])
+        else:
+            groups = angflightrec.get_channel_groups(rate_hz, channel_groups, clock)
+            angflightrec.plan_channel_groups(_SM, _AQ, groups, header)
+            schema = groups[0].schema
+            loop_rate_hz = angflightrec.anggroups.loop_rate(groups)
+            _BQ = groups[0].batch
+
+        flight_dict = angflightrec.get_flight_dictionary(schema)
+        detector = angphase.FlightPhaseDetector() if phases else None
+        end = clock() + hours * 3600.0
+        tick_times = []
+        start = time.perf_counter()
+        # The loop rate follows the phase, so run on simulated time
+        while clock() < end:
+            clock.advance(1.0 / loop_rate_hz)
+            tick_start = time.perf_counter()
+            flight_dict, nbytes = angflightrec.active_record(flight_dict, _AQ, _TF,
+                                                             flight_num, _BQ, writer,
+                                                             groups, phases=detector)
+            tick_times.append(time.perf_counter() - tick_start)
+            if detector is not None and detector.changed:
+                loop_rate_hz = anggroups.loop_rate(groups)
+        record_time = time.perf_counter() - start
+        writer.close()
+        stats = writer.stats()
+        data_bytes = dir_size('./data')
+
+        # Column store written at flight end, and loading it against the log
+        columns_bytes = angcols.write_flight_columns(flight_num)
+        angflightrec.catalog_flight(flight_num)
+        start = time.perf_counter()
+        angfl.load_flight_log(angfl.flight_log_path(flight_num))
+        log_load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        angcols.load_columns(angcols.columns_path(flight_num))
+        columns_load_time = time.perf_counter() - start
+
+        convert_time = None
+        csv_bytes = 0
+        if convert:
+            import ang_data_reader_utils as angreader
+            angreader.test_check_data_dirs()
+            start = time.perf_counter()
+            angreader.convert_single_flight_to_csv(flight_num)
+            convert_time = time.perf_counter() - start
+            csv_bytes = dir_size('./data_csv')
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tick_times.sort()
+        results = {"hours":hours,
+                   "samples":stats["rows_written"],
+                   "samples_per_sec":stats["rows_written"] / record_time,
+                   "tick_p50":percentile(tick_times, 50),
+                   "tick_p95":percentile(tick_times, 95),
+                   "tick_p99":percentile(tick_times, 99),
+                   "tick_max":tick_times[-1] if tick_times else float('nan'),
+                   "header_time":header_time,
+                   "bytes_written":stats["bytes_written"],
+                   "data_bytes":data_bytes,
+                   "columns_bytes":columns_bytes,
+                   "log_load_time":log_load_time,
+                   "columns_load_time":columns_load_time,
+                   "dropped":stats["dropped"],
+                   "convert_time":convert_time,
+                   "csv_bytes":csv_bytes,
+                   "peak_memory":peak_memory,
+                   "phases":[phase for index, time_ns, phase in flight_dict.phases],
+                   }
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        os.chdir(cwd)
+        angflightrec._flight_number_allocator = None
+        angflightrec.EPOCH_CLOCK = epoch_clock
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_flight_results(results):
+    print(f'{results["hours"]:g} h flight: {results["samples"]} samples')
+    print(f'  samples/sec          {results["samples_per_sec"]:.1f}')
+    print(f'  tick latency ms      p50 {results["tick_p50"]*1000:.3f}  '
+          f'p95 {results["tick_p95"]*1000:.3f}  p99 {results["tick_p99"]*1000:.3f}  '
+          f'max {results["tick_max"]*1000:.3f}')
+    print(f'  make_flight_header   {results["header_time"]*1000:.1f} ms')
+    print(f'  bytes written        {results["bytes_written"]} '
+          f'({results["data_bytes"]} in ./data, {results["dropped"]} samples dropped)')
+    print(f'  column store         {results["columns_bytes"]} bytes, loads in '
+          f'{results["columns_load_time"]*1000:.1f} ms (flight log '
+          f'{results["log_load_time"]*1000:.1f} ms)')
+    if results["convert_time"] is not None:
+        print(f'  csv conversion       {results["convert_time"]:.2f} s, '
+              f'{results["csv_bytes"]} bytes')
+    print(f'  peak memory          {results["peak_memory"]/2**20:.1f} MiB')
+    if results["phases"]:
+        print(f'  flight phases        {" > ".join(results["phases"])}')
+    return
+
+def main():
+    parser = argparse.ArgumentParser(description='ANG flight recorder benchmark')
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='seconds per SimConnect round-trip')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds to run each path')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra seconds per SimConnect round-trip')
+    parser.add_argument('--flights', type=float, nargs='*',
+                        help='replay flights of these lengths in hours, i.e. 1 10 24')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='samples per simulated second for --flights')
+    parser.add_argument('--no-convert', action='store_true',
+                        help='skip the CSV conversion of --flights')
+    parser.add_argument('--deadband', action='store_true',
+                        help='store --flights deadband encoded')
+    parser.add_argument('--groups', action='store_true',
+                        help='sample --flights in the recorder channel groups')
+    parser.add_argument('--phases', action='store_true',
+                        help='let the flight phase set the --flights sample rates')
+    args = parser.parse_args()
+    if args.flights:
+        print(f'SimConnect round-trip latency: {args.latency*1000:.1f} ms '
+              f'+ up to {args.jitter*1000:.1f} ms jitter, {args.rate:g} Hz')
+        for hours in args.flights:
+            tolerances = angflightrec.FLIGHT_DATA_DEADBAND if args.deadband else None
+            channel_groups = angflightrec.CHANNEL_GROUPS if args.groups else None
+            print_flight_results(bench_flight(hours, args.rate, args.latency,
+                                              args.jitter, not args.no_convert,
+                                              tolerances, channel_groups, args.phases))
+        return
+    print(f'SimConnect round-trip latency: {args.latency*1000:.1f} ms')
+    print(f'{"Path":<12} {"Samples/sec":>12} {"Round-trips/sample":>20}')
+    results = bench_sampling(args.latency, args.duration, args.jitter)
+    for name, (rate, trips) in results.items():
+        print(f'{name:<12} {rate:>12.1f} {trips:>20.1f}')
+    speedup = results['batched'][0] / results['sequential'][0]
+    print(f'Batched speedup: {speedup:.1f}x')
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Aircraft aware request plan for the flight recorder.
+
+The flight data schema has four slots (:1 to :4) for every engine channel.
+At the start of a flight the header tells how many engines the aircraft has
+(NUMBER_OF_ENGINES) and what kind they are (ENGINE_TYPE); plan_schema drops
+the engine slots that do not exist and the channels that do not apply to the
+engine type, so they are never requested from SimConnect. The omitted
+channels and the reason for each are kept in the schema and stored with the
+flight.
+
+@author: ANG
+"""
+import math
+import ang_flight_buffer as angfb
+
+# SimConnect ENGINE_TYPE values
+ENGINE_PISTON = 0
+ENGINE_JET = 1
+ENGINE_NONE = 2
+ENGINE_HELO_TURBINE = 3
+ENGINE_UNSUPPORTED = 4
+ENGINE_TURBOPROP = 5
+
+MAX_ENGINES = 4
+
+# Channels that only exist for some engine types
+TURBINE_ONLY_CHANNELS = {"TURB_ENG_VIBRATION"}
+PROPELLER_ONLY_CHANNELS = {"PROP_THRUST"}
+TURBINE_ENGINES = {ENGINE_JET, ENGINE_HELO_TURBINE, ENGINE_TURBOPROP}
+PROPELLER_ENGINES = {ENGINE_PISTON, ENGINE_TURBOPROP}
+
+def _header_int(header, key):
+    value = header.get(key)
+    if value is None or isinstance(value, (bytes, str)):
+        return None
+    try:
+        if math.isnan(value):
+            return None
+        return int(round(value))
+    except (TypeError, ValueError):
+        return None
+
+def omit_reason(name, engines, engine_type):
+    '''
+    Function returns why a channel is not recorded for an aircraft.
+
+    Parameters
+    ----------
+    name : String
+        Channel name i.e. 'GENERAL_ENG_RPM:3'.
+    engines : Integer or None
+        NUMBER_OF_ENGINES; None if unknown.
+    engine_type : Integer or None
+        ENGINE_TYPE; None if unknown.
+
+    Returns
+    -------
+    reason : String or None
+        None if the channel is recorded.
+
+    '''
+    base, _, index = name.partition(':')
+    if engines is not None and index.isdigit() and int(index) > engines:
+        return f'aircraft has {engines} engine(s)'
+    if engine_type is not None:
+        if base in TURBINE_ONLY_CHANNELS and engine_type not in TURBINE_ENGINES:
+            return f'turbine only channel, ENGINE_TYPE {engine_type}'
+        if base in PROPELLER_ONLY_CHANNELS and engine_type not in PROPELLER_ENGINES:
+            return f'propeller only channel, ENGINE_TYPE {engine_type}'
+    return None
+
+def plan_schema(schema, header):
+    '''
+    Function builds the schema of the channels to request for an aircraft.
+
+    Parameters
+    ----------
+    schema : FlightSchema
+        Full flight data schema.
+    header : Dictionary
+        Flight header with NUMBER_OF_ENGINES and ENGINE_TYPE. Unknown or
+        missing values keep the affected channels.
+
+    Returns
+    -------
+    planned : FlightSchema
+        Channels to record; planned.omitted maps every dropped channel to
+        the reason it was dropped.
+
+    '''
+    engines = _header_int(header, "NUMBER_OF_ENGINES")
+    if engines is not None and not 0 <= engines <= MAX_ENGINES:
+        engines = None
+    engine_type = _header_int(header, "ENGINE_TYPE")
+    fields = []
+    omitted = dict(schema.omitted)
+    for name, dtype in schema.fields:
+        reason = omit_reason(name, engines, engine_type)
+        if reason is None:
+            fields.append((name, dtype))
+        else:
+            omitted[name] = reason
+    planned = angfb.FlightSchema(fields, omitted)
+    return planned
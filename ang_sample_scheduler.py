@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Drift-free sampling scheduler for the flight recorder.
+
+time.sleep(period) after the work of a tick stretches every interval by the
+time the work took. DeadlineScheduler instead keeps absolute deadlines on the
+monotonic clock (start + n * period) and sleeps until the next one. When a
+tick overruns one or more deadlines they are counted as missed and skipped,
+rather than silently lengthening the interval or bursting to catch up.
+
+@author: ANG
+"""
+import time
+
+MIN_RATE_HZ = 1.0
+MAX_RATE_HZ = 50.0
+
+class DeadlineScheduler(object):
+    '''
+    Class paces a loop at a fixed rate on the monotonic clock.
+
+    Parameters
+    ----------
+    rate_hz : Float
+        Ticks per second.
+    clock : Callable
+        Monotonic clock in seconds.
+    sleep : Callable
+        Sleep function in seconds.
+    '''
+    def __init__(self, rate_hz=1.0, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.ticks = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+        self.next_deadline = None
+        self.set_rate(rate_hz)
+
+    def set_rate(self, rate_hz):
+        '''
+        Function changes the tick rate. Deadlines restart from the next tick.
+
+        Parameters
+        ----------
+        rate_hz : Float
+            Ticks per second.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if rate_hz <= 0:
+            raise ValueError(f'Sample rate must be positive, got {rate_hz}.')
+        self.rate_hz = float(rate_hz)
+        self.period = 1.0 / self.rate_hz
+        self.next_deadline = None
+        return
+
+    def wait(self):
+        '''
+        Function blocks until the next deadline.
+
+        Returns
+        -------
+        missed : Integer
+            Number of deadlines missed since the previous call.
+
+        '''
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        missed = 0
+        if now < self.next_deadline:
+            self.sleep(self.next_deadline - now)
+        else:
+            lateness = now - self.next_deadline
+            self.max_lateness = max(self.max_lateness, lateness)
+            missed = int(lateness // self.period)
+            self.next_deadline += missed * self.period
+        self.next_deadline += self.period
+        self.ticks += 1
+        self.missed += missed
+        return missed
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+        return
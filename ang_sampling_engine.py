@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio sampling engine owning the SimConnect link.
+
+The recorder worker, the dashboard and the aircraft utilities used to make
+their own blocking AircraftRequests/AircraftEvents calls from different
+threads, each one waiting out a full round-trip before the next. The
+SamplingEngine runs an asyncio event loop on its own thread and every read,
+write and event goes through it as a coroutine with a deadline:
+
+- blocking SimConnect calls run one at a time on a single worker thread,
+  as Python-SimConnect is not thread-safe: the SimConnect handle and the
+  AircraftRequests cache are shared by every SimVar. Other threads hand
+  their calls to the engine instead of making them themselves;
+- readers of the same SimVar or SimVarBatch at the same time share one
+  round-trip;
+- a read that misses its deadline returns None (like SimVarBatch on timeout)
+  and is counted in missed.
+
+Coroutines are awaited on the engine loop, i.e. from stream(), or handed in
+from other threads with submit (returns a concurrent.futures.Future) or call
+(waits for the result).
+
+@author: ANG
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class SamplingEngine(object):
+    '''
+    Class schedules all SimConnect traffic on one asyncio event loop.
+
+    Parameters
+    ----------
+    _SM : SimConnect object.
+    _AQ : SimConnect Aircraft Requests object.
+    _AE : SimConnect Aircraft Events object, optional.
+    timeout : Float
+        Seconds a read or write may take when no deadline is given.
+    '''
+    def __init__(self, _SM, _AQ, _AE=None, timeout=0.5):
+        self._SM = _SM
+        self._AQ = _AQ
+        self._AE = _AE
+        self.timeout = timeout
+        self.loop = None
+        self.thread = None
+        self.executor = None
+        # Read in flight -> task shared by every reader of it
+        self.pending = {}
+        self.round_trips = 0
+        self.coalesced = 0
+        self.missed = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        '''
+        Function starts the event loop thread and returns once it runs.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self.running:
+            return
+        # One worker: every SimConnect call runs on it, one after the other
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='simconnect')
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name='sampling-engine',
+                                       daemon=True)
+        self.thread.start()
+        started.wait()
+        return
+
+    def stop(self, timeout=2.0):
+        '''
+        Function cancels the running coroutines and stops the event loop.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if not self.running:
+            return
+
+        async def shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop)
+        self.thread.join(timeout)
+        self.executor.shutdown(wait=False)
+        self.pending.clear()
+        return
+
+    def submit(self, coro):
+        '''
+        Function schedules a coroutine on the engine loop from any thread.
+        Errors of coroutines nobody waits for are printed.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+
+        '''
+        if not self.running:
+            coro.close()
+            raise RuntimeError('Sampling engine is not running.')
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._report)
+        return future
+
+    def call(self, coro, timeout=None):
+        '''
+        Function runs a coroutine on the engine loop and waits for its result;
+        for consumers on other threads, i.e. the recorder worker.
+        '''
+        return self.submit(coro).result(timeout)
+
+    def _report(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.errors += 1
+            print(f'Sampling engine: {future.exception()!r}')
+        return
+
+    async def _round_trip(self, func, *args):
+        self.round_trips += 1
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def _until(self, awaitable, deadline=None):
+        '''
+        Function waits for awaitable until deadline (time.monotonic seconds);
+        None after the deadline.
+        '''
+        if deadline is None:
+            timeout = self.timeout
+        else:
+            timeout = max(deadline - time.monotonic(), 0.0)
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.missed += 1
+            return None
+
+    def _shared(self, key, coro_func):
+        task = self.pending.get(key)
+        if task is None:
+            task = self.loop.create_task(coro_func())
+            self.pending[key] = task
+            task.add_done_callback(lambda t, key=key: self.pending.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A reader giving up must not cancel the round-trip of the others
+        return asyncio.shield(task)
+
+    async def get(self, key, deadline=None):
+        '''
+        Function reads one SimVar.
+
+        Parameters
+        ----------
+        key : String
+            SimVar key as used with _AQ.get i.e. "GENERAL_ENG_RPM:1".
+        deadline : Float, optional
+            time.monotonic seconds to give up at; defaults to now + timeout.
+
+        Returns
+        -------
+        value : * or None
+            None when the deadline passed.
+
+        '''
+        async def read():
+            return await self._round_trip(self._AQ.get, key)
+
+        return await self._until(self._shared(('get', key), read), deadline)
+
+    async def get_many(self, keys, deadline=None):
+        '''
+        Function reads several SimVars concurrently.
+
+        Returns
+        -------
+        sample : Dictionary
+            SimVar key -> value.
+
+        '''
+        keys = list(keys)
+        values = await asyncio.gather(*(self.get(key, deadline) for key in keys))
+        return dict(zip(keys, values))
+
+    async def read_batch(self, batch, deadline=None):
+        '''
+        Function reads every SimVar of a SimVarBatch in one request.
+
+        Returns
+        -------
+        sample : Dictionary
+            SimVar key -> value; all None when the deadline passed.
+
+        '''
+        async def read():
+            return await self._round_trip(batch.get_sample)
+
+        sample = await self._until(self._shared(('batch', id(batch)), read), deadline)
+        if sample is None:
+            sample = dict.fromkeys(batch.simvars)
+        return sample
+
+    async def read(self, batch=None, keys=(), deadline=None):
+        '''
+        Function reads a sample with a batch, or key by key without one.
+        '''
+        if batch is not None:
+            return await self.read_batch(batch, deadline)
+        return await self.get_many(keys, deadline)
+
+    async def read_all(self, sources, deadline=None):
+        '''
+        Function reads several samples concurrently, i.e. every channel group
+        due on a recorder tick.
+
+        Parameters
+        ----------
+        sources : List
+            (SimVarBatch or None, SimVar keys) per sample.
+
+        Returns
+        -------
+        samples : List
+            Sample dictionary per source.
+
+        '''
+        return list(await asyncio.gather(*(self.read(batch, keys, deadline)
+                                           for batch, keys in sources)))
+
+    async def set(self, key, value, deadline=None):
+        '''
+        Function writes one SimVar.
+
+        Returns
+        -------
+        result : * or None
+            _AQ.set result; None when the deadline passed.
+
+        '''
+        async def write():
+            return await self._round_trip(self._AQ.set, key, value)
+
+        return await self._until(write(), deadline)
+
+    async def set_many(self, values, deadline=None):
+        '''
+        Function writes several SimVars concurrently.
+
+        Parameters
+        ----------
+        values : Dictionary
+            SimVar key -> value.
+
+        '''
+        results = await asyncio.gather(*(self.set(key, value, deadline)
+                                         for key, value in values.items()))
+        return dict(zip(values, results))
+
+    async def trigger(self, *events, deadline=None):
+        '''
+        Function sends AircraftEvents in the given order.
+
+        Parameters
+        ----------
+        events : String
+            Event names i.e. "ENGINE_AUTO_START".
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self._AE is None:
+            raise RuntimeError('Sampling engine has no AircraftEvents.')
+        for name in events:
+            event = self._AE.find(name)
+            if event is None:
+                raise ValueError(f'Unknown aircraft event {name}.')
+            await self._until(self._round_trip(event), deadline)
+        return
+
+    async def stream(self, rate_hz, batch=None, keys=()):
+        '''
+        Function yields a sample every 1 / rate_hz seconds on absolute
+        deadlines. A sample that takes longer than a period skips the
+        deadlines it overran rather than bursting to catch up.
+
+        Parameters
+        ----------
+        rate_hz : Float
+            Samples per second.
+        batch : SimVarBatch, optional
+            Batch to read; without it keys are read one by one.
+        keys : List
+            SimVar keys read when there is no batch.
+
+        Yields
+        ------
+        sample : Dictionary
+            SimVar key -> value.
+
+        '''
+        if rate_hz <= 0:
+            raise ValueError(f'Stream rate must be positive, got {rate_hz}.')
+        period = 1.0 / rate_hz
+        next_deadline = time.monotonic()
+        while True:
+            next_deadline += period
+            yield await self.read(batch, keys, next_deadline)
+            now = time.monotonic()
+            if now > next_deadline:
+                next_deadline += (now - next_deadline) // period * period
+            await asyncio.sleep(max(next_deadline - now, 0.0))
+
+    def stats(self):
+        '''
+        Function returns the engine counters.
+
+        Returns
+        -------
+        stats : Dictionary
+
+        '''
+        stats = {"round_trips":self.round_trips,
+                 "coalesced":self.coalesced,
+                 "missed":self.missed,
+                 "errors":self.errors,
+                 "pending":len(self.pending),
+                 }
+        return stats
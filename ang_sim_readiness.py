@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Flight start readiness probing.
+
+When a flight starts the recorder used to sleep a fixed 30 seconds to let
+MSFS finish loading, losing the start of every flight. ReadinessProbe instead
+polls a few SimVars until the sim is ready, with a timeout:
+
+- the position is valid and off the main menu coordinates;
+- ATC_MODEL reads an aircraft model;
+- SIMULATION_RATE is running (above 0) and has held one value for
+  stable_seconds.
+
+Recording starts as soon as all three hold, so the wait is only as long as
+the sim really needs.
+
+@author: ANG
+"""
+import time
+
+# Position MSFS reports in the main menu and while a flight is loading
+MENU_LATITUDE = 0.000407442168686809
+MENU_LONGITUDE = 0.01397450300629543
+MENU_MAX_ALTITUDE = 50.0
+
+PROBE_SIMVARS = ["PLANE_LATITUDE", "PLANE_LONGITUDE", "PLANE_ALTITUDE",
+                 "ATC_MODEL", "SIMULATION_RATE"]
+
+def is_menu_position(lat, lon, alt):
+    '''
+    Function checks for the main menu coordinates, compared to 4 decimals.
+
+    Returns
+    -------
+    is_menu_position : Bool
+
+    '''
+    return (round(lat, 4) == round(MENU_LATITUDE, 4) and
+            round(lon, 4) == round(MENU_LONGITUDE, 4) and
+            alt < MENU_MAX_ALTITUDE)
+
+class ReadinessProbe(object):
+    '''
+    Class decides when a loading flight is ready to record.
+
+    Parameters
+    ----------
+    timeout : Float
+        Seconds to wait for the sim before recording anyway.
+    stable_seconds : Float
+        Seconds SIMULATION_RATE must keep one value above 0.
+    poll_interval : Float
+        Seconds between probes.
+    clock : Callable
+        Monotonic clock in seconds.
+    sleep : Callable
+        Sleep function in seconds.
+    '''
+    def __init__(self, timeout=30.0, stable_seconds=1.0, poll_interval=0.25,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.timeout = timeout
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.reset()
+
+    def reset(self):
+        '''
+        Function forgets the probes of a previous flight start.
+        '''
+        self.sim_rate = None
+        self.sim_rate_since = None
+        self.probes = 0
+        self.reason = None
+        return
+
+    def check(self, values):
+        '''
+        Function checks one probe of PROBE_SIMVARS.
+
+        Parameters
+        ----------
+        values : Dictionary
+            SimVar key -> value.
+
+        Returns
+        -------
+        ready : Bool
+        reason : String or None
+            What the sim is still waiting for; None when ready.
+
+        '''
+        now = self.clock()
+        self.probes += 1
+        sim_rate = values.get("SIMULATION_RATE")
+        if sim_rate != self.sim_rate:
+            self.sim_rate = sim_rate
+            self.sim_rate_since = now
+        lat = values.get("PLANE_LATITUDE")
+        lon = values.get("PLANE_LONGITUDE")
+        alt = values.get("PLANE_ALTITUDE")
+        if type(lat) != float or type(lon) != float or type(alt) != float:
+            self.reason = "position"
+        elif is_menu_position(lat, lon, alt):
+            self.reason = "position"
+        elif not values.get("ATC_MODEL"):
+            self.reason = "aircraft"
+        elif (type(sim_rate) not in (int, float) or sim_rate <= 0 or
+              now - self.sim_rate_since < self.stable_seconds):
+            self.reason = "sim rate"
+        else:
+            self.reason = None
+        return self.reason is None, self.reason
+
+    def wait(self, read, progress=None, running=None):
+        '''
+        Function probes the sim until it is ready or the timeout passes.
+
+        Parameters
+        ----------
+        read : Callable
+            Reads a list of SimVar keys into a dictionary.
+        progress : Callable, optional
+            Called with (reason, seconds left) after every probe that is not
+            ready, i.e. for a status message.
+        running : Callable, optional
+            Returns False to give up waiting, i.e. when the recorder stops.
+
+        Returns
+        -------
+        ready : Bool
+            False when the timeout passed or waiting was given up.
+
+        '''
+        self.reset()
+        start = self.clock()
+        while running is None or running():
+            ready, reason = self.check(read(PROBE_SIMVARS))
+            if ready:
+                return True
+            left = self.timeout - (self.clock() - start)
+            if left <= 0:
+                return False
+            if progress is not None:
+                progress(reason, left)
+            self.sleep(min(self.poll_interval, left))
+        return False
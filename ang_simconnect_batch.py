@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Batched SimConnect sampling.
+
+AircraftRequests.get makes one blocking round-trip per SimVar. SimVarBatch
+registers a list of SimVars as a single SimConnect data definition and reads
+all of them back in one response, so every value of a sample comes from the
+same sim frame. String SimVars cannot share a float64 data definition and are
+read one by one with AircraftRequests.get.
+
+@author: ANG
+"""
+import threading
+
+# SimConnect SDK values
+SIMCONNECT_DATATYPE_FLOAT64 = 4
+SIMCONNECT_SIMOBJECT_TYPE_USER = 0
+SIMCONNECT_UNUSED = 0xFFFFFFFF
+
+def install_batch_dispatch(_SM):
+    '''
+    Function wraps the SimConnect dispatch procedure so responses to batch
+    requests are handed to their SimVarBatch. Every other message is passed
+    on to the default SimConnect dispatch. Installed once per connection.
+
+    Parameters
+    ----------
+    _SM : SimConnect object.
+
+    Returns
+    -------
+    batch_requests : Dictionary
+        Request id -> SimVarBatch.
+
+    '''
+    if getattr(_SM, 'batch_requests', None) is not None:
+        return _SM.batch_requests
+    from ctypes import POINTER, addressof, c_double, cast
+    from SimConnect.Enum import (SIMCONNECT_RECV_ID,
+                                 SIMCONNECT_RECV_SIMOBJECT_DATA_BYTYPE,
+                                 DispatchProc)
+    _SM.batch_requests = {}
+    default_dispatch = _SM.my_dispatch_proc
+    data_offset = SIMCONNECT_RECV_SIMOBJECT_DATA_BYTYPE.dwData.offset
+
+    def batch_dispatch(pData, cbData, pContext):
+        if pData.contents.dwID == SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_SIMOBJECT_DATA_BYTYPE:
+            pObjData = cast(pData, POINTER(SIMCONNECT_RECV_SIMOBJECT_DATA_BYTYPE)).contents
+            batch = _SM.batch_requests.get(pObjData.dwRequestID)
+            if batch is not None:
+                values = cast(addressof(pObjData) + data_offset,
+                              POINTER(c_double * len(batch.float_simvars))).contents
+                batch.receive(list(values))
+                return
+        default_dispatch(pData, cbData, pContext)
+
+    # The SimConnect run loop reads my_dispatch_proc_rd on every CallDispatch
+    _SM.my_dispatch_proc_rd = DispatchProc(batch_dispatch)
+    return _SM.batch_requests
+
+class SimVarBatch(object):
+    '''
+    Class reads a fixed list of SimVars with one SimConnect request.
+
+    Parameters
+    ----------
+    _SM : SimConnect object.
+    _AQ : SimConnect Aircraft Requests object.
+        Used to look up SimVar names and units, and to read string SimVars.
+    simvars : List
+        SimVar keys as used with _AQ.get i.e. "GENERAL_ENG_RPM:1".
+    timeout : Float
+        Seconds to wait for a response before giving up on a sample.
+    '''
+    def __init__(self, _SM, _AQ, simvars, timeout=0.5):
+        self._SM = _SM
+        self._AQ = _AQ
+        self.simvars = list(simvars)
+        self.timeout = timeout
+        self.float_simvars = []
+        self.other_simvars = []
+        self.values = None
+        self.requests_sent = 0
+        self._received = threading.Event()
+        self._define()
+
+    def _define(self):
+        batch_requests = install_batch_dispatch(self._SM)
+        self.definition_id = self._SM.new_def_id().value
+        self.request_id = self._SM.new_request_id().value
+        for key in self.simvars:
+            request = self._AQ.find(key)
+            if request is None:
+                self.other_simvars.append(key)
+                continue
+            # find() re-indexes a shared request object, copy the definition now
+            name, units = request.definitions[0]
+            if b'string' in units.lower():
+                self.other_simvars.append(key)
+                continue
+            self._SM.dll.AddToDataDefinition(self._SM.hSimConnect,
+                                             self.definition_id, name, units,
+                                             SIMCONNECT_DATATYPE_FLOAT64, 0,
+                                             SIMCONNECT_UNUSED)
+            self.float_simvars.append(key)
+        batch_requests[self.request_id] = self
+        return
+
+    def receive(self, values):
+        '''
+        Function is called by the dispatch procedure with the values of one
+        response, in float_simvars order.
+        '''
+        self.values = values
+        self._received.set()
+        return
+
+    def request(self):
+        '''
+        Function sends one request for all float SimVars and waits for the
+        response.
+
+        Returns
+        -------
+        values : List or None
+            Values in float_simvars order, None on timeout.
+
+        '''
+        self._received.clear()
+        self.values = None
+        self.requests_sent += 1
+        self._SM.dll.RequestDataOnSimObjectType(self._SM.hSimConnect,
+                                                self.request_id,
+                                                self.definition_id, 0,
+                                                SIMCONNECT_SIMOBJECT_TYPE_USER)
+        if not self._received.wait(self.timeout):
+            return None
+        return self.values
+
+    def get_sample(self):
+        '''
+        Function reads every SimVar of the batch.
+
+        Returns
+        -------
+        sample : Dictionary
+            SimVar key -> value. Values are None if SimConnect did not answer.
+
+        '''
+        values = self.request()
+        if values is None:
+            sample = dict.fromkeys(self.float_simvars)
+        else:
+            sample = dict(zip(self.float_simvars, values))
+        for key in self.other_simvars:
+            sample[key] = self._AQ.get(key)
+        return sample
+
+def get_sequential_sample(_AQ, simvars):
+    '''
+    Function reads SimVars one round-trip at a time (the unbatched path).
+
+    Returns
+    -------
+    sample : Dictionary
+        SimVar key -> value.
+
+    '''
+    sample = {key:_AQ.get(key) for key in simvars}
+    return sample
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+In-process telemetry bus.
+
+While recording, the dashboard used to poll SimConnect for values the
+recorder had just read. The TelemetryBus keeps the latest value of every
+SimVar anyone has read: the recorder publishes each sample it takes, and the
+recorder, the dashboard and any other consumer read the latest snapshot at
+their own rate. A consumer only goes to SimConnect (through the sampling
+engine) for values that nobody has published recently, see fetch.
+
+A publisher that samples values periodically passes its period: a value then
+stays fresh until the publisher's next sample is due, on top of the max_age of
+the consumer. While recording, the dashboard so reuses the main group sample
+even when the main group runs slower than the dashboard refresh (1 Hz, or
+0.25 Hz in cruise), instead of reading those values again.
+
+Every publish replaces the snapshot as a whole under a lock, so a reader
+never sees half of one sample and half of another.
+
+@author: ANG
+"""
+import threading
+import time
+
+class Snapshot(object):
+    '''
+    Class is the telemetry seen by a consumer.
+
+    Attributes
+    ----------
+    values : Dictionary
+        SimVar key -> latest value.
+    sequence : Integer
+        Publish count when the snapshot was taken.
+    times : Dictionary
+        SimVar key -> clock time it was published.
+    '''
+    def __init__(self, values, sequence, times):
+        self.values = values
+        self.sequence = sequence
+        self.times = times
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+class TelemetryBus(object):
+    '''
+    Class holds the latest published telemetry.
+
+    Parameters
+    ----------
+    clock : Callable
+        Monotonic clock in seconds used for the age of values.
+    '''
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.values = {}
+        self.times = {}
+        self.periods = {}
+        self.sequence = 0
+        self.publishes = 0
+        self.fetches = 0
+        self.fetched_keys = 0
+        self.reused_keys = 0
+
+    def publish(self, values, period=None):
+        '''
+        Function publishes values read from SimConnect. None values (failed
+        reads) do not replace the last good value.
+
+        Parameters
+        ----------
+        values : Dictionary
+            SimVar key -> value.
+        period : Float, optional
+            Seconds until the publisher samples these values again, i.e. the
+            period of a channel group; None for one-off reads.
+
+        Returns
+        -------
+        sequence : Integer
+            Sequence number of the new snapshot.
+
+        '''
+        now = self.clock()
+        fresh = {k:v for k, v in values.items() if v is not None}
+        with self.lock:
+            # Copy on write: snapshots already handed out never change
+            self.values = dict(self.values, **fresh)
+            self.times = dict(self.times, **dict.fromkeys(fresh, now))
+            self.periods = dict(self.periods, **dict.fromkeys(fresh, period or 0.0))
+            self.sequence += 1
+            self.publishes += 1
+            return self.sequence
+
+    def latest(self, keys=None, max_age=None):
+        '''
+        Function returns the latest snapshot.
+
+        Parameters
+        ----------
+        keys : List, optional
+            SimVar keys wanted; defaults to all.
+        max_age : Float, optional
+            Leave out values published more than max_age seconds, plus their
+            publish period, ago.
+
+        Returns
+        -------
+        snapshot : Snapshot
+
+        '''
+        with self.lock:
+            values, times, periods, sequence = (self.values, self.times,
+                                                self.periods, self.sequence)
+        if keys is None:
+            keys = values.keys()
+        oldest = None if max_age is None else self.clock() - max_age
+        snapshot = Snapshot({k:values[k] for k in keys if k in values and
+                             (oldest is None or times[k] + periods[k] >= oldest)},
+                            sequence, times)
+        return snapshot
+
+    def fetch(self, keys, max_age, engine=None):
+        '''
+        Function returns the given SimVars, reusing published values younger
+        than max_age plus their publish period. Only the missing or stale
+        values are read, through the sampling engine, and published for the
+        other consumers.
+
+        Parameters
+        ----------
+        keys : List
+            SimVar keys.
+        max_age : Float
+            Seconds a published value may be reused.
+        engine : SamplingEngine, optional
+            Engine reading missing values; without one they are left out.
+
+        Returns
+        -------
+        values : Dictionary
+            SimVar key -> value.
+
+        '''
+        values = self.latest(keys, max_age).values
+        missing = [key for key in keys if key not in values]
+        self.fetches += 1
+        self.reused_keys += len(values)
+        if missing and engine is not None:
+            read = engine.call(engine.get_many(missing))
+            self.fetched_keys += len(missing)
+            self.publish(read)
+            values.update(read)
+        return values
+
+    def stats(self):
+        '''
+        Function returns the bus counters.
+
+        Returns
+        -------
+        stats : Dictionary
+
+        '''
+        stats = {"sequence":self.sequence,
+                 "publishes":self.publishes,
+                 "fetches":self.fetches,
+                 "fetched_keys":self.fetched_keys,
+                 "reused_keys":self.reused_keys,
+                 }
+        return stats
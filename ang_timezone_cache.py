@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Cached timezone lookup for flight time stamps.
+
+TimezoneFinder polygon lookups are expensive and the aircraft spends minutes
+inside the same timezone. TimezoneResolver splits the globe into grid cells
+of cell_deg degrees and only runs a full lookup when the aircraft enters a
+new cell. A cell is cached when its centre and corners all fall in the same
+timezone; cells crossed by a timezone border keep doing full lookups.
+
+Samples are time stamped with EpochClock in UTC nanoseconds; utc_offset gives
+the offset to local time, which the recorder stores once per timezone segment
+instead of with every sample.
+
+@author: ANG
+"""
+import math
+import time
+import functools
+from collections import OrderedDict
+from datetime import datetime
+import pytz
+import timezonefinder
+
+MIXED_CELL = object()
+NS_PER_SECOND = 1000000000
+# UTC offsets are re-checked this often, for daylight saving changes
+OFFSET_CHECK_NS = 60 * NS_PER_SECOND
+
+class EpochClock(object):
+    '''
+    Class returns UTC time stamps in integer nanoseconds since the epoch that 
+    never go backwards. The wall clock is read once; after that time advances 
+    on the monotonic clock, so clock adjustments during a flight do not 
+    reorder samples.
+    '''
+    def __init__(self, wall_ns=time.time_ns, monotonic_ns=time.monotonic_ns):
+        self.monotonic_ns = monotonic_ns
+        self.origin_ns = wall_ns() - monotonic_ns()
+
+    def __call__(self):
+        return self.origin_ns + self.monotonic_ns()
+
+@functools.lru_cache(maxsize=64)
+def get_pytz_timezone(timezone_str):
+    '''
+    Function returns the pytz timezone for a timezone name; recently used
+    timezones are kept in an LRU cache.
+
+    Returns
+    -------
+    timezone : pytz timezone
+
+    '''
+    timezone = pytz.timezone(timezone_str)
+    return timezone
+
+class TimezoneResolver(object):
+    '''
+    Class resolves the timezone of a latitude/longitude with a grid cell cache.
+
+    Parameters
+    ----------
+    _TF : TimezoneFinder, optional
+        Timezone finder used for full lookups.
+    cell_deg : Float
+        Grid cell size in degrees.
+    max_cells : Integer
+        Number of grid cells kept in the cell cache.
+    '''
+    def __init__(self, _TF=None, cell_deg=0.25, max_cells=4096):
+        self._TF = _TF if _TF is not None else timezonefinder.TimezoneFinder()
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        self.cells = OrderedDict()
+        self.current_cell = None
+        self.current_zone = None
+        self.last_zone = None
+        self.full_lookups = 0
+        self.failed_cells = set()
+        self.offset_zone = None
+        self.offset = None
+        self.offset_checked_ns = None
+
+    def cell_of(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def lookup(self, lat, lon):
+        '''
+        Function does a full TimezoneFinder lookup. Over the ocean
+        certain_timezone_at has no answer and the Etc/GMT zone is used.
+
+        Returns
+        -------
+        timezone_str : String or None
+
+        '''
+        self.full_lookups += 1
+        timezone_str = self._TF.certain_timezone_at(lat=lat, lng=lon)
+        if timezone_str is None:
+            timezone_str = self._TF.timezone_at(lat=lat, lng=lon)
+        return timezone_str
+
+    def _resolve_cell(self, cell):
+        lat0 = cell[0] * self.cell_deg
+        lon0 = cell[1] * self.cell_deg
+        edge = self.cell_deg * 0.999
+        points = [(lat0 + self.cell_deg / 2, lon0 + self.cell_deg / 2),
+                  (lat0, lon0), (lat0 + edge, lon0),
+                  (lat0, lon0 + edge), (lat0 + edge, lon0 + edge)]
+        names = set()
+        for lat, lon in points:
+            names.add(self.lookup(max(min(lat, 90.0), -90.0),
+                                  (lon + 180.0) % 360.0 - 180.0))
+        if len(names) == 1 and None not in names:
+            return names.pop()
+        return MIXED_CELL
+
+    def timezone_at(self, lat, lon):
+        '''
+        Function returns the pytz timezone at a position. When the position is
+        unknown, or cannot be resolved, the last known timezone (or UTC) is
+        returned; a failed lookup is reported once per grid cell.
+
+        Parameters
+        ----------
+        lat : Float
+            Latitude in degrees.
+        lon : Float
+            Longitude in degrees.
+
+        Returns
+        -------
+        timezone : pytz timezone
+
+        '''
+        if lat is None or lon is None or math.isnan(lat) or math.isnan(lon):
+            return self.last_zone if self.last_zone is not None else pytz.utc
+        cell = self.cell_of(lat, lon)
+        if cell == self.current_cell and self.current_zone is not None:
+            return self.current_zone
+        try:
+            if cell in self.cells:
+                self.cells.move_to_end(cell)
+                cell_zone = self.cells[cell]
+            else:
+                cell_zone = self._resolve_cell(cell)
+                self.cells[cell] = cell_zone
+                if len(self.cells) > self.max_cells:
+                    self.cells.popitem(last=False)
+            if cell_zone is MIXED_CELL:
+                # Border cell: resolve the exact position every time
+                self.current_cell = None
+                self.current_zone = None
+                timezone_str = self.lookup(lat, lon)
+                timezone = get_pytz_timezone(timezone_str)
+            else:
+                timezone = get_pytz_timezone(cell_zone)
+                self.current_cell = cell
+                self.current_zone = timezone
+        except (ValueError, pytz.UnknownTimeZoneError) as e:
+            # Out of range positions and positions with no timezone
+            if cell not in self.failed_cells:
+                self.failed_cells.add(cell)
+                print(f'Timezone lookup failed in cell {cell} ({e!r}). Using last known timezone.')
+            return self.last_zone if self.last_zone is not None else pytz.utc
+        self.last_zone = timezone
+        return timezone
+
+    def local_time(self, lat, lon, dt=None):
+        '''
+        Function returns the local time at a position.
+
+        Parameters
+        ----------
+        lat : Float
+            Latitude in degrees.
+        lon : Float
+            Longitude in degrees.
+        dt : datetime, optional
+            UTC time; defaults to now.
+
+        Returns
+        -------
+        timestamp : datetime
+            Local time.
+
+        '''
+        if dt is None:
+            dt = datetime.utcnow()
+        timestamp = dt + self.timezone_at(lat, lon).utcoffset(dt)
+        return timestamp
+
+    def utc_offset(self, lat, lon, time_ns):
+        '''
+        Function returns the UTC offset at a position and time. The offset of 
+        the current timezone is reused for OFFSET_CHECK_NS.
+
+        Parameters
+        ----------
+        lat : Float
+            Latitude in degrees.
+        lon : Float
+            Longitude in degrees.
+        time_ns : Integer
+            UTC time in nanoseconds since the epoch.
+
+        Returns
+        -------
+        offset : Integer
+            UTC offset in seconds.
+        zone : String
+            Timezone name.
+
+        '''
+        timezone = self.timezone_at(lat, lon)
+        if (timezone is not self.offset_zone or
+                abs(time_ns - self.offset_checked_ns) >= OFFSET_CHECK_NS):
+            dt = datetime.utcfromtimestamp(time_ns // NS_PER_SECOND)
+            self.offset = int(timezone.utcoffset(dt).total_seconds())
+            self.offset_zone = timezone
+            self.offset_checked_ns = time_ns
+        return self.offset, str(timezone)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of event triggered burst capture.
+
+@author: ANG
+"""
+import pytest
+import ang_flight_buffer as angfb
+import ang_burst_capture as angburst
+
+RATE_HZ = 10.0
+
+def make_burst():
+    schema = angfb.FlightSchema([("TIME_NS", 'q'), ("STALL_WARNING", 'd'),
+                                 ("G_FORCE", 'd')])
+    # 10 samples before, 5 after, at most 30 per segment
+    return angburst.BurstCapture(schema, {"STALL_WARNING":(None, 0.5),
+                                          "G_FORCE":(-1.0, 3.0)},
+                                 rate_hz=RATE_HZ, pre_seconds=1.0,
+                                 post_seconds=0.5, max_seconds=3.0)
+
+class Feeder(object):
+    def __init__(self, burst):
+        self.burst = burst
+        self.t = 0
+        self.done = []
+
+    def feed(self, count, stall=0.0, g=1.0):
+        for i in range(count):
+            segment = self.burst.add([self.t, stall, g])
+            self.t += 1
+            if segment is not None:
+                self.done.append(segment)
+
+def test_untripped_samples_only_fill_the_ring():
+    burst = make_burst()
+    feeder = Feeder(burst)
+    feeder.feed(50)
+    assert feeder.done == []
+    assert burst.segment is None
+    assert [row[0] for row in burst.ring] == list(range(40, 50))
+
+def test_segment_has_pre_trigger_samples_and_post_window():
+    burst = make_burst()
+    feeder = Feeder(burst)
+    feeder.feed(20)
+    feeder.feed(3, stall=1.0)
+    assert burst.segment is not None
+    # The post window restarts with every tripped sample
+    feeder.feed(4)
+    assert feeder.done == []
+    feeder.feed(1)
+    assert len(feeder.done) == 1
+    info, rows = feeder.done[0]
+    assert [row[0] for row in rows] == list(range(10, 28))
+    assert info["index"] == 1
+    assert info["trigger"] == "STALL_WARNING"
+    assert info["trigger_time"] == 20
+    assert info["trigger_sample"] == 10
+    assert info["samples"] == 18
+    assert rows[info["trigger_sample"]][0] == info["trigger_time"]
+
+def test_short_flight_start_has_fewer_pre_trigger_samples():
+    burst = make_burst()
+    feeder = Feeder(burst)
+    feeder.feed(3)
+    feeder.feed(1, g=4.5)
+    info, rows = burst.finish()
+    assert info["trigger"] == "G_FORCE"
+    assert info["trigger_sample"] == 3
+    assert info["samples"] == 4
+
+def test_trigger_that_stays_on_is_cut_at_max_seconds():
+    burst = make_burst()
+    feeder = Feeder(burst)
+    feeder.feed(10)
+    feeder.feed(100, stall=1.0)
+    assert len(feeder.done) == 1
+    info, rows = feeder.done[0]
+    assert len(rows) == info["samples"] == 30
+    # Only a rising edge starts a segment, not a trigger that stays on
+    assert burst.segment is None
+    feeder.feed(2)
+    feeder.feed(1, stall=1.0)
+    assert burst.segment is not None
+    assert burst.segment[0]["index"] == 2
+
+def test_finish_returns_open_segment():
+    burst = make_burst()
+    feeder = Feeder(burst)
+    feeder.feed(12)
+    feeder.feed(1, stall=1.0)
+    feeder.feed(2)
+    info, rows = burst.finish()
+    assert info["samples"] == len(rows) == 13
+    assert burst.finish() is None
+    burst.reset()
+    assert burst.segments == 0 and len(burst.ring) == 0
+
+def test_trigger_channel_must_be_sampled():
+    schema = angfb.FlightSchema([("TIME_NS", 'q'), ("G_FORCE", 'd')])
+    with pytest.raises(ValueError):
+        angburst.BurstCapture(schema, {"STALL_WARNING":(None, 0.5)})
+
+def test_default_triggers_ignore_normal_climb_and_descent():
+    pytest.importorskip("timezonefinder")
+    import ang_fake_simconnect as angfake
+    angfake.install()
+    import ANG_Flight_Recorder_v_0_5 as angflightrec
+    burst = angflightrec.get_burst_capture()
+    names = burst.schema.names
+    # Jet climbing at 4000 and descending at 3500 feet/minute
+    profile = angfake.FlightProfile(duration=3600.0, cruise_alt=35000.0, cruise_speed=450.0, 
+                                    climb_fpm=4000.0, descent_fpm=3500.0)
+    for t in range(0, 3600, 5):
+        state = profile.state(float(t), 0.0)
+        row = [state.get(name, 0.0) for name in names]
+        # The fake sim warns above its own speed limit
+        row[names.index("OVERSPEED_WARNING")] = 0.0
+        assert burst.check(row) is None, t
+    row = [0.0] * len(names)
+    row[names.index("G_FORCE")] = 1.0
+    row[names.index("VERTICAL_SPEED")] = -7000.0
+    assert burst.check(row) == ("VERTICAL_SPEED", -7000.0)
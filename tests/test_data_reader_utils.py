@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the CSV conversion bookkeeping in ang_data_reader_utils.
+
+@author: ANG
+"""
+import os
+import pickle
+import pytest
+
+pytest.importorskip("pandas")
+import ang_data_reader_utils as angdru
+import ang_conversion_manifest as angman
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb'):
+        pass
+    return
+
+def test_csv_flight_nums_top_level_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert angdru.get_csv_flight_nums() == []
+    for name in ('f1.csv', 'f12.csv', 'f3.csv.tmp', 'f4.csv.bak', 'notes.txt',
+                 'f5_old.csv', 'old/f9.csv'):
+        touch(f'data_csv/flight_data/{name}')
+    os.makedirs('data_csv/flight_data/f7.csv')
+    assert sorted(angdru.get_csv_flight_nums()) == ['f1', 'f12']
+
+def test_csv_flight_headers_top_level_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert angdru.get_csv_flight_headers() == []
+    for name in ('f1_Flight_Header.csv', 'f2_Flight_Header.csv.tmp',
+                 'f3_notes.txt', 'old/f9_Flight_Header.csv'):
+        touch(f'data_csv/flight_headers/{name}')
+    assert angdru.get_csv_flight_headers() == ['f1']
+
+def record_flight(flight_num):
+    os.makedirs(f'data/{flight_num}', exist_ok=True)
+    for name in (f'{flight_num}.pkl', f'{flight_num}_Flight_Header.pkl'):
+        with open(f'data/{flight_num}/{name}', 'wb') as fp:
+            pickle.dump({"TIME_NS":[1, 2]}, fp)
+    return
+
+def test_check_convert_does_not_save_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    record_flight('f1')
+    record_flight('f2')
+    touch('data_csv/flight_data/f1.csv')
+    touch('data_csv/flight_headers/f2_Flight_Header.csv')
+    manifest = angman.ConversionManifest()
+    assert angdru.check_convert_flights_to_csv(manifest=manifest) == ['f2']
+    assert angdru.check_convert_headers_to_csv(manifest=manifest) == ['f1']
+    # f1.csv and f2_Flight_Header.csv predate the manifest and are recorded
+    assert manifest.dirty
+    assert not os.path.exists(angman.MANIFEST_PATH)
+    assert angdru.check_convert_flights_to_csv() == ['f2']
+    assert not os.path.exists(angman.MANIFEST_PATH)
+
+    # The single flight converter saves what the check recorded
+    angdru.convert_single_flight_to_csv('f1')
+    assert set(angman.ConversionManifest().entries[angman.FLIGHTS]) == {'f1'}
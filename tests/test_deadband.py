@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of deadband encoded flight logs: the dense expansion of every float
+channel stays within the channel tolerance and other channels are exact.
+
+@author: ANG
+"""
+import math
+import random
+import ang_deadband as angdb
+import ang_flight_log as angfl
+
+FIELDS = [("PLANE_ALTITUDE", 'd'), ("AIRSPEED_INDICATED", 'd'),
+          ("GENERAL_ENG_RPM:1", 'd'), ("TIME_NS", 'q'), ("FUEL_STATE", 'q'),
+          ("ATC_MODEL", 'object')]
+TOLERANCES = {"PLANE_ALTITUDE":5.0, "AIRSPEED_INDICATED":0.5, "GENERAL_ENG_RPM":10.0}
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    alt, ias, rpm = 0.0, 0.0, 800.0
+    for i in range(count):
+        alt += rng.uniform(-3.0, 8.0)
+        ias += rng.uniform(-0.4, 0.6)
+        rpm += rng.choice([0.0, 0.0, 4.0, -25.0])
+        rows.append([alt, ias if i % 50 else float('nan'), rpm,
+                     1700000000000000000 + i * 100000000 + rng.randint(0, 999),
+                     rng.choice([0, 0, 0, 1, 2**40]), "A320" if i < count // 2 else "A321"])
+    return rows
+
+def check_within_tolerance(flight, rows, start=0):
+    for j, (name, dtype) in enumerate(FIELDS):
+        column = list(flight[name])[start:]
+        assert len(column) == len(rows)
+        original = [row[j] for row in rows]
+        if dtype == 'd':
+            tol = angdb.tolerance_for(TOLERANCES, name)
+            for got, want in zip(column, original):
+                if math.isnan(want):
+                    assert math.isnan(got)
+                else:
+                    assert abs(got - want) <= tol
+        else:
+            assert column == original
+
+def test_encode_apply_round_trip():
+    rows = make_rows(500)
+    encoder = angdb.DeadbandEncoder(FIELDS, TOLERANCES)
+    last = [None] * len(FIELDS)
+    decoded = [angdb.apply_delta(last, encoder.encode(row)) for row in rows]
+    for got_row, row in zip(decoded, rows):
+        for (name, dtype), got, want in zip(FIELDS, got_row, row):
+            if dtype != 'd':
+                assert got == want
+            elif math.isnan(want):
+                assert math.isnan(got)
+            else:
+                assert abs(got - want) <= angdb.tolerance_for(TOLERANCES, name)
+    # Slow channels are stored a lot less than every sample
+    assert encoder.values_stored < len(rows) * len(FIELDS) / 2
+
+def test_log_round_trip_within_tolerance(tmp_path):
+    log_path = str(tmp_path / "f1.log")
+    rows = make_rows(600)
+    encoder = angdb.DeadbandEncoder(FIELDS, TOLERANCES)
+    for n in range(0, len(rows), 25):
+        angfl.append_rows(log_path, FIELDS, rows[n:n + 25], fsync=False, encoder=encoder)
+    flight = angfl.load_flight_log(log_path)
+    check_within_tolerance(flight, rows)
+    assert type(flight["TIME_NS"]) is not type(flight["PLANE_ALTITUDE"])
+    assert flight["TIME_NS"].typecode == 'q'
+
+def test_deadband_frame_mid_log(tmp_path):
+    log_path = str(tmp_path / "f1.log")
+    rows = make_rows(300, seed=2)
+    # Dense frames first, then the writer switches to deadband encoding
+    angfl.append_rows(log_path, FIELDS, rows[:100], fsync=False)
+    encoder = angdb.DeadbandEncoder(FIELDS, TOLERANCES)
+    for n in range(100, len(rows), 40):
+        angfl.append_rows(log_path, FIELDS, rows[n:n + 40], fsync=False, encoder=encoder)
+    kinds = [kind for kind, payload in angfl.read_frames(log_path)]
+    assert kinds[:3] == ['schema', 'rows', 'deadband']
+    assert kinds[3:] == ['deltas'] * (len(kinds) - 3)
+    flight = angfl.load_flight_log(log_path)
+    assert [list(flight[name])[:100] for name, dtype in FIELDS if dtype != 'd'] == \
+        [[row[j] for row in rows[:100]] for j, (name, dtype) in enumerate(FIELDS) if dtype != 'd']
+    check_within_tolerance(flight, rows[100:], start=100)
+
+def test_zero_tolerance_is_exact(tmp_path):
+    log_path = str(tmp_path / "f1.log")
+    rows = make_rows(200, seed=3)
+    encoder = angdb.DeadbandEncoder(FIELDS)
+    angfl.append_rows(log_path, FIELDS, rows, fsync=False, encoder=encoder)
+    flight = angfl.load_flight_log(log_path)
+    for j, (name, dtype) in enumerate(FIELDS):
+        for got, want in zip(flight[name], [row[j] for row in rows]):
+            assert got == want or math.isnan(got) and math.isnan(want)
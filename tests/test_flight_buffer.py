@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the typed columnar flight buffer.
+
+@author: ANG
+"""
+import math
+import pickle
+import pytest
+import ang_flight_buffer as angfb
+
+def make_buffer():
+    schema = angfb.FlightSchema([("PLANE_ALTITUDE", 'd'), ("TIME_NS", 'q'),
+                                 ("ATC_MODEL", angfb.OBJECT)],
+                                omitted={"GENERAL_ENG_RPM:3":"no engine 3"})
+    buffer = angfb.FlightBuffer(schema)
+    buffer.append_row([1000.5, 1700000000000000000, "A320"])
+    buffer.append_sample({"TIME_NS":1700000001000000000, "ATC_MODEL":"A320"})
+    buffer.timezones.append((1700000000000000000, 3600, "Europe/Paris"))
+    buffer.phases.append((1, 1700000001000000000, "taxi"))
+    return buffer
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_flight_buffer_pickle_round_trip(protocol):
+    buffer = make_buffer()
+    loaded = pickle.loads(pickle.dumps(buffer, protocol=protocol))
+    assert isinstance(loaded, angfb.FlightBuffer)
+    assert list(loaded) == list(buffer)
+    assert type(loaded["PLANE_ALTITUDE"]) is angfb.FloatColumn
+    assert type(loaded["TIME_NS"]) is angfb.IntColumn
+    assert type(loaded["ATC_MODEL"]) is list
+    assert loaded["PLANE_ALTITUDE"][0] == 1000.5
+    assert math.isnan(loaded["PLANE_ALTITUDE"][1])
+    assert list(loaded["TIME_NS"]) == list(buffer["TIME_NS"])
+    assert loaded["ATC_MODEL"] == ["A320", "A320"]
+    assert loaded.schema.fields == buffer.schema.fields
+    assert loaded.schema.omitted == buffer.schema.omitted
+    assert loaded.timezones == buffer.timezones
+    assert loaded.phases == buffer.phases
+    assert loaded.num_samples == 2
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_column_pickle_keeps_type(protocol):
+    for column in (angfb.FloatColumn([1.0, 2.5]), angfb.IntColumn([1, -2])):
+        loaded = pickle.loads(pickle.dumps(column, protocol=protocol))
+        assert type(loaded) is type(column)
+        assert loaded.typecode == column.typecode
+        assert loaded == column
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the flight catalog upsert.
+
+@author: ANG
+"""
+import ang_flight_catalog as angcat
+
+def test_upsert_adds_then_updates(tmp_path):
+    catalog = angcat.FlightCatalog(str(tmp_path / 'catalog.sqlite'))
+    catalog.add_flight('f3', {"ATC_MODEL":"C172", "LOCAL_TIME":"2024-09-01T10:00:00"})
+    row = catalog.get('f3')
+    assert row["number"] == 3
+    assert row["ATC_MODEL"] == 'C172'
+    assert row["status"] == angcat.RECORDING
+    assert row["csv_converted"] is None
+
+    # Updating some columns keeps the others
+    catalog.set_converted('f3', csv=True)
+    row = catalog.get('f3')
+    assert row["csv_converted"] == 1
+    assert row["ATC_MODEL"] == 'C172'
+    assert row["status"] == angcat.RECORDING
+
+    catalog.add_flight('f3', {"ATC_MODEL":"A320", "LOCAL_TIME":"2024-09-01T10:00:00"})
+    assert catalog.get('f3')["ATC_MODEL"] == 'A320'
+    assert catalog.get('f3')["csv_converted"] == 1
+    assert len(catalog.find()) == 1
+
+def test_set_converted_on_new_flight(tmp_path):
+    catalog = angcat.FlightCatalog(str(tmp_path / 'catalog.sqlite'))
+    catalog.set_converted('f12', header_csv=True)
+    catalog.add_flight('f2', {"ATC_MODEL":"C172"})
+    assert [f["flight_num"] for f in catalog.find()] == ['f2', 'f12']
+    assert catalog.get('f12')["header_csv_converted"] == 1
+    assert catalog.get('f12')["ATC_MODEL"] is None
+    assert [f["flight_num"] for f in catalog.find(model='C172')] == ['f2']
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the columnar .npy flight store, written without NumPy and read
+back with NumPy.
+
+@author: ANG
+"""
+import math
+import os
+import pytest
+import ang_flight_buffer as angfb
+import ang_flight_columns as angcols
+
+np = pytest.importorskip("numpy")
+
+T0 = 1700000000000000000
+
+def make_flight(num_samples=1000):
+    schema = angfb.FlightSchema([("TIME_NS", 'q'), ("PLANE_ALTITUDE", 'd'),
+                                 ("GENERAL_ENG_RPM:1", 'd'), ("ATC_MODEL", angfb.OBJECT)],
+                                omitted={"GENERAL_ENG_RPM:2":"no engine 2"})
+    flight = angfb.FlightBuffer(schema)
+    for i in range(num_samples):
+        flight.append_row([T0 + i * 100000000, 500.0 + i * 0.5,
+                           None if i % 7 == 0 else 2400.0 + i, "C172"])
+    flight.timezones = [(T0, -14400, "America/Toronto"),
+                        (T0 + 50000000000, -18000, "America/Chicago")]
+    flight.phases = [(0, T0, "taxi"), (300, T0 + 30000000000, "takeoff")]
+    return flight
+
+@pytest.mark.parametrize("dtype, values", [
+    ('d', [0.0, -1.5, 1e300, float('inf'), None]),
+    ('q', [0, -1, 2**62, T0]),
+    ('d', []),
+    ('q', []),
+])
+def test_write_npy_reads_with_numpy(tmp_path, dtype, values):
+    file_path = str(tmp_path / "c0000.npy")
+    nbytes = angcols.write_npy(file_path, values, dtype)
+    assert nbytes == os.path.getsize(file_path)
+    want = [float('nan') if v is None else v for v in values]
+    for mmap_mode in (None, 'r'):
+        loaded = np.load(file_path, mmap_mode=mmap_mode)
+        assert loaded.dtype == np.dtype(angcols.NPY_DESCR[dtype])
+        assert loaded.shape == (len(values),)
+        np.testing.assert_array_equal(loaded, np.array(want, dtype=loaded.dtype))
+    # Data starts on the aligned boundary
+    with open(file_path, 'rb') as fp:
+        typecode, length, offset = angcols.read_npy_header(fp)
+    assert (typecode, length, offset % angcols.NPY_ALIGN) == (dtype, len(values), 0)
+    column = angcols.read_npy(file_path)
+    assert column.typecode == dtype
+    assert len(column) == len(values)
+
+def test_numpy_written_npy_reads_back(tmp_path):
+    file_path = str(tmp_path / "c0000.npy")
+    np.save(file_path, np.arange(5, dtype='<i8'))
+    assert list(angcols.read_npy(file_path)) == [0, 1, 2, 3, 4]
+
+def test_column_store_round_trip(tmp_path):
+    flight = make_flight()
+    dir_path = str(tmp_path / "f1.cols")
+    angcols.write_columns(dir_path, flight)
+    assert not os.path.exists(dir_path + '.tmp')
+    schema = angcols.read_schema(dir_path)
+    assert schema["num_samples"] == 1000
+    assert [tuple(t) for t in schema["timezones"]] == flight.timezones
+    assert [tuple(p) for p in schema["phases"]] == flight.phases
+    assert schema["omitted"] == flight.schema.omitted
+    for read in (angcols.read_npy, np.load, lambda path: np.load(path, mmap_mode='r')):
+        loaded = angcols.load_columns(dir_path, read=read)
+        assert loaded.schema.fields == flight.schema.fields
+        assert loaded.timezones == flight.timezones
+        assert loaded.phases == flight.phases
+        assert list(loaded["TIME_NS"]) == list(flight["TIME_NS"])
+        assert list(loaded["ATC_MODEL"]) == list(flight["ATC_MODEL"])
+        for got, want in zip(loaded["GENERAL_ENG_RPM:1"], flight["GENERAL_ENG_RPM:1"]):
+            assert got == want or math.isnan(got) and math.isnan(want)
+    subset = angcols.load_columns(dir_path, ["PLANE_ALTITUDE"], np.load)
+    assert list(subset) == ["PLANE_ALTITUDE"]
+    with pytest.raises(KeyError):
+        angcols.load_columns(dir_path, ["NOT_A_CHANNEL"])
+
+def test_empty_flight_round_trip(tmp_path):
+    flight = angfb.FlightBuffer(angfb.FlightSchema([("TIME_NS", 'q'), ("PLANE_ALTITUDE", 'd')]))
+    dir_path = str(tmp_path / "f1.cols")
+    angcols.write_columns(dir_path, flight)
+    loaded = angcols.load_columns(dir_path, read=lambda path: np.load(path, mmap_mode='r'))
+    assert angcols.read_schema(dir_path)["num_samples"] == 0
+    assert [len(loaded[name]) for name in loaded] == [0, 0]
+    assert loaded.timezones == [] and loaded.phases == []
+
+def test_load_flight_window_maps_the_store(tmp_path, monkeypatch):
+    pytest.importorskip("pandas")
+    import ang_data_reader_utils as angdru
+    monkeypatch.chdir(tmp_path)
+    flight = make_flight()
+    os.makedirs("./data/f1")
+    angcols.write_columns(angcols.columns_path("f1"), flight)
+    start, end = T0 + 10000000000, T0 + 20000000000
+    window = angdru.load_flight_window("f1", start, end, columns=["PLANE_ALTITUDE"])
+    assert sorted(window) == ["PLANE_ALTITUDE", "TIME_NS"]
+    assert isinstance(window["TIME_NS"], np.memmap)
+    np.testing.assert_array_equal(window["TIME_NS"], np.arange(start, end, 100000000))
+    np.testing.assert_array_equal(window["PLANE_ALTITUDE"], 500.0 + np.arange(100, 200) * 0.5)
+    assert window.timezones == flight.timezones
+    assert window.phases == flight.phases
+    assert len(angdru.load_flight_window("f1", end=T0)["TIME_NS"]) == 0
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the crash safety of the append-only flight log: checksummed frames,
+checkpoints and tail recovery.
+
+@author: ANG
+"""
+import os
+import pickle
+import struct
+import ang_flight_log as angfl
+
+FIELDS = [("PLANE_ALTITUDE", 'd'), ("TIME_NS", 'q')]
+
+def rows(start, count):
+    return [[float(i), 1700000000000000000 + i] for i in range(start, start + count)]
+
+def write_log(log_path, batches, fsync_last=True):
+    '''
+    Function appends batches of 10 rows; returns the end offset of each.
+    '''
+    ends = []
+    for n in range(batches):
+        fsync = fsync_last or n < batches - 1
+        angfl.append_rows(str(log_path), FIELDS, rows(10 * n, 10), fsync=fsync)
+        ends.append(os.path.getsize(log_path))
+    return ends
+
+def altitudes(log_path):
+    return list(angfl.load_flight_log(str(log_path))["PLANE_ALTITUDE"])
+
+def test_round_trip_and_checkpoint(tmp_path):
+    log_path = tmp_path / "f1.log"
+    ends = write_log(log_path, 3)
+    assert altitudes(log_path) == [float(i) for i in range(30)]
+    assert angfl.read_checkpoint(str(log_path)) == ends[-1]
+    assert angfl.recover_flight_log(str(log_path)) == (ends[-1], 0)
+
+def test_truncated_frame_is_cut_off(tmp_path):
+    log_path = tmp_path / "f1.log"
+    # The last batch was not fsync'ed: the checkpoint is at the second batch
+    ends = write_log(log_path, 3, fsync_last=False)
+    assert angfl.read_checkpoint(str(log_path)) == ends[1]
+    with open(log_path, 'r+b') as fp:
+        fp.truncate(ends[2] - 5)
+    assert altitudes(log_path) == [float(i) for i in range(20)]
+    assert angfl.recover_flight_log(str(log_path)) == (ends[1], ends[2] - 5 - ends[1])
+    assert os.path.getsize(log_path) == ends[1]
+    assert angfl.read_checkpoint(str(log_path)) == ends[1]
+    # The repaired log takes new frames
+    angfl.append_rows(str(log_path), FIELDS, rows(20, 10))
+    assert altitudes(log_path) == [float(i) for i in range(30)]
+
+def test_garbage_tail_is_cut_off(tmp_path):
+    log_path = tmp_path / "f1.log"
+    ends = write_log(log_path, 2)
+    with open(log_path, 'ab') as fp:
+        fp.write(b'\xff' * 100)
+    assert angfl.recover_flight_log(str(log_path)) == (ends[1], 100)
+    assert altitudes(log_path) == [float(i) for i in range(20)]
+
+def test_bad_crc_in_the_middle(tmp_path):
+    log_path = tmp_path / "f1.log"
+    ends = write_log(log_path, 3)
+    with open(log_path, 'r+b') as fp:
+        # Flip a byte in the body of the second rows frame
+        fp.seek(ends[0] + angfl.FRAME_HEADER.size + 10)
+        byte = fp.read(1)
+        fp.seek(-1, os.SEEK_CUR)
+        fp.write(bytes([byte[0] ^ 0xff]))
+    # Readers stop at the damaged frame and give the valid prefix
+    assert altitudes(log_path) == [float(i) for i in range(10)]
+    # Without a checkpoint recovery checks every frame and cuts from there
+    os.remove(angfl.checkpoint_path(str(log_path)))
+    size = os.path.getsize(log_path)
+    assert angfl.recover_flight_log(str(log_path)) == (ends[0], size - ends[0])
+    assert altitudes(log_path) == [float(i) for i in range(10)]
+
+def test_checkpoint_past_eof_falls_back_to_full_scan(tmp_path):
+    log_path = tmp_path / "f1.log"
+    ends = write_log(log_path, 2)
+    angfl.write_checkpoint(str(log_path), ends[1] + 1000)
+    with open(log_path, 'ab') as fp:
+        fp.write(b'torn')
+    assert angfl.recover_flight_log(str(log_path)) == (ends[1], 4)
+    assert angfl.read_checkpoint(str(log_path)) == ends[1]
+    assert altitudes(log_path) == [float(i) for i in range(20)]
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    log_path = tmp_path / "f1.log"
+    ends = write_log(log_path, 2)
+    with open(angfl.checkpoint_path(str(log_path)), 'wb') as fp:
+        fp.write(b'{"offs')
+    assert angfl.read_checkpoint(str(log_path)) is None
+    assert angfl.recover_flight_log(str(log_path)) == (ends[1], 0)
+
+def test_incomplete_file_header_removes_log(tmp_path):
+    log_path = tmp_path / "f1.log"
+    with open(log_path, 'wb') as fp:
+        fp.write(angfl.FLIGHT_LOG_MAGIC[:3])
+    assert angfl.recover_flight_log(str(log_path)) == (0, 3)
+    assert not log_path.exists()
+
+def test_v1_log(tmp_path):
+    log_path = tmp_path / "f1.log"
+    frames = [('schema', [name for name, dtype in FIELDS]), ('rows', rows(0, 5)),
+              ('rows', rows(5, 5))]
+    with open(log_path, 'wb') as fp:
+        fp.write(angfl.FLIGHT_LOG_MAGIC_V1)
+        for frame in frames:
+            body = pickle.dumps(frame)
+            fp.write(struct.pack('<I', len(body)) + body)
+        good_end = fp.tell()
+        # Torn tail: a length with no body
+        fp.write(struct.pack('<I', 1000) + b'x')
+    flight = angfl.load_flight_log(str(log_path))
+    assert flight.schema.fields == [(name, 'object') for name, dtype in FIELDS]
+    assert list(flight["PLANE_ALTITUDE"]) == [float(i) for i in range(10)]
+    assert angfl.recover_flight_log(str(log_path)) == (good_end, 5)
+    assert altitudes(log_path) == [float(i) for i in range(10)]
+
+def test_recovery_reads_only_the_tail(tmp_path, monkeypatch):
+    scanned = []
+    scan_frames = angfl.scan_frames
+
+    def counting_scan_frames(fp, frame_header):
+        for frame in scan_frames(fp, frame_header):
+            scanned.append(frame)
+            yield frame
+
+    monkeypatch.setattr(angfl, "scan_frames", counting_scan_frames)
+    for batches in (3, 300):
+        log_path = tmp_path / f"f{batches}.log"
+        # All but the last two batches are behind the checkpoint
+        write_log(log_path, batches - 2)
+        for n in range(batches - 2, batches):
+            angfl.append_rows(str(log_path), FIELDS, rows(10 * n, 10), fsync=False)
+        del scanned[:]
+        assert angfl.recover_flight_log(str(log_path))[1] == 0
+        assert len(scanned) == 2
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the incremental flight phase detector and the phase sample rates.
+
+@author: ANG
+"""
+import pytest
+import ang_fake_simconnect as angfake
+import ang_flight_phase as angphase
+import ang_flight_buffer as angfb
+import ang_channel_groups as anggroups
+
+NS = angphase.NS_PER_SECOND
+
+def profile_sample(profile, t, dist_nm, parked=False):
+    state = profile.state(t, dist_nm)
+    sample = {name:state[name] for name in (angphase.ALT_CHANNEL, angphase.VS_CHANNEL,
+                                            angphase.SPEED_CHANNEL, angphase.FLAPS_CHANNEL)}
+    sample[angphase.THROTTLE_CHANNEL] = state["GENERAL_ENG_THROTTLE_LEVER_POSITION"][0]
+    if parked:
+        sample[angphase.SPEED_CHANNEL] = 0.0
+        sample[angphase.THROTTLE_CHANNEL] = 0.0
+    return sample
+
+def run_profile(profile, parked_seconds=60):
+    '''
+    Function feeds a parked start, the whole profile at 1 Hz and a parked 
+    end to a detector; returns the phase transitions.
+    '''
+    detector = angphase.FlightPhaseDetector()
+    transitions = []
+    index = 0
+    dist_nm = 0.0
+    times = [(0.0, True)] * parked_seconds
+    times += [(float(t), False) for t in range(int(profile.duration))]
+    times += [(profile.duration, True)] * parked_seconds
+    for t, parked in times:
+        if not parked:
+            dist_nm += profile.airspeed(t) / 3600.0
+        if detector.update(profile_sample(profile, t, dist_nm, parked), index * NS, index):
+            transitions.append(detector.transition)
+        index += 1
+    return transitions
+
+def test_profile_phase_sequence():
+    profile = angfake.FlightProfile(duration=3600.0)
+    transitions = run_profile(profile)
+    assert [phase for index, time_ns, phase in transitions] == [
+        angphase.PARKED, angphase.TAXI, angphase.TAKEOFF, angphase.CLIMB,
+        angphase.CRUISE, angphase.DESCENT, angphase.APPROACH, angphase.LANDING,
+        angphase.TAXI, angphase.PARKED]
+    starts = {phase:index - 60 for index, time_ns, phase in transitions}
+    # Transitions are dated from the sample where the phase started
+    assert starts[angphase.TAKEOFF] == pytest.approx(profile.taxi, abs=2)
+    assert starts[angphase.CRUISE] == pytest.approx(profile.t_top_of_climb, abs=2)
+    assert starts[angphase.DESCENT] == pytest.approx(profile.t_top_of_descent, abs=2)
+    # Transition times and indices only move forward
+    assert [t for i, t, p in transitions] == sorted(t for i, t, p in transitions)
+
+def test_short_excursions_are_held_off():
+    detector = angphase.FlightPhaseDetector(hold_seconds=5.0)
+    cruise = {angphase.ALT_CHANNEL:8000.0, angphase.VS_CHANNEL:0.0,
+              angphase.SPEED_CHANNEL:120.0}
+    climb = dict(cruise, **{angphase.VS_CHANNEL:800.0})
+    assert detector.update(cruise, 0, 0)
+    assert detector.phase == angphase.CRUISE
+    # A 4 s gust is not a climb
+    for i in range(1, 5):
+        assert not detector.update(climb, i * NS, i)
+    assert not detector.update(cruise, 5 * NS, 5)
+    assert detector.phase == angphase.CRUISE
+    # A climb that holds 5 s is, from its first sample
+    changed = [detector.update(climb, i * NS, i) for i in range(6, 12)]
+    assert changed == [False] * 5 + [True]
+    assert detector.transition == (6, 6 * NS, angphase.CLIMB)
+
+def test_samples_missing_channels_are_skipped():
+    detector = angphase.FlightPhaseDetector()
+    assert not detector.update({angphase.ALT_CHANNEL:float('nan')}, 0, 0)
+    assert detector.phase is None
+
+def test_phase_rates_are_capped():
+    pytest.importorskip("timezonefinder")
+    angfake.install()
+    import ANG_Flight_Recorder_v_0_5 as angflightrec
+    schema = angfb.FlightSchema([(anggroups.TIME_CHANNEL, 'q'), ("G_FORCE", 'd')])
+    groups = [anggroups.ChannelGroup(anggroups.MAIN_GROUP, schema, 1.0),
+              anggroups.ChannelGroup('attitude', schema, 10.0),
+              anggroups.ChannelGroup('burst', schema, 20.0)]
+    for phase, factor in angflightrec.PHASE_RATE_FACTORS.items():
+        angflightrec.apply_phase_rates(groups, phase)
+        for group in groups:
+            assert group.rate_hz == min(group.base_rate_hz * factor,
+                                        angflightrec.MAX_PHASE_RATE_HZ)
+            assert group.rate_hz <= angflightrec.MAX_PHASE_RATE_HZ
+    angflightrec.apply_phase_rates(groups, angphase.TAKEOFF)
+    assert [group.rate_hz for group in groups] == [4.0, 40.0, angflightrec.MAX_PHASE_RATE_HZ]
+    # No phase yet: the configured rates
+    angflightrec.apply_phase_rates(groups, None)
+    assert [group.rate_hz for group in groups] == [1.0, 10.0, 20.0]
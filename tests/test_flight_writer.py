@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the background flight log writer.
+
+@author: ANG
+"""
+import threading
+import time
+import ang_flight_log as angfl
+import ang_flight_writer as angwriter
+
+FIELDS = [("TIME_NS", 'q'), ("PLANE_ALTITUDE", 'd')]
+
+def test_failed_write_does_not_stop_writer(tmp_path, monkeypatch):
+    log_path = str(tmp_path / 'f1.log')
+    append_rows = angfl.append_rows
+    def failing_append_rows(path, fields, rows, **kwargs):
+        if any(row[1] == 'bad' for row in rows):
+            raise TypeError('must be real number, not str')
+        return append_rows(path, fields, rows, **kwargs)
+    monkeypatch.setattr(angfl, 'append_rows', failing_append_rows)
+    writer = angwriter.FlightLogWriter(flush_interval=0.05, tolerances={})
+    writer.start()
+    writer.submit(log_path, FIELDS, [1, 'bad'])
+    assert writer.flush(timeout=5.0)
+    assert writer.write_errors == 1
+    assert writer.is_alive()
+    writer.submit(log_path, FIELDS, [2, 100.0])
+    writer.close()
+    assert not writer.is_alive()
+    assert writer.rows_written == 1
+    flight = angfl.load_flight_log(log_path)
+    assert list(flight["TIME_NS"]) == [2]
+    assert list(flight["PLANE_ALTITUDE"]) == [100.0]
+
+def test_flush_does_not_wait_on_stopped_writer():
+    writer = angwriter.FlightLogWriter(max_queue=1)
+    # Not started
+    assert not writer.flush()
+    writer.close()
+    writer.run = lambda: None
+    writer.start()
+    writer.join()
+    writer.submit(None, None, None)
+    start = time.monotonic()
+    assert not writer.flush()
+    writer.close()
+    assert time.monotonic() - start < 1.0
+
+def test_flush_timeout(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(angfl, 'append_rows', lambda *args, **kwargs: release.wait())
+    writer = angwriter.FlightLogWriter(flush_interval=0.01)
+    writer.start()
+    writer.submit('f1.log', FIELDS, [1, 1.0])
+    assert not writer.flush(timeout=0.2)
+    release.set()
+    assert writer.flush(timeout=5.0)
+    writer.close()
+
+def test_frames_are_not_dropped(monkeypatch):
+    release = threading.Event()
+    written = []
+    def slow_append_rows(path, fields, rows, encoder=None, frames=()):
+        release.wait()
+        written.append((list(rows), list(frames)))
+        return 0
+    monkeypatch.setattr(angfl, 'append_rows', slow_append_rows)
+    writer = angwriter.FlightLogWriter(max_queue=2, flush_interval=0.01)
+    writer.start()
+    writer.submit('f1.log', FIELDS, [1, 1.0])
+    # Wait for the writer to take the first row and block writing it
+    deadline = time.monotonic() + 5.0
+    while writer.queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert writer.submit('f1.log', FIELDS, [2, 2.0])
+    assert writer.submit('f1.log', FIELDS, [3, 3.0])
+    assert not writer.submit('f1.log', FIELDS, [4, 4.0])
+    threading.Timer(0.2, release.set).start()
+    assert writer.submit_frame('f1.log', FIELDS, 'phase', (5, 'climb'))
+    writer.close()
+    assert writer.dropped == 1
+    assert writer.backpressure_waits == 1
+    assert [frame for rows, frames in written for frame in frames] == [('phase', (5, 'climb'))]
+    assert [row[0] for rows, frames in written for row in rows] == [1, 2, 3]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the deadline based sample scheduler.
+
+@author: ANG
+"""
+import pytest
+import ang_sample_scheduler as angsched
+
+class FakeClock(object):
+    '''
+    Monotonic clock that only moves when slept on or advanced.
+    '''
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_scheduler(rate_hz):
+    clock = FakeClock()
+    return angsched.DeadlineScheduler(rate_hz, clock=clock, sleep=clock.sleep), clock
+
+def test_deadlines_do_not_drift():
+    scheduler, clock = make_scheduler(10.0)
+    start = clock.now
+    for n in range(100):
+        assert scheduler.wait() == 0
+        assert clock.now == pytest.approx(start + n * 0.1)
+        # Work that takes part of the period does not stretch it
+        clock.now += 0.03
+    assert scheduler.ticks == 100
+    assert scheduler.missed == 0
+
+def test_overrun_skips_missed_deadlines():
+    scheduler, clock = make_scheduler(10.0)
+    start = clock.now
+    scheduler.wait()
+    # Tick runs until 0.45 s: deadlines at 0.1, 0.2 and 0.3 s are missed
+    clock.now += 0.45
+    assert scheduler.wait() == 3
+    assert scheduler.max_lateness == pytest.approx(0.35)
+    # The next deadline stays on the start + n * period grid
+    assert scheduler.wait() == 0
+    assert clock.now == pytest.approx(start + 0.5)
+    assert scheduler.missed == 3
+
+def test_late_tick_within_period_is_not_missed():
+    scheduler, clock = make_scheduler(4.0)
+    scheduler.wait()
+    clock.now += 0.3
+    assert scheduler.wait() == 0
+    assert scheduler.missed == 0
+    assert scheduler.max_lateness == pytest.approx(0.05)
+
+def test_set_rate_restarts_deadlines_and_reset_stats():
+    scheduler, clock = make_scheduler(1.0)
+    scheduler.wait()
+    clock.now += 5.0
+    scheduler.wait()
+    assert scheduler.missed > 0
+    scheduler.set_rate(20.0)
+    start = clock.now
+    scheduler.wait()
+    scheduler.wait()
+    assert clock.now == pytest.approx(start + 0.05)
+    scheduler.reset_stats()
+    assert (scheduler.ticks, scheduler.missed, scheduler.max_lateness) == (0, 0, 0.0)
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        angsched.DeadlineScheduler(0)
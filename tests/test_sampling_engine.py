@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the sampling engine.
+
+@author: ANG
+"""
+import threading
+import time
+import pytest
+import ang_fake_simconnect as angfake
+import ang_sampling_engine as angengine
+
+class RecordingRequests(object):
+    '''
+    AircraftRequests stand-in that records how many calls overlap.
+    '''
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    def _enter(self, call):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append(call)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        return
+
+    def get(self, key):
+        self._enter(('get', key))
+        return 1.0
+
+    def set(self, key, value):
+        self._enter(('set', key))
+        return True
+
+@pytest.fixture
+def engine():
+    _AQ = RecordingRequests()
+    engine = angengine.SamplingEngine(None, _AQ, timeout=5.0)
+    engine.start()
+    yield engine
+    engine.stop()
+
+def test_simconnect_calls_do_not_overlap(engine):
+    keys = [f'GENERAL_ENG_RPM:{i}' for i in range(1, 5)] + ['PLANE_LATITUDE', 'PLANE_LONGITUDE']
+    threads = [threading.Thread(target=engine.call, args=(engine.get_many(keys),)), 
+               threading.Thread(target=engine.call, 
+                                args=(engine.set_many({"THROTTLE:1":0.5, "FLAPS":1}),))]
+    for thread in threads:
+        thread.start()
+    assert engine.call(engine.get_many(keys)) == dict.fromkeys(keys, 1.0)
+    for thread in threads:
+        thread.join()
+    assert engine._AQ.max_active == 1
+    assert ('set', 'THROTTLE:1') in engine._AQ.calls
+
+def test_get_position_reads_through_engine(engine, monkeypatch):
+    pytest.importorskip("timezonefinder")
+    angfake.install()
+    import ANG_Flight_Recorder_v_0_5 as angflightrec
+    class NoRequests(object):
+        def get(self, key):
+            raise AssertionError(f'{key} read outside the engine')
+    assert angflightrec.get_position(NoRequests(), 10.0, None, engine=engine) == (10.0, 1.0)
+    assert engine._AQ.calls == [('get', 'PLANE_LONGITUDE')]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the flight start readiness probe.
+
+@author: ANG
+"""
+import pytest
+import ang_sim_readiness as angready
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def probe_values(sim_rate=1.0, lat=47.45, lon=-122.31, alt=430.0, model='C172'):
+    return {"PLANE_LATITUDE":lat, "PLANE_LONGITUDE":lon, "PLANE_ALTITUDE":alt,
+            "ATC_MODEL":model, "SIMULATION_RATE":sim_rate}
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def probe(clock):
+    return angready.ReadinessProbe(timeout=5.0, stable_seconds=1.0, 
+                                   clock=clock, sleep=clock.sleep)
+
+def test_ready_once_sim_rate_holds(probe, clock):
+    assert probe.check(probe_values()) == (False, "sim rate")
+    clock.sleep(0.5)
+    assert probe.check(probe_values()) == (False, "sim rate")
+    clock.sleep(0.5)
+    assert probe.check(probe_values()) == (True, None)
+
+def test_sim_rate_change_restarts_hold(probe, clock):
+    probe.check(probe_values(1.0))
+    clock.sleep(0.8)
+    assert probe.check(probe_values(2.0)) == (False, "sim rate")
+    clock.sleep(0.8)
+    assert probe.check(probe_values(2.0)) == (False, "sim rate")
+    clock.sleep(0.2)
+    assert probe.check(probe_values(2.0)) == (True, None)
+
+@pytest.mark.parametrize("sim_rate", [0.0, 0, -1.0, None, b'1'])
+def test_stopped_sim_rate_is_not_ready(probe, clock, sim_rate):
+    for _ in range(10):
+        assert probe.check(probe_values(sim_rate)) == (False, "sim rate")
+        clock.sleep(0.5)
+
+def test_position_and_aircraft(probe):
+    assert probe.check(probe_values(lat=None))[1] == "position"
+    menu = probe_values(lat=angready.MENU_LATITUDE, lon=angready.MENU_LONGITUDE, alt=0.0)
+    assert probe.check(menu)[1] == "position"
+    assert probe.check(probe_values(model=b''))[1] == "aircraft"
+
+def test_wait_times_out_on_zero_rate(probe, clock):
+    progress = []
+    ready = probe.wait(lambda keys: probe_values(0.0), 
+                       progress=lambda reason, left: progress.append(reason))
+    assert not ready
+    assert clock.now == pytest.approx(5.0)
+    assert set(progress) == {"sim rate"}
+
+def test_wait_ready(probe, clock):
+    rates = iter([0.0, 0.0, 1.0])
+    assert probe.wait(lambda keys: probe_values(next(rates, 1.0)))
+    # Ready 1 s after the sim started running
+    assert clock.now == pytest.approx(1.5)
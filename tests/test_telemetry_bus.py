@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the telemetry bus reuse of published values.
+
+@author: ANG
+"""
+import ang_telemetry_bus as angbus
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FakeEngine(object):
+    '''
+    Sampling engine stand-in that records the keys it is asked to read.
+    '''
+    def __init__(self):
+        self.reads = []
+
+    def get_many(self, keys):
+        self.reads.append(list(keys))
+        return {key:-1.0 for key in keys}
+
+    def call(self, result):
+        return result
+
+def test_fetch_reuses_values_until_the_next_group_sample():
+    clock = FakeClock()
+    bus = angbus.TelemetryBus(clock)
+    engine = FakeEngine()
+    # Main group in cruise: one sample every 4 s
+    bus.publish({"PLANE_LATITUDE":1.0, "SIMULATION_RATE":1.0}, period=4.0)
+    for tick in range(16):
+        # Dashboard at 4 Hz
+        clock.now = tick * 0.25
+        values = bus.fetch(["PLANE_LATITUDE", "SIMULATION_RATE"], 0.25, engine)
+        assert values == {"PLANE_LATITUDE":1.0, "SIMULATION_RATE":1.0}
+    assert engine.reads == []
+    # The recorder stopped: the values go stale and are read again
+    clock.now = 4.5
+    assert bus.fetch(["PLANE_LATITUDE"], 0.25, engine) == {"PLANE_LATITUDE":-1.0}
+    assert engine.reads == [["PLANE_LATITUDE"]]
+
+def test_one_off_values_stay_fresh_for_max_age_only():
+    clock = FakeClock()
+    bus = angbus.TelemetryBus(clock)
+    engine = FakeEngine()
+    bus.publish({"PLANE_ALTITUDE":100.0, "ATC_MODEL":None})
+    clock.now = 0.2
+    assert bus.fetch(["PLANE_ALTITUDE", "ATC_MODEL"], 0.25, engine) == \
+        {"PLANE_ALTITUDE":100.0, "ATC_MODEL":-1.0}
+    clock.now = 0.5
+    assert bus.latest(["PLANE_ALTITUDE"], 0.25).values == {}
+    assert bus.latest(["PLANE_ALTITUDE"]).values == {"PLANE_ALTITUDE":100.0}
+    assert bus.stats()["fetched_keys"] == 1